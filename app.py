@@ -6,10 +6,27 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from io import BytesIO
 import altair as alt
-import unicodedata
-import re
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from cache import LRUCache, content_hash, params_key
+from engine import COMPS_LIMIT, REASONS, apply_params, clean, preprocess, reason_counts
+from engine_duckdb import apply_reinvestment as apply_reinvestment_duckdb
+from engine_polars import apply_params as apply_params_polars, prepare as prepare_polars
+from export import EXPORT_FORMATS, SPLIT_KEYS, XLSX_MAX_ROWS, ExportJobs, export_layout, export_split
+from kpis import compute_kpis
+from loaders import UPLOAD_TYPES, load_table
+from profiling import Profiler
+from scenarios import scenario_grid, sweep
+from solver import solve_budgets, solve_total
+from sql_source import (DEFAULT_BATCH_ROWS, DEFAULT_FETCH_ROWS, DEFAULT_TABLE, WRITEBACK_COLS, ConnectionPool,
+                        check_sqlite_url, connect, is_sql_url, load_sql, odbc_connection_string, write_layout)
+from results_view import PAGE_SIZES, DEFAULT_PAGE_SIZE, distinct_values, filter_mask, get_page, page_count
+from streaming import DEFAULT_CHUNKSIZE, stream_reinvestment
+from threshold_index import ThresholdIndex
 
 ###############################################
 # CONFIG
@@ -18,118 +35,79 @@ st.set_page_config(page_title="Reinvestment Promotion Builder", layout="wide")
 st.title("🎰 Casino Reinvestment Promotion Builder")
 
 ###############################################
-# HELPERS
+# CACHES (shared across reruns and sessions)
 ###############################################
-def clean(col):
-    """Normalize column names"""
-    if not isinstance(col, str):
-        col = str(col)
-    col = col.strip()
-    col = "".join(c for c in unicodedata.normalize("NFKD", col) if not unicodedata.combining(c))
-    col = re.sub(r"[^0-9A-Za-z_ ]", "", col)
-    col = col.replace(" ", "_")
-    col = re.sub(r"_+", "_", col)
-    return col.strip("_")
-
-def normalize_gestion(name):
-    return str(name).strip().lower().replace("_", "").replace(" ", "")
+CACHE_BYTES = 1 << 30  # per cache (approx_nbytes), on top of the entry limits
+
+@st.cache_resource
+def get_caches():
+    """
+    (parsed uploads, per-upload engine state: Prepared / Polars frames /
+    threshold indexes, engine results), shared by every session; each is
+    bounded by entries and by CACHE_BYTES
+    """
+    return (LRUCache(maxsize=4, maxbytes=CACHE_BYTES), LRUCache(maxsize=4, maxbytes=CACHE_BYTES),
+            LRUCache(maxsize=16, maxbytes=CACHE_BYTES))
+
+upload_cache, prepared_cache, result_cache = get_caches()
+
+def upload_hash(uploaded):
+    """Content hash of an upload, computed once per file_id"""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded.file_id not in hashes:
+        hashes[uploaded.file_id] = content_hash(uploaded.getvalue())
+    return hashes[uploaded.file_id]
+
+@st.cache_resource
+def get_sql_pool(url):
+    """One connection pool per server/credentials, shared by every session"""
+    return ConnectionPool(lambda: connect(url))
+
+@st.cache_resource
+def get_export_jobs():
+    return ExportJobs(max_workers=2)
+
+export_jobs = get_export_jobs()
+
+EXPORT_LABELS = {"xlsx": "Excel", "csv": "CSV", "csv.gz": "CSV (gzip)", "parquet": "Parquet"}
+
+@st.fragment
+def export_status(key, file_name, mime, label):
+    """Download button once the background export is ready (reruns only this fragment)"""
+    job = export_jobs.get(key)
+    if job is None:
+        return
+    if not job.done():
+        st.info("⏳ Building export in the background…")
+        st.button("🔄 Check again", key=f"check_{file_name}")
+    elif job.exception() is not None:
+        st.error(f"❌ Export failed: {job.exception()}")
+    else:
+        with open(job.result(), "rb") as fh:
+            st.download_button(label, fh, file_name, mime)
 
 ###############################################
-# 🧠 MAIN REINVESTMENT ENGINE
+# KPI DISPLAY
 ###############################################
-def apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps):
-    df = df.copy()
-
-    # --- Standardize column names ---
-    rename_map = {
-        "Pot_xVisita": "Pot_Visita",
-        "Prom_TeoNeto_Trip": "TeoricoNeto",
-        "Prom_WinNeto_Trip": "WinTotalNeto",
-        "Prom_Visita_Trip": "Visitas",
-        "Pot_Trip": "Pot_Trip",
-    }
-    df.rename(columns=rename_map, inplace=True)
-
-    required_cols = ["Gestion", "Pais", "NG", "TeoricoNeto", "WinTotalNeto",
-                     "Visitas", "Pot_Trip", "Pot_Visita", "Promo2", "Comps"]
-    missing = [c for c in required_cols if c not in df.columns]
-    if missing:
-        st.error(f"❌ Missing required columns: {missing}")
-        return None
-
-    num_cols = ["TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip",
-                "Pot_Visita", "Promo2", "Comps"]
-    for c in num_cols:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
-
-    # --- Derived fields ---
-    df["WxV"] = df["Pot_Visita"]
-    df["Potencial"] = df[["TeoricoNeto", "WinTotalNeto"]].max(axis=1)
-
-    # --- Normalize pct per country ---
-    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
-    df["pct"] = df["Pais"].apply(lambda x: pct_norm.get(normalize_gestion(x), 0))
-
-    # --- Eligibility base ---
-    df["eligible"] = (pd.to_numeric(df["NG"], errors="coerce") == 0)
-    df["Reason_Not_Eligible"] = ""
-
-    # --- Raw reinvestment ---
-    df["reinvestment_raw"] = df["Pot_Visita"] * df["pct"]
-
-    # --- Apply country caps ---
-    def apply_country_caps(row):
-        pais = str(row.get("Pais", "")).strip()
-        reinv = row.get("reinvestment_raw", 0)
-        for key, rule in country_caps.items():
-            if normalize_gestion(key) == normalize_gestion(pais):
-                reinv = max(reinv, rule["min"])
-                reinv = min(reinv, rule["max"])
-                break
-        return reinv
-
-    df["reinvestment"] = df.apply(apply_country_caps, axis=1)
-
-    # --- Apply global limits only to eligible ---
-    df.loc[df["eligible"], "reinvestment"] = df.loc[df["eligible"], "reinvestment"].clip(lower=min_wallet, upper=cap)
-    df.loc[~df["eligible"], "reinvestment"] = 0
-
-    # --- Rule 1: Comps > 2000 ---
-    mask = df["Comps"] > 2000
-    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[mask, "Reason_Not_Eligible"] += "Comps > 2000, "
-
-    # --- Rule 2: NG = 1 ---
-    mask = df["NG"] == 1
-    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[mask, "Reason_Not_Eligible"] += "NG = 1, "
-
-    # --- Rule 3: Reinvestment <= Promo2 ---
-    mask = df["reinvestment"] <= df["Promo2"]
-    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[mask, "Reason_Not_Eligible"] += "Reinvestment <= Promo2, "
-
-    # --- Reinvestment range label ---
-    df["Rango_Reinv"] = np.select(
-        [
-            df["reinvestment"] == 0,
-            df["reinvestment"] <= df["WxV"] * 0.5,
-            df["reinvestment"] <= df["WxV"],
-        ],
-        ["NO APLICA", "<50%", "50-100%"],
-        default="NO APLICA",
-    )
-
-    # --- Rule 4: Rango_Reinv = NO APLICA ---
-    mask = df["Rango_Reinv"] == "NO APLICA"
-    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[mask, "Reason_Not_Eligible"] += "Rango_Reinv = NO APLICA, "
-
-    # --- Clean up reason text ---
-    df["Reason_Not_Eligible"] = df["Reason_Not_Eligible"].str.strip(", ").replace("", np.nan)
-
-    df["reinvestment"] = df["reinvestment"].round(2)
-    return df
+def show_kpis(kpi):
+    """Metrics + overall / by country / by Gestión tables from kpis.rollup()"""
+    st.subheader("📊 KPI Summary")
+    totals = kpi["totals"]
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("💰 Total Reinvestment", f"{totals['Total_Reinvestment']:,.0f}")
+    c2.metric("📈 Total Theoretical Net", f"{totals['Total_Teorico_Neto']:,.0f}")
+    c3.metric("🎯 Total Win Net", f"{totals['Total_Win_Neto']:,.0f}")
+    c4.metric("🧳 Total Pot Trip", f"{totals['Total_Potencial_Trip']:,.0f}")
+    c5.metric("👣 Avg Visits", f"{totals['Avg_Visitas']:,.2f}")
+
+    st.write("### 🔢 Overall Summary")
+    st.dataframe(kpi["summary"], use_container_width=True)
+
+    st.write("### 🌎 By Country (with % of Total)")
+    st.dataframe(kpi["by_pais"], use_container_width=True)
+
+    st.write("### 🏢 By Gestión (with % of Total)")
+    st.dataframe(kpi["by_gestion"], use_container_width=True)
 
 ###############################################
 # SIDEBAR CONFIG
@@ -155,137 +133,411 @@ st.sidebar.subheader("Global Reinvestment Rules")
 min_wallet = st.sidebar.number_input("Minimum reinvestment", 0.0, value=100.0)
 cap_value = st.sidebar.number_input("Cap per wallet", 0.0, value=20000.0)
 
+st.sidebar.subheader("Engine")
+engine_choice = st.sidebar.radio(
+    "Rule engine", ["pandas", "DuckDB", "Polars"],
+    help="pandas recomputes only the countries whose parameters changed; DuckDB runs the rules as one "
+         "multi-threaded SQL query; Polars as a multi-threaded lazy plan (same results).",
+)
+
+st.sidebar.subheader("Diagnostics")
+profiler = None
+if st.sidebar.checkbox("⏱️ Profile each run", help="Wall/CPU time and memory per pipeline stage"):
+    profiler = Profiler(trace_alloc=st.sidebar.checkbox(
+        "Trace allocations", help="tracemalloc peak per stage; makes runs noticeably slower"))
+
+@contextmanager
+def profiled(name, **info):
+    """A top-level stage of this rerun under the sidebar profiler (no-op when it's off)"""
+    if profiler is None:
+        yield
+        return
+    with profiler, profiler.stage(name, **info):
+        yield
+
+def show_profile():
+    if profiler is None or not profiler.records:
+        return
+    with st.expander("⏱️ Profiling (this rerun)", expanded=True):
+        st.caption("Cached stages are marked and take no time; exports run in the background and are not listed.")
+        st.dataframe(profiler.to_frame(), use_container_width=True, hide_index=True)
+
 ###############################################
-# FILE UPLOAD
+# DATA SOURCE (file upload or SQL)
 ###############################################
-st.subheader("📥 Upload CSV/XLSX")
-uploaded = st.file_uploader("Select File", type=["csv", "xlsx"])
-
-if uploaded:
-    df_raw = (
-        pd.read_csv(uploaded)
-        if uploaded.name.endswith(".csv")
-        else pd.read_excel(uploaded)
+st.subheader("📥 Load Base Data")
+keep_cols = tuple(
+    c.strip() for c in st.text_input(
+        "Extra columns to keep (comma separated, e.g. player id)",
+        help="Only the engine's required columns are read; list any other columns you need in the layout.",
+    ).split(",") if c.strip()
+)
+tab_file, tab_sql = st.tabs(["📁 Upload CSV/XLSX/Parquet/Feather/Arrow", "🗄️ Load from SQL"])
+
+with tab_file:
+    uploaded = st.file_uploader("Select File", type=UPLOAD_TYPES,
+                                on_change=lambda: st.session_state.update(active_source="file"))
+    csv_engine = "pyarrow" if st.checkbox("⚡ Fast CSV parser (pyarrow)") else None
+    stream_mode = st.checkbox("🌊 Streaming mode (large CSV, processed in chunks)")
+    if stream_mode:
+        chunk_rows = int(st.number_input("Rows per chunk", 10_000, value=DEFAULT_CHUNKSIZE, step=50_000))
+
+# sqlite:/// servers are only opened under this directory (unset: SQL Server only)
+SQLITE_DIR = os.environ.get("PROMO_SQLITE_DIR")
+
+with tab_sql:
+    q1, q2 = st.columns(2)
+    sql_server = q1.text_input("Server", help="SQL Server host" + (
+        f", or sqlite:///name.db for a local copy under {SQLITE_DIR}" if SQLITE_DIR else ""))
+    sql_database = q2.text_input("Database")
+    sql_user = q1.text_input("Username")
+    sql_password = q2.text_input("Password", type="password")
+    sql_table = q1.text_input("Table / view", DEFAULT_TABLE)
+    sql_fetch_rows = int(q2.number_input("Rows per fetch", 1_000, value=DEFAULT_FETCH_ROWS, step=10_000))
+    sql_eligible_only = st.checkbox(
+        "Only fetch rows that can be eligible (NG = 0, Comps ≤ 2000)",
+        help="Filtered on the server: less data transferred, but ineligible rows won't appear in the layout.",
     )
-    df_raw.columns = [clean(c) for c in df_raw.columns]
+    if st.button("🔌 Connect & Load"):
+        # a fresh load per click (new nonce); reruns reuse this session's frame
+        st.session_state["active_source"] = "sql"
+        st.session_state["sql_key"] = ("sql", sql_server, sql_database, sql_table, sql_eligible_only,
+                                       keep_cols, uuid.uuid4().hex)
+
+def sql_url(server, database):
+    if is_sql_url(server):
+        return check_sqlite_url(server, SQLITE_DIR)
+    return f"odbc:{odbc_connection_string(server, database, sql_user, sql_password)}"
+
+def load_from_sql(key):
+    _, server, database, table, eligible_only, cols, _ = key
+    with get_sql_pool(sql_url(server, database)).connection() as conn:
+        return load_sql(conn, table, eligible_only, [clean(c) for c in cols], sql_fetch_rows)
+
+sql_key = st.session_state.get("sql_key")
+use_sql = sql_key is not None and (st.session_state.get("active_source") == "sql" or not uploaded)
+
+if uploaded and not use_sql and stream_mode and uploaded.name.endswith(".csv"):
+    preview = pd.read_csv(uploaded, nrows=5)
+    preview.columns = [clean(c) for c in preview.columns]
+    uploaded.seek(0)
+    st.write(preview)
 
-    st.success("✅ File loaded successfully!")
+    if st.button("🚀 Generate Promotion Layout"):
+        fd, out_path = tempfile.mkstemp(prefix="promotion_layout_", suffix=".csv")
+        os.close(fd)
+        try:
+            try:
+                with profiled("stream"):
+                    kpis = stream_reinvestment(uploaded, out_path, pct_dict, min_wallet, cap_value, country_caps,
+                                               chunksize=chunk_rows, extra_cols=[clean(c) for c in keep_cols])
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                kpis = None
+
+            if kpis is not None:
+                st.success(f"✅ Promotion Layout Created ({kpis['rows']:,} rows streamed)")
+                show_kpis(kpis)
+
+                # download_button copies the file into Streamlit's media store, so it can go right away
+                with open(out_path, "rb") as fh:
+                    st.download_button("⬇️ Download CSV", fh, "promotion_layout.csv", "text/csv")
+        finally:
+            os.remove(out_path)
+        show_profile()
+
+elif uploaded or use_sql:
+    if use_sql:
+        upload_key = sql_key
+        try:
+            # kept per session, never in the shared caches: the rows belong to this login
+            loaded = st.session_state.get("sql_frame")
+            with profiled("load_sql", cached=loaded is not None and loaded[0] == sql_key):
+                if loaded is None or loaded[0] != sql_key:
+                    loaded = (sql_key, load_from_sql(sql_key))
+                    st.session_state["sql_frame"] = loaded
+            df_raw = loaded[1]
+        except Exception as e:
+            st.error(f"SQL Error: {e}")
+            st.stop()
+    else:
+        upload_key = (upload_hash(uploaded), uploaded.name, csv_engine, keep_cols)
+        with profiled("load", cached=upload_key in upload_cache):
+            df_raw = upload_cache.get_or_compute(
+                upload_key,
+                lambda: load_table(uploaded, uploaded.name, csv_engine, extra_cols=[clean(c) for c in keep_cols]),
+            )
+
+    st.success("✅ Base loaded successfully!")
     st.write(df_raw.head())
 
     if st.button("🚀 Generate Promotion Layout"):
-        df_result = apply_reinvestment(df_raw, pct_dict, min_wallet, cap_value, country_caps)
+        st.session_state["layout_for"] = upload_key
+
+    # stays visible across reruns (paging, filters, sidebar tweaks) for this upload
+    if st.session_state.get("layout_for") == upload_key:
+        try:
+            run_key = (upload_key, params_key(pct_dict, country_caps, min_wallet, cap_value))
+            run_key += {"DuckDB": ("duckdb",), "Polars": ("polars",)}.get(engine_choice, ())
+            with profiled("engine", engine=engine_choice, cached=run_key in result_cache):
+                if engine_choice == "DuckDB":
+                    df_result = result_cache.get_or_compute(
+                        run_key,
+                        lambda: apply_reinvestment_duckdb(df_raw, pct_dict, min_wallet, cap_value, country_caps),
+                    )
+                elif engine_choice == "Polars":
+                    prepared_pl = prepared_cache.get_or_compute(upload_key + ("polars",), lambda: prepare_polars(df_raw))
+                    df_result = result_cache.get_or_compute(
+                        run_key,
+                        lambda: apply_params_polars(prepared_pl, pct_dict, min_wallet, cap_value, country_caps),
+                    )
+                else:
+                    # preprocessing runs once per upload; sidebar changes only redo apply_params
+                    prepared = prepared_cache.get_or_compute(upload_key + ("prepared",), lambda: preprocess(df_raw))
+                    df_result = result_cache.get_or_compute(
+                        run_key,
+                        lambda: apply_params(prepared, pct_dict, min_wallet, cap_value, country_caps),
+                    )
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            df_result = None
 
         if df_result is not None:
             st.success("✅ Promotion Layout Created")
-            st.dataframe(df_result, use_container_width=True)
+
+            ###############################################
+            # RESULT GRID — filtered + paginated server-side
+            ###############################################
+            f1, f2, f3, f4 = st.columns(4)
+            only_eligible = f1.checkbox("Eligible only")
+            sel_pais = f2.multiselect("Pais", distinct_values(df_result["Pais"]))
+            sel_gestion = f3.multiselect("Gestion", distinct_values(df_result["Gestion"]))
+            sel_reasons = f4.multiselect("Not eligible because", list(REASONS.values()))
+
+            with profiled("filter"):
+                view_mask = filter_mask(df_result, only_eligible, sel_pais, sel_gestion, sel_reasons)
+            n_view = int(view_mask.sum())
+            p1, p2 = st.columns([1, 3])
+            page_size = p1.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+            n_pages = page_count(n_view, page_size)
+            page = int(p2.number_input(f"Page (of {n_pages:,})", 1, n_pages, 1))
+            st.caption(f"Rows {min((page - 1) * page_size + 1, n_view):,}–{min(page * page_size, n_view):,} of {n_view:,} "
+                       f"({len(df_result):,} total)")
+            st.dataframe(get_page(df_result, view_mask, page, page_size), use_container_width=True)
 
             ###############################################
             # KPIs — Tables + % + Pie Charts
             ###############################################
-            st.subheader("📊 KPI Summary")
-
-            eligible_df = df_result[df_result["eligible"]]
-            kpi_pais = eligible_df.groupby("Pais")["reinvestment"].sum().reset_index()
-            kpi_gestion = eligible_df.groupby("Gestion")["reinvestment"].sum().reset_index()
-
-            total_reinvestment = eligible_df["reinvestment"].sum()
-            avg_teo = eligible_df["TeoricoNeto"].sum()
-            avg_win = eligible_df["WinTotalNeto"].sum()
-            avg_trip = eligible_df["Pot_Trip"].sum()
-            avg_visita = eligible_df["Visitas"].mean()
-
-            c1, c2, c3, c4, c5 = st.columns(5)
-            c1.metric("💰 Total Reinvestment", f"{total_reinvestment:,.0f}")
-            c2.metric("📈 Total Theoretical Net", f"{avg_teo:,.0f}")
-            c3.metric("🎯 Total Win Net", f"{avg_win:,.0f}")
-            c4.metric("🧳 Total Pot Trip", f"{avg_trip:,.0f}")
-            c5.metric("👣 Avg Visits", f"{avg_visita:,.2f}")
-
-            eligible_df = df_result[df_result["eligible"]]
-            total_reinvestment = eligible_df["reinvestment"].sum()
-            total_pot_visita = eligible_df["Pot_Visita"].sum()
-            total_pot_trip = eligible_df["Pot_Trip"].sum()
-
-            summary = pd.DataFrame({
-                "Eligible_Count": [eligible_df["eligible"].sum()],
-                "Total_Reinvestment": [total_reinvestment],
-                "Total_Potencial_Visita": [total_pot_visita],
-                "Total_Potencial_Trip": [total_pot_trip],
-            })
-            st.write("### 🔢 Overall Summary")
-            st.dataframe(summary, use_container_width=True)
-
-            # --- By Country ---
-            pais_summary = eligible_df.groupby("Pais").agg(
-                Eligible_Count=("eligible", "sum"),
-                Total_Reinvestment=("reinvestment", "sum"),
-                Total_Potencial_Visita=("Pot_Visita", "sum"),
-                Total_Potencial_Trip=("Pot_Trip", "sum"),
-            ).reset_index()
-
-            pais_summary["%_Reinvestment"] = (pais_summary["Total_Reinvestment"] / total_reinvestment * 100).round(2)
-            pais_summary["%_Potencial_Visita"] = (pais_summary["Total_Potencial_Visita"] / total_pot_visita * 100).round(2)
-            pais_summary["%_Potencial_Trip"] = (pais_summary["Total_Potencial_Trip"] / total_pot_trip * 100).round(2)
-
-            st.write("### 🌎 By Country (with % of Total)")
-            st.dataframe(pais_summary, use_container_width=True)
-
-            # --- By Gestión ---
-            gest_summary = eligible_df.groupby("Gestion").agg(
-                Eligible_Count=("eligible", "sum"),
-                Total_Reinvestment=("reinvestment", "sum"),
-                Total_Potencial_Visita=("Pot_Visita", "sum"),
-                Total_Potencial_Trip=("Pot_Trip", "sum"),
-            ).reset_index()
-
-            gest_summary["%_Reinvestment"] = (gest_summary["Total_Reinvestment"] / total_reinvestment * 100).round(2)
-            gest_summary["%_Potencial_Visita"] = (gest_summary["Total_Potencial_Visita"] / total_pot_visita * 100).round(2)
-            gest_summary["%_Potencial_Trip"] = (gest_summary["Total_Potencial_Trip"] / total_pot_trip * 100).round(2)
-
-            st.write("### 🏢 By Gestión (with % of Total)")
-            st.dataframe(gest_summary, use_container_width=True)
+            with profiled("kpis"):
+                kpi = compute_kpis(df_result)
+            show_kpis(kpi)
+            pais_summary = kpi["by_pais"]
+            gest_summary = kpi["by_gestion"]
+
+            # --- Ineligibility reasons ---
+            st.write("### 🚫 Ineligibility Reasons")
+            st.dataframe(reason_counts(df_result["Reason_Mask"]).rename_axis("Rule").reset_index(), use_container_width=True)
 
             ###############################################
             # PIE CHARTS WITH %
             ###############################################
             st.subheader("📈 Reinvestment Distribution")
 
-            pais_summary["label"] = pais_summary.apply(
-                lambda x: f"{x['Pais']} ({x['%_Reinvestment']}%)", axis=1
-            )
-            gest_summary["label"] = gest_summary.apply(
-                lambda x: f"{x['Gestion']} ({x['%_Reinvestment']}%)", axis=1
-            )
+            with profiled("charts"):
+                pais_summary["label"] = pais_summary.apply(
+                    lambda x: f"{x['Pais']} ({x['%_Reinvestment']}%)", axis=1
+                )
+                gest_summary["label"] = gest_summary.apply(
+                    lambda x: f"{x['Gestion']} ({x['%_Reinvestment']}%)", axis=1
+                )
+
+                st.altair_chart(
+                    alt.Chart(pais_summary).mark_arc(outerRadius=150).encode(
+                        theta=alt.Theta(field="Total_Reinvestment", type="quantitative"),
+                        color=alt.Color(field="label", type="nominal"),
+                        tooltip=["Pais:N", "Total_Reinvestment:Q", "%_Reinvestment:Q"],
+                    ).properties(title="Reinvestment by Country (%)"),
+                    use_container_width=True,
+                )
+
+                st.altair_chart(
+                    alt.Chart(gest_summary).mark_arc(outerRadius=150).encode(
+                        theta=alt.Theta(field="Total_Reinvestment", type="quantitative"),
+                        color=alt.Color(field="label", type="nominal"),
+                        tooltip=["Gestion:N", "Total_Reinvestment:Q", "%_Reinvestment:Q"],
+                    ).properties(title="Reinvestment by Gestión (%)"),
+                    use_container_width=True,
+                )
 
-            st.altair_chart(
-                alt.Chart(pais_summary).mark_arc(outerRadius=150).encode(
-                    theta=alt.Theta(field="Total_Reinvestment", type="quantitative"),
-                    color=alt.Color(field="label", type="nominal"),
-                    tooltip=["Pais:N", "Total_Reinvestment:Q", "%_Reinvestment:Q"],
-                ).properties(title="Reinvestment by Country (%)"),
-                use_container_width=True,
-            )
+            ###############################################
+            # WHAT-IF SCENARIOS
+            ###############################################
+            with st.expander("🔮 What-if scenarios"):
+                st.caption("Comma-separated values to try; every combination is evaluated in one pass.")
+                sw_cols = st.columns(len(pct_dict))
+                try:
+                    pct_ranges = {
+                        k: [float(v) / 100 for v in col.text_input(f"{k} %", f"{pct_dict[k] * 100:g}").split(",") if v.strip()]
+                        for col, k in zip(sw_cols, pct_dict)
+                    }
+                    m1, m2 = st.columns(2)
+                    min_wallets = [float(v) for v in m1.text_input("Minimum reinvestment", f"{min_wallet:g}").split(",") if v.strip()]
+                    caps = [float(v) for v in m2.text_input("Cap per wallet", f"{cap_value:g}").split(",") if v.strip()]
+                except ValueError:
+                    st.error("❌ Use numbers separated by commas")
+                    pct_ranges = None
+
+                if pct_ranges is not None:
+                    grid = scenario_grid(pct_dict, min_wallet, cap_value, country_caps, pct_ranges, min_wallets, caps)
+                    sweep_key = (upload_key, "sweep", params_key({k: tuple(v) for k, v in pct_ranges.items()}, country_caps,
+                                                                     tuple(min_wallets), tuple(caps)))
+                    if st.button(f"▶️ Run {len(grid):,} scenarios"):
+                        st.session_state["sweep_for"] = sweep_key
+                    if st.session_state.get("sweep_for") == sweep_key:
+                        prepared = prepared_cache.get_or_compute(upload_key + ("prepared",), lambda: preprocess(df_raw))
+                        with profiled("scenarios", scenarios=len(grid)):
+                            sweep_table, sweep_by_pais = result_cache.get_or_compute(sweep_key, lambda: sweep(prepared, grid))
+                        sweep_table = sweep_table.reset_index()
+                        st.dataframe(sweep_table, use_container_width=True, hide_index=True)
+                        st.altair_chart(
+                            alt.Chart(sweep_table).mark_circle(size=60).encode(
+                                x=alt.X("Eligible_Count:Q"),
+                                y=alt.Y("Total_Reinvestment:Q"),
+                                tooltip=list(sweep_table.columns),
+                            ).properties(title="Reinvestment vs eligible players per scenario"),
+                            use_container_width=True,
+                        )
+                        st.write("#### By Country")
+                        st.dataframe(sweep_by_pais, use_container_width=True, hide_index=True)
 
-            st.altair_chart(
-                alt.Chart(gest_summary).mark_arc(outerRadius=150).encode(
-                    theta=alt.Theta(field="Total_Reinvestment", type="quantitative"),
-                    color=alt.Color(field="label", type="nominal"),
-                    tooltip=["Gestion:N", "Total_Reinvestment:Q", "%_Reinvestment:Q"],
-                ).properties(title="Reinvestment by Gestión (%)"),
-                use_container_width=True,
-            )
+            ###############################################
+            # BUDGET SOLVER
+            ###############################################
+            with st.expander("🎯 Budget solver"):
+                st.caption("Target total reinvestment per country (0 keeps the sidebar %), "
+                           "or one overall budget that scales every country's %.")
+                b_cols = st.columns(len(pct_dict))
+                budgets = {k: col.number_input(f"{k} budget", 0.0, value=0.0, step=100_000.0)
+                           for col, k in zip(b_cols, pct_dict)}
+                budgets = {k: v for k, v in budgets.items() if v > 0}
+                budget_total = st.number_input("Overall budget", 0.0, value=0.0, step=1_000_000.0)
+                if budgets and budget_total:
+                    st.warning("⚠️ Use either country budgets or the overall budget")
+                elif budgets or budget_total:
+                    prepared = prepared_cache.get_or_compute(upload_key + ("prepared",), lambda: preprocess(df_raw))
+                    solve_key = (upload_key, "solve", params_key(pct_dict, country_caps, min_wallet, cap_value),
+                                 tuple(budgets.items()), budget_total)
+                    try:
+                        with profiled("solve"):
+                            solved_pct, budget_report = result_cache.get_or_compute(solve_key, lambda: (
+                                solve_budgets(prepared, budgets, pct_dict, min_wallet, cap_value, country_caps)
+                                if budgets else
+                                solve_total(prepared, budget_total, pct_dict, min_wallet, cap_value, country_caps)
+                            ))
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        st.dataframe(budget_report, use_container_width=True, hide_index=True)
+                        st.write("Solved percentages (enter them in the sidebar to run the layout):")
+                        st.dataframe(pd.DataFrame({"Pais": list(solved_pct),
+                                                   "%": [round(v * 100, 4) for v in solved_pct.values()]}),
+                                     hide_index=True)
+
+            ###############################################
+            # COMPS THRESHOLD
+            ###############################################
+            with st.expander("🚧 Comps threshold"):
+                st.caption(f"KPIs if rule 1 blocked Comps above another limit (the layout uses {COMPS_LIMIT:,}).")
+                comps_limit = st.number_input("Comps limit", 0.0, value=float(COMPS_LIMIT), step=100.0)
+                if st.checkbox("Explore Comps limits", help="Indexes the upload once; each limit is then a lookup"):
+                    prepared = prepared_cache.get_or_compute(upload_key + ("prepared",), lambda: preprocess(df_raw))
+                    with profiled("thresholds", cached=upload_key + ("thresholds",) in prepared_cache):
+                        t_index = prepared_cache.get_or_compute(upload_key + ("thresholds",), lambda: ThresholdIndex(prepared))
+                        t_kpis = result_cache.get_or_compute(
+                            (upload_key, "thresholds", params_key(pct_dict, country_caps, min_wallet, cap_value)),
+                            lambda: t_index.for_params(pct_dict, min_wallet, cap_value, country_caps),
+                        )
+                        at_limit = t_kpis.kpis(comps_limit)
+                        limits = np.unique(np.quantile(t_index.comps, np.linspace(0, 1, 101))) if len(t_index.comps) else []
+                        curve = t_kpis.curve(limits)
+                    totals = at_limit["totals"]
+                    t1, t2, t3 = st.columns(3)
+                    t1.metric("Eligible", f"{totals['Eligible_Count']:,}",
+                              f"{totals['Eligible_Count'] - kpi['totals']['Eligible_Count']:+,}")
+                    t2.metric("💰 Total Reinvestment", f"{totals['Total_Reinvestment']:,.0f}",
+                              f"{totals['Total_Reinvestment'] - kpi['totals']['Total_Reinvestment']:+,.0f}")
+                    t3.metric("Pot Visita", f"{totals['Total_Potencial_Visita']:,.0f}")
+                    st.dataframe(at_limit["by_pais"], use_container_width=True, hide_index=True)
+                    st.caption("Candidates left by rule 1 (NG = 0, Comps within the limit) before the pct/cap rules")
+                    st.dataframe(t_index.pool(comps_limit), use_container_width=True, hide_index=True)
+                    st.altair_chart(
+                        alt.Chart(curve).mark_line().encode(
+                            x=alt.X("Comps_Limit:Q", title="Comps limit"),
+                            y=alt.Y("Total_Reinvestment:Q"),
+                            tooltip=["Comps_Limit:Q", "Eligible_Count:Q", "Total_Reinvestment:Q"],
+                        ).properties(title="Reinvestment vs Comps limit"),
+                        use_container_width=True,
+                    )
 
             ###############################################
             # EXPORT
             ###############################################
-            def to_excel(df):
-                out = BytesIO()
-                with pd.ExcelWriter(out, engine="xlsxwriter") as wr:
-                    df.to_excel(wr, index=False)
-                return out.getvalue()
-
-            st.download_button(
-                "⬇️ Download Excel",
-                to_excel(df_result),
-                "promotion_layout.xlsx"
+            layout_cols = [c if c != "Reason_Mask" else "Reason_Not_Eligible" for c in df_result.columns]
+            e1, e2 = st.columns([1, 3])
+            export_fmt = e1.selectbox("Export format", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_LABELS[f])
+            export_cols = e2.multiselect(
+                "Export columns (empty = all)", layout_cols,
+                help="e.g. player id + reinvestment + Reason_Not_Eligible for the CRM loader",
             )
+            s1, s2 = st.columns([1, 3])
+            split_by = s1.selectbox("Split by", ["None"] + SPLIT_KEYS)
+            split_by = None if split_by == "None" else split_by
+            too_big = export_fmt == "xlsx" and len(df_result) > XLSX_MAX_ROWS - 1
+            split_mode = None
+            if split_by or too_big:
+                modes = ["zip"] if export_fmt != "xlsx" else ["sheets", "zip"]
+                split_mode = s2.radio(
+                    "Split into", modes, horizontal=True,
+                    format_func=lambda m: "Sheets of one workbook" if m == "sheets" else "Files in a zip",
+                    help=f"Parts are also cut every {XLSX_MAX_ROWS - 1:,} rows (Excel row limit)",
+                )
+            export_key = (upload_key, params_key(pct_dict, country_caps, min_wallet, cap_value),
+                          export_fmt, tuple(export_cols), split_by, split_mode)
+            if st.button("📦 Prepare export"):
+                if split_mode:
+                    export_jobs.submit(export_key, export_split, df_result, split_mode, export_fmt,
+                                       split_by, XLSX_MAX_ROWS - 1, export_cols)
+                else:
+                    export_jobs.submit(export_key, export_layout, df_result, export_fmt, export_cols)
+            suffix, mime, _ = EXPORT_FORMATS[export_fmt]
+            if split_mode == "zip":
+                suffix, mime = ".zip", "application/zip"
+            export_status(export_key, f"promotion_layout{suffix}", mime, f"⬇️ Download {EXPORT_LABELS[export_fmt]}")
+
+            ###############################################
+            # WRITE BACK TO DATABASE
+            ###############################################
+            with st.expander("🗄️ Write layout to database"):
+                st.caption("Uses the server/login from the 'Load from SQL' tab. "
+                           f"Columns: extra columns to keep + {', '.join(WRITEBACK_COLS)}.")
+                w1, w2 = st.columns(2)
+                wb_table = w1.text_input("Target table", "promo_layout")
+                wb_batch = int(w2.number_input("Rows per batch", 1_000, value=DEFAULT_BATCH_ROWS, step=5_000))
+                wb_create = w1.checkbox("Create the table")
+                wb_replace = w2.checkbox("Replace the rows already in the table")
+                if st.button("⬆️ Write to database"):
+                    if not sql_server:
+                        st.error("❌ Fill in the server in the 'Load from SQL' tab")
+                    else:
+                        try:
+                            with st.spinner("Writing…"), profiled("write_back"), \
+                                    get_sql_pool(sql_url(sql_server, sql_database)).connection() as conn:
+                                stats = write_layout(conn, df_result, wb_table, [clean(c) for c in keep_cols] + WRITEBACK_COLS,
+                                                     wb_batch, create=wb_create, replace=wb_replace)
+                        except Exception as e:
+                            st.error(f"SQL Error: {e}")
+                        else:
+                            st.success(f"✅ {stats['rows']:,} rows written to {wb_table} in {stats['seconds']:.1f}s "
+                                       f"({stats['rows_per_sec']:,.0f} rows/s)")
+
+            show_profile()
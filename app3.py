@@ -1,124 +1,13 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from io import BytesIO
-import unicodedata
-import re
+
+from engine3 import COMPS_LIMIT, apply_reinvestment, clean
+from threshold_index import App3ThresholdIndex
 
 st.set_page_config(page_title="Reinvestment Promotion Builder", layout="wide")
 st.title("🎰 Casino Reinvestment Promotion Builder")
 
-###############################################
-# CLEAN / NORMALIZE COLUMN NAMES
-###############################################
-def clean(col):
-    if not isinstance(col, str):
-        col = str(col)
-    col = col.strip()
-    col = "".join(c for c in unicodedata.normalize("NFKD", col) if not unicodedata.combining(c))
-    col = re.sub(r"[^0-9A-Za-z_ ]", "", col)
-    col = col.replace(" ", "_")
-    col = re.sub(r"_+", "_", col)
-    return col.strip("_").lower()  # lowercased for safety
-
-
-def normalize_gestion(val):
-    if not isinstance(val, str):
-        val = str(val)
-    val = "".join(c for c in unicodedata.normalize("NFKD", val) if not unicodedata.combining(c))
-    val = val.strip().replace(" ", "_").upper()
-    return re.sub(r"[^0-9A-Za-z_]", "", val)
-
-###############################################
-# FLEXIBLE COLUMN RENAME (handles Excel quirks)
-###############################################
-def rename_columns(df):
-    cols = {c.lower(): c for c in df.columns}
-    mapping = {
-        "pot_xvisita": "Pot_Visita",
-        "prom_teoneto_trip": "TeoricoNeto",
-        "prom_winneto_trip": "WinTotalNeto",
-        "prom_visita_trip": "Visitas",
-        "pot_trip": "Pot_Trip",
-    }
-
-    for key, val in mapping.items():
-        if key in cols:
-            df.rename(columns={cols[key]: val}, inplace=True)
-    return df
-
-###############################################
-# MAIN REINVESTMENT ENGINE
-###############################################
-def apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps):
-    df = df.copy()
-    df = rename_columns(df)
-
-    if "Pot_Visita" in df.columns:
-        df["WxV"] = pd.to_numeric(df["Pot_Visita"], errors="coerce").fillna(0)
-    else:
-        st.error("Column Pot_xVisita / Pot_Visita not found.")
-        return None
-
-    required = ["Gestion", "Pais", "NG", "TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip", "Pot_Visita", "Promo2", "Comps"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        st.error(f"❌ Missing required columns: {missing}")
-        st.write("Available:", list(df.columns))
-        return None
-
-    num_cols = ["TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip", "Pot_Visita", "WxV", "Promo2", "Comps"]
-    for c in num_cols:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
-
-    df["Potencial"] = df[["TeoricoNeto", "WinTotalNeto"]].max(axis=1)
-    df["GESTION_KEY"] = df["Gestion"].apply(normalize_gestion)
-
-    def choose_pot(row):
-        if row["GESTION_KEY"] in ("URY_LOCAL", "URY_RESTO"):
-            return row["Pot_Visita"]
-        return row["Pot_Trip"]
-
-    df["pot_used"] = df.apply(choose_pot, axis=1)
-    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
-    df["pct"] = df["GESTION_KEY"].map(pct_norm).fillna(0)
-    df["eligible"] = (pd.to_numeric(df["NG"], errors="coerce") == 0)
-
-    df["reinvestment_raw"] = df["pot_used"] * df["pct"]
-    df["reinvestment"] = 0.0
-
-    elig = df["eligible"]
-    df.loc[elig, "reinvestment"] = df.loc[elig, "reinvestment_raw"]
-    df.loc[elig & (df["reinvestment"] < min_wallet), "reinvestment"] = min_wallet
-    df.loc[elig, "reinvestment"] = df.loc[elig, "reinvestment"].clip(upper=cap)
-
-    # Ineligibility rules
-    df.loc[df["Comps"] > 200, ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[df["reinvestment"] <= df["Promo2"], ["eligible", "reinvestment"]] = [False, 0]
-    df.loc[df["reinvestment"] > df["WxV"], ["eligible", "reinvestment"]] = [False, 0]
-
-    # Apply country caps
-    def apply_caps(row):
-        pais = str(row.get("Pais", "")).strip()
-        reinv = row.get("reinvestment", 0)
-        for key, rule in country_caps.items():
-            if key.replace(" ", "_").upper() == pais.replace(" ", "_").upper():
-                reinv = max(reinv, rule["min"])
-                reinv = min(reinv, rule["max"])
-                break
-        return reinv
-
-    df["reinvestment"] = df.apply(apply_caps, axis=1)
-
-    df["Rango_Reinv"] = np.select(
-        [df["reinvestment"] == 0, df["reinvestment"] <= df["WxV"] * 0.5, df["reinvestment"] <= df["WxV"]],
-        ["NO APLICA", "<50%", "50-100%"],
-        default="NO APLICA"
-    )
-
-    df["reinvestment"] = df["reinvestment"].round(2)
-    return df
-
 ###############################################
 # SIDEBAR CONFIG
 ###############################################
@@ -161,7 +50,11 @@ if uploaded:
     st.write(df_raw.head())
 
     if st.button("Generate Promotion Layout"):
-        df_result = apply_reinvestment(df_raw, pct_dict, min_wallet, cap_value, country_caps)
+        try:
+            df_result = apply_reinvestment(df_raw, pct_dict, min_wallet, cap_value, country_caps)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            df_result = None
         if df_result is not None:
             st.success("✅ Promotion Layout Created")
             st.dataframe(df_result)
@@ -183,3 +76,30 @@ if uploaded:
                 return out.getvalue()
 
             st.download_button("⬇️ Download Excel", to_excel(df_result), "promotion_layout.xlsx")
+
+    ###############################################
+    # COMPS THRESHOLD (sorted index, no reruns)
+    ###############################################
+    with st.expander("🚧 Comps threshold"):
+        comps_limit = st.number_input("Comps limit", 0.0, value=float(COMPS_LIMIT), step=50.0)
+        if st.checkbox("Explore Comps limits", help="Indexes the upload once; each limit is then a lookup"):
+            # one index per upload, one lookup table per parameter set (kept for this session only)
+            store = st.session_state.setdefault("comps_index", {})
+            if store.get("file_id") != uploaded.file_id:
+                store.clear()
+                store["file_id"] = uploaded.file_id
+            params = (tuple(pct_dict.items()), tuple((k, r["min"], r["max"]) for k, r in country_caps.items()),
+                      min_wallet, cap_value)
+            try:
+                if "index" not in store:
+                    store["index"] = App3ThresholdIndex(df_raw)
+                if store.get("params") != params:
+                    store["kpis"] = store["index"].for_params(pct_dict, min_wallet, cap_value, country_caps)
+                    store["params"] = params
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                at_limit = store["kpis"].kpis(comps_limit)
+                st.metric("💰 Total Reinvestment", f"{at_limit['Total_Reinvestment']:,.0f}")
+                st.metric("✅ Eligible", f"{at_limit['Eligible_Count']:,}")
+                st.dataframe(at_limit["by_pais"], use_container_width=True, hide_index=True)
@@ -0,0 +1,599 @@
+###############################################
+# ⏱️ REINVESTMENT ENGINE BENCHMARKS
+# Timings only; correctness is checked by the tests (python -m pytest -q).
+# python benchmark.py [--suite caps app3 params kpis sql pool writeback duckdb polars parallel scenarios
+#                      solver thresholds] [--rows 100000 1000000 5000000]
+# python benchmark.py --suite regression [--rows 10000 ... 10000000]   (appends to benchmark_results.jsonl)
+# python benchmark.py --compare [benchmark_results.jsonl]              (last two commits side by side)
+###############################################
+
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+import engine
+import engine3
+import engine_duckdb
+import engine_polars
+import export
+import kpis
+import parallel
+import profiling
+import scenarios
+import solver
+import threshold_index
+import sql_source
+
+COUNTRIES = ["ARG", "BRA", "URY Local", "URY Resto", "Otros"]
+
+COUNTRY_CAPS = {
+    "URY Local": {"min": 100.0, "max": 10000.0},
+    "URY Resto": {"min": 100.0, "max": 10000.0},
+    "ARG": {"min": 200.0, "max": 10000.0},
+    "BRA": {"min": 200.0, "max": 10000.0},
+    "Otros": {"min": 200.0, "max": 10000.0},
+}
+
+###############################################
+# SYNTHETIC DATA
+###############################################
+def make_caps_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Pais": rng.choice(COUNTRIES, n),
+        "reinvestment_raw": rng.gamma(1.5, 2000.0, n).round(2),
+    })
+
+def make_player_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Gestion": rng.choice(COUNTRIES, n),
+        "Pais": rng.choice(COUNTRIES, n),
+        "NG": rng.choice([0, 1], n, p=[0.85, 0.15]),
+        "Prom_TeoNeto_Trip": rng.gamma(2.0, 500.0, n).round(2),
+        "Prom_WinNeto_Trip": rng.normal(800.0, 1500.0, n).round(2),
+        "Prom_Visita_Trip": rng.integers(1, 12, n),
+        "Pot_Trip": rng.gamma(2.0, 4000.0, n).round(2),
+        "Pot_xVisita": rng.gamma(1.5, 2500.0, n).round(2),
+        "Promo2": rng.gamma(1.0, 150.0, n).round(2),
+        "Comps": rng.gamma(0.8, 150.0, n).round(2),
+    })
+
+PCT_DICT = {"ARG": 0.10, "BRA": 0.15, "URY Local": 0.08, "URY Resto": 0.08, "Otros": 0.05}
+
+# share of players per country in the production base
+COUNTRY_MIX = {"URY Local": 0.42, "URY Resto": 0.18, "ARG": 0.22, "BRA": 0.13, "Otros": 0.05}
+
+def make_casino_frame(n, seed=0):
+    """
+    Realistic base in the upload layout: the country mix above, Gestion
+    mostly following Pais, skewed (lognormal) theoretical/pot values, a
+    Comps tail past 2000, some NG = 1, a few blank NG/Pais and a player id.
+    """
+    rng = np.random.default_rng(seed)
+    names, weights = list(COUNTRY_MIX), list(COUNTRY_MIX.values())
+    pais = rng.choice(names, n, p=weights).astype(object)
+    gestion = np.where(rng.random(n) < 0.9, pais, rng.choice(names, n, p=weights)).astype(object)
+    pais[rng.random(n) < 0.005] = None
+
+    visits = rng.integers(1, 13, n)
+    teo = rng.lognormal(6.0, 1.1, n)
+    pot_trip = teo * rng.uniform(2.0, 8.0, n)
+    ng = rng.choice([0.0, 1.0], n, p=[0.88, 0.12])
+    ng[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame({
+        "Player_Id": np.arange(1_000_000, 1_000_000 + n),
+        "Gestion": gestion,
+        "Pais": pais,
+        "NG": ng,
+        "Prom_TeoNeto_Trip": teo.round(2),
+        "Prom_WinNeto_Trip": (teo * rng.normal(1.0, 0.9, n)).round(2),
+        "Prom_Visita_Trip": visits,
+        "Pot_Trip": pot_trip.round(2),
+        "Pot_xVisita": (pot_trip / visits * rng.uniform(0.8, 1.2, n)).round(2),
+        "Promo2": (teo * rng.gamma(0.6, 0.15, n)).round(2),
+        "Comps": rng.lognormal(5.0, 1.2, n).round(2),
+    })
+
+###############################################
+# REFERENCE (pre-vectorization row-wise path)
+###############################################
+def country_caps_rowwise(df, country_caps):
+    def apply_country_caps(row):
+        pais = str(row.get("Pais", "")).strip()
+        reinv = row.get("reinvestment_raw", 0)
+        for key, rule in country_caps.items():
+            if engine.normalize_gestion(key) == engine.normalize_gestion(pais):
+                reinv = max(reinv, rule["min"])
+                reinv = min(reinv, rule["max"])
+                break
+        return reinv
+
+    return df.apply(apply_country_caps, axis=1)
+
+def kpis_multipass(df_result):
+    """The app's original KPI section: filter per table, one groupby per key"""
+    eligible_df = df_result[df_result["eligible"]]
+    totals = {c: eligible_df[c].sum() for c in ["reinvestment", "Pot_Visita", "Pot_Trip"]}
+    out = {}
+    for key in ["Pais", "Gestion"]:
+        s = eligible_df.groupby(key, observed=True).agg(
+            Eligible_Count=("eligible", "sum"),
+            Total_Reinvestment=("reinvestment", "sum"),
+            Total_Potencial_Visita=("Pot_Visita", "sum"),
+            Total_Potencial_Trip=("Pot_Trip", "sum"),
+        ).reset_index()
+        s["%_Reinvestment"] = (s["Total_Reinvestment"] / totals["reinvestment"] * 100).round(2)
+        s["%_Potencial_Visita"] = (s["Total_Potencial_Visita"] / totals["Pot_Visita"] * 100).round(2)
+        s["%_Potencial_Trip"] = (s["Total_Potencial_Trip"] / totals["Pot_Trip"] * 100).round(2)
+        out[key] = s
+    return out
+
+###############################################
+# BENCHMARKS
+###############################################
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def bench_country_caps(rows):
+    print(f"{'rows':>10} {'row-wise s':>12} {'vectorized s':>13} {'speedup':>9}")
+    for n in rows:
+        df = make_caps_frame(n)
+        _, t_ref = timed(country_caps_rowwise, df, COUNTRY_CAPS)
+        _, t_new = timed(engine.apply_country_caps, df["reinvestment_raw"], df["Pais"], COUNTRY_CAPS)
+        print(f"{n:>10,} {t_ref:>12.3f} {t_new:>13.4f} {t_ref / t_new:>8.0f}x")
+
+def bench_app3_engine(rows):
+    print(f"{'rows':>10} {'row-wise s':>12} {'columnar s':>11} {'speedup':>9}")
+    for n in rows:
+        df = make_player_frame(n)
+        args = (df, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+        _, t_ref = timed(lambda: engine3.apply_reinvestment(*args, columnar=False))
+        _, t_new = timed(lambda: engine3.apply_reinvestment(*args, columnar=True))
+        print(f"{n:>10,} {t_ref:>12.3f} {t_new:>11.4f} {t_ref / t_new:>8.1f}x")
+
+def bench_param_change(rows):
+    """One country's pct changes: full engine vs incremental apply_params"""
+    print(f"{'rows':>10} {'preprocess s':>13} {'full run s':>11} {'1-country s':>12} {'speedup':>9}")
+    for n in rows:
+        df = make_player_frame(n)
+        pre, t_pre = timed(engine.preprocess, df)
+        engine.apply_params(pre, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+        pct = dict(PCT_DICT, ARG=0.12)
+        _, t_full = timed(engine.apply_reinvestment, df, pct, 100.0, 20000.0, COUNTRY_CAPS)
+        _, t_inc = timed(engine.apply_params, pre, pct, 100.0, 20000.0, COUNTRY_CAPS)
+        print(f"{n:>10,} {t_pre:>13.3f} {t_full:>11.3f} {t_inc:>12.4f} {t_full / t_inc:>8.1f}x")
+
+def bench_kpis(rows):
+    print(f"{'rows':>10} {'multi-pass s':>13} {'single-pass s':>14} {'speedup':>9}")
+    for n in rows:
+        result = engine.apply_reinvestment(make_player_frame(n), PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+        _, t_ref = timed(kpis_multipass, result)
+        _, t_new = timed(kpis.compute_kpis, result)
+        print(f"{n:>10,} {t_ref:>13.4f} {t_new:>14.4f} {t_ref / t_new:>8.1f}x")
+
+def bench_sql(rows):
+    """SELECT * into pandas vs projected / prefiltered batched fetch (in-memory SQLite)"""
+    print(f"{'rows':>10} {'select * s':>11} {'projected s':>12} {'prefilter s':>12} {'rows kept':>10}")
+    for n in rows:
+        df = make_player_frame(n)
+        df["Notes"] = "x" * 40  # a wide column nobody needs
+        conn = sqlite3.connect(":memory:")
+        df.to_sql(sql_source.DEFAULT_TABLE, conn, index=False)
+        _, t_ref = timed(pd.read_sql, f"SELECT * FROM {sql_source.DEFAULT_TABLE}", conn)
+        _, t_new = timed(sql_source.load_sql, conn)
+        pre, t_pre = timed(sql_source.load_sql, conn, sql_source.DEFAULT_TABLE, True)
+        conn.close()
+        print(f"{n:>10,} {t_ref:>11.3f} {t_new:>12.3f} {t_pre:>12.3f} {len(pre) / n:>9.0%}")
+
+def bench_pool(rows, sessions=8, loads=4, max_size=3):
+    """Concurrent SQL loads: a new connection per load vs the shared ConnectionPool (SQLite file)"""
+    print(f"{'rows':>10} {'connect/load s':>15} {'pooled s':>9} {'connections':>12} {'peak open':>10}")
+    # over a real network each new connection also pays the login handshake; SQLite doesn't
+    for n in rows:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            with sqlite3.connect(path) as conn:
+                make_player_frame(n).to_sql(sql_source.DEFAULT_TABLE, conn, index=False)
+            url = f"sqlite:///{path}"
+            lock = threading.Lock()
+            live = {"open": 0, "peak": 0}
+
+            def counted_connect():
+                with lock:
+                    live["open"] += 1
+                    live["peak"] = max(live["peak"], live["open"])
+                return _CountedConnection(sql_source.connect(url), live, lock)
+
+            def unpooled(_):
+                conn = counted_connect()
+                try:
+                    return len(sql_source.load_sql(conn))
+                finally:
+                    conn.close()
+
+            pool = sql_source.ConnectionPool(counted_connect, max_size=max_size)
+
+            def pooled(_):
+                with pool.connection() as conn:
+                    return len(sql_source.load_sql(conn))
+
+            def run(load):
+                with ThreadPoolExecutor(sessions) as ex:
+                    return list(ex.map(load, range(sessions * loads)))
+
+            _, t_ref = timed(run, unpooled)
+            live["peak"] = 0
+            _, t_new = timed(run, pooled)
+            conns = f"{sessions * loads}->{pool.created}"
+            print(f"{n:>10,} {t_ref:>15.3f} {t_new:>9.3f} {conns:>12} {live['peak']:>10}")
+            pool.close_all()
+        finally:
+            os.remove(path)
+
+def bench_writeback(rows, naive_rows=20_000):
+    """INSERT + commit per row (first naive_rows, extrapolated) vs write_layout (SQLite file)"""
+    print(f"{'rows':>10} {'per-row rows/s':>15} {'bulk s':>8} {'bulk rows/s':>12} {'speedup':>9}")
+    for n in rows:
+        result = engine.apply_reinvestment(make_player_frame(n), PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            conn = sql_source.connect(f"sqlite:///{path}")
+            layout = export.project_layout(result, sql_source.WRITEBACK_COLS)
+            sql_source.write_layout(conn, result.iloc[:0], "naive", create=True)
+            sql = f"INSERT INTO naive VALUES ({', '.join('?' * len(layout.columns))})"
+            t0 = time.perf_counter()
+            for row in islice(export.iter_rows(layout), naive_rows):
+                conn.execute(sql, row)
+                conn.commit()
+            naive_rps = min(n, naive_rows) / (time.perf_counter() - t0)
+
+            stats = sql_source.write_layout(conn, result, "promo_layout", create=True)
+            conn.close()
+            print(f"{n:>10,} {naive_rps:>15,.0f} {stats['seconds']:>8.3f} {stats['rows_per_sec']:>12,.0f} "
+                  f"{stats['rows_per_sec'] / naive_rps:>8.0f}x")
+        finally:
+            os.remove(path)
+
+def bench_duckdb(rows):
+    """pandas engine (file read + run) vs one DuckDB query over the same Parquet file"""
+    print(f"{'rows':>10} {'pandas s':>9} {'duckdb s':>9} {'speedup':>9} {'COPY->parquet s':>16}")
+    for n in rows:
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        out = path.replace(".parquet", "_layout.parquet")
+        try:
+            make_player_frame(n).to_parquet(path)
+            _, t_ref = timed(lambda: engine.apply_reinvestment(pd.read_parquet(path), PCT_DICT, 100.0, 20000.0,
+                                                               COUNTRY_CAPS))
+            _, t_new = timed(engine_duckdb.apply_reinvestment, path, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+            _, t_copy = timed(engine_duckdb.write_reinvestment, path, out, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+            print(f"{n:>10,} {t_ref:>9.3f} {t_new:>9.3f} {t_ref / t_new:>8.1f}x {t_copy:>16.3f}")
+        finally:
+            for p in (path, out):
+                if os.path.exists(p):
+                    os.remove(p)
+
+def bench_polars(rows):
+    """Full parameter change (min wallet moved) + KPIs: pandas engine vs Polars LazyFrame plan"""
+    print(f"{'rows':>10} {'pandas s':>9} {'polars s':>9} {'speedup':>9} {'kpis pd s':>10} {'kpis pl s':>10}")
+    for n in rows:
+        df = make_player_frame(n)
+        pre = engine.preprocess(df)
+        pre_pl = engine_polars.prepare(df)
+        ref, t_ref = timed(engine.apply_params, pre, PCT_DICT, 150.0, 20000.0, COUNTRY_CAPS)
+        _, t_new = timed(engine_polars.apply_params, pre_pl, PCT_DICT, 150.0, 20000.0, COUNTRY_CAPS)
+        _, t_kref = timed(kpis.compute_kpis, ref)
+        _, t_knew = timed(engine_polars.compute_kpis, pre_pl, PCT_DICT, 150.0, 20000.0, COUNTRY_CAPS)
+        print(f"{n:>10,} {t_ref:>9.3f} {t_new:>9.3f} {t_ref / t_new:>8.1f}x {t_kref:>10.3f} {t_knew:>10.3f}")
+
+def bench_parallel(rows, workers=(1, 2, 4, 8, 16)):
+    """
+    Full run plus KPIs: serial engine vs the process pool (rows and Pais
+    partitions) per worker count, on a started pool. `parent s` is this process's share of the
+    pool run (coerce + shared-memory inputs + assembling the layout), which no
+    worker count removes; `start s` is the pool's one-off start-up.
+    """
+    # one worker would run serially; on a single CPU 2 workers still show the pool's overhead
+    workers = [w for w in workers if 1 < w <= (os.cpu_count() or 1)] or [2]
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'rows':>10} {'partition':>9} {'workers':>8} {'start s':>8} {'serial s':>9} {'parent s':>9} "
+          f"{'workers s':>10} {'pool s':>9} {'speedup':>9}")
+    for n in rows:
+        df = make_player_frame(n)
+        # the pool returns the KPIs too, so the serial side includes compute_kpis
+        _, t_ref = timed(lambda: kpis.compute_kpis(
+            engine.apply_reinvestment(df, PCT_DICT, 150.0, 20000.0, COUNTRY_CAPS)))
+        for w in workers:
+            executor = parallel.make_executor(w)
+            try:
+                # start every worker and import the engine there, outside the timed runs
+                _, t_start = timed(lambda: list(executor.map(parallel.row_spans, [1] * w, [1] * w)))
+                for partition in parallel.PARTITIONS:
+                    # min_rows=0: time the pool even where the CLI would stay serial
+                    with profiling.Profiler() as prof:
+                        _, t_new = timed(parallel.apply_reinvestment_parallel, df, PCT_DICT, 150.0,
+                                         20000.0, COUNTRY_CAPS, w, partition, executor, 0)
+                    stages = prof.top_level()
+                    t_parent = stages["coerce"] + stages["share"] + stages["assemble"]
+                    print(f"{n:>10,} {partition:>9} {w:>8} {t_start:>8.3f} {t_ref:>9.3f} {t_parent:>9.3f} "
+                          f"{stages['pool']:>10.3f} {t_new:>9.3f} {t_ref / t_new:>8.1f}x")
+            finally:
+                executor.shutdown()
+
+def bench_scenarios(rows, timed_runs=12):
+    """3x3x3x2x3 = 162 scenario sweep vs apply_params + compute_kpis per scenario (sampled, extrapolated)"""
+    grid = scenarios.scenario_grid(
+        PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS,
+        pct_ranges={"ARG": [0.08, 0.10, 0.12], "URY Local": [0.06, 0.08, 0.10], "BRA": [0.10, 0.15, 0.20]},
+        min_wallets=[50.0, 100.0], caps=[5000.0, 10000.0, 20000.0],
+    )
+    print(f"{'rows':>10} {'scenarios':>10} {'sweep s':>9} {'loop s (est)':>13} {'speedup':>9}")
+    for n in rows:
+        pre = engine.preprocess(make_casino_frame(n))
+        _, t_sweep = timed(scenarios.sweep, pre, grid)
+        sample = np.linspace(0, len(grid) - 1, timed_runs).astype(int)
+        t0 = time.perf_counter()
+        for i in sample:
+            sc = grid[i]
+            res = engine.apply_params(pre, sc["pct_dict"], sc["min_wallet"], sc["cap"], sc["country_caps"])
+            kpis.compute_kpis(res)
+        t_loop = (time.perf_counter() - t0) / len(sample) * len(grid)
+        print(f"{n:>10,} {len(grid):>10} {t_sweep:>9.3f} {t_loop:>13.3f} {t_loop / t_sweep:>8.1f}x")
+
+def _bisect_pct(pre, country, budget, steps=40):
+    """The naive solver: bisection on pct, each step a full apply_params + compute_kpis"""
+    lo, hi = 0.0, 1.0
+    for _ in range(steps):
+        mid = (lo + hi) / 2
+        res = engine.apply_params(pre, dict(PCT_DICT, **{country: mid}), 100.0, 20000.0, COUNTRY_CAPS)
+        by_pais = kpis.compute_kpis(res)["by_pais"].set_index("Pais")
+        lo, hi = (mid, hi) if by_pais.loc[country, "Total_Reinvestment"] <= budget else (lo, mid)
+    return lo
+
+def bench_solver(rows, share=1.5):
+    """Budgets at `share` x today's reinvestment per country: sorted-breakpoint solver vs bisection on the engine"""
+    print(f"{'rows':>10} {'solve s':>9} {'bisect s (est)':>15} {'speedup':>9} {'max |gap|':>10}")
+    for n in rows:
+        pre = engine.preprocess(make_casino_frame(n))
+        today = kpis.compute_kpis(engine.apply_params(pre, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS))
+        budgets = {r.Pais: r.Total_Reinvestment * share for r in today["by_pais"].itertuples()}
+        (_, report), t_solve = timed(solver.solve_budgets, pre, budgets, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+        country = next(iter(budgets))
+        _, t_one = timed(_bisect_pct, pre, country, budgets[country])
+        t_bisect = t_one * len(budgets)
+        print(f"{n:>10,} {t_solve:>9.3f} {t_bisect:>15.3f} {t_bisect / t_solve:>8.1f}x "
+              f"{report['Gap'].abs().max():>10.2f}")
+
+def bench_thresholds(rows, limits=(0, 200, 500, 2000, 1e12)):
+    """KPIs per Comps limit: sorted index lookups vs apply_params + compute_kpis per limit (app.py and app3.py)"""
+    print(f"{'rows':>10} {'engine':>7} {'index s':>9} {'params s':>9} {'lookup ms':>10} {'rerun s':>9} {'speedup':>9}")
+    for n in rows:
+        df = make_casino_frame(n)
+        pre = engine.preprocess(df)
+        variants = {
+            "app": (partial(threshold_index.ThresholdIndex, pre),
+                    lambda limit: kpis.compute_kpis(engine.apply_params(
+                        threshold_index.with_comps_limit(pre, limit), PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS))),
+            "app3": (partial(threshold_index.App3ThresholdIndex, df),
+                     lambda limit: engine3.apply_reinvestment(df, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS,
+                                                              comps_limit=limit)["reinvestment"].sum()),
+        }
+        for name, (build, rerun) in variants.items():
+            index, t_index = timed(build)
+            t_kpis, t_params = timed(index.for_params, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+            t_lookup = sum(timed(t_kpis.kpis, limit)[1] for limit in limits) / len(limits)
+            t_rerun = sum(timed(rerun, limit)[1] for limit in limits) / len(limits)
+            print(f"{n:>10,} {name:>7} {t_index:>9.3f} {t_params:>9.3f} {t_lookup * 1000:>10.2f} {t_rerun:>9.3f} "
+                  f"{t_rerun / t_lookup:>8.0f}x")
+
+###############################################
+# REGRESSION SUITE (stored results, compared across commits)
+###############################################
+REGRESSION_ROWS = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_FILE = "benchmark_results.jsonl"
+XLSX_ROWS = 100_000
+
+def kpis_app3(df_result):
+    """app3.py's KPI block"""
+    return {
+        "Total_Reinvestment": df_result["reinvestment"].sum(),
+        "Avg_TeoricoNeto": df_result["TeoricoNeto"].mean(),
+        "Avg_WinTotalNeto": df_result["WinTotalNeto"].mean(),
+    }
+
+def to_excel_app3(df):
+    """app3.py's in-memory ExcelWriter export"""
+    out = io.BytesIO()
+    with pd.ExcelWriter(out, engine="xlsxwriter") as wr:
+        df.to_excel(wr, index=False)
+    return out.getvalue()
+
+def _export_to_temp(df, fmt):
+    if fmt == "xlsx":
+        to_excel_app3(df)
+        return
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        df.to_csv(path, index=False)
+    finally:
+        os.remove(path)
+
+def run_app(df, xlsx):
+    """app.py pipeline: engine, single-pass KPIs, background-export writers"""
+    with profiling.stage("engine"):
+        result = engine.apply_reinvestment(df, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+    with profiling.stage("kpis"):
+        kpis.compute_kpis(result)
+    for fmt in ["csv"] + (["xlsx"] if xlsx else []):
+        with profiling.stage(f"export_{fmt}"):
+            os.remove(export.export_layout(result, fmt))
+
+def run_app3(df, xlsx):
+    """app3.py pipeline: columnar engine3, its KPI block and to_csv / ExcelWriter"""
+    with profiling.stage("engine"):
+        result = engine3.apply_reinvestment(df, PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+    with profiling.stage("kpis"):
+        kpis_app3(result)
+    for fmt in ["csv"] + (["xlsx"] if xlsx else []):
+        with profiling.stage(f"export_{fmt}"):
+            _export_to_temp(result, fmt)
+
+VARIANTS = {"app": run_app, "app3": run_app3}
+
+def run_info():
+    """Commit, machine and library versions stored with every result line"""
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+def bench_regression(rows, repeat=1, xlsx_rows=XLSX_ROWS, results=RESULTS_FILE, seed=0):
+    """
+    Engine, KPIs and export for the app.py and app3.py variants on
+    make_casino_frame data; best of `repeat` per stage. Every stage (nested
+    engine stages included) is appended to `results` as a JSON line.
+    """
+    info = run_info()
+    print(f"commit {info['commit']}{' (dirty)' if info['dirty'] else ''}, {info['cpus']} cpus")
+    print(f"{'rows':>10} {'variant':>8} {'stage':<32} {'best s':>9} {'rows/s':>12}")
+    lines = []
+    for n in rows:
+        df = make_casino_frame(n, seed)
+        for variant, run in VARIANTS.items():
+            best = {}
+            for _ in range(repeat):
+                with profiling.Profiler() as prof:
+                    run(df, xlsx=n <= xlsx_rows)
+                for rec in prof.summary():
+                    if rec["stage"] not in best or rec["wall_s"] < best[rec["stage"]]["wall_s"]:
+                        best[rec["stage"]] = rec
+            for rec in best.values():
+                if rec["depth"] == 0:
+                    print(f"{n:>10,} {variant:>8} {rec['stage']:<32} {rec['wall_s']:>9.3f} {n / rec['wall_s']:>12,.0f}")
+                lines.append({**info, "suite": "regression", "seed": seed, "variant": variant, "rows": n,
+                              "repeat": repeat, **rec})
+        del df
+    if results:
+        with open(results, "a") as fh:
+            for line in lines:
+                fh.write(json.dumps(line) + "\n")
+        print(f"{len(lines)} results appended to {results}")
+
+def compare_results(path=RESULTS_FILE, base=None, head=None, threshold=0.10):
+    """Top-level stage times of two commits (default: the last two in the file) and their ratio"""
+    with open(path) as fh:
+        lines = [json.loads(line) for line in fh if line.strip()]
+    commits = list(dict.fromkeys(line["commit"] for line in lines))
+    if head is None:
+        head = commits[-1]
+    if base is None:
+        older = [c for c in commits if c != head]
+        if not older:
+            print(f"only one commit ({head}) in {path}; nothing to compare")
+            return
+        base = older[-1]
+
+    def times(commit):
+        # the latest run of each (variant, rows, stage) for that commit wins
+        return {(r["variant"], r["rows"], r["stage"]): r["wall_s"]
+                for r in lines if r["commit"] == commit and r["depth"] == 0}
+
+    old, new = times(base), times(head)
+    print(f"{'rows':>10} {'variant':>8} {'stage':<16} {base:>10} {head:>10} {'ratio':>7}")
+    for key in sorted(set(old) & set(new), key=lambda k: (k[1], k[0], k[2])):
+        variant, n, stage = key
+        ratio = new[key] / old[key] if old[key] else float("nan")
+        flag = "  slower" if ratio > 1 + threshold else ("  faster" if ratio < 1 - threshold else "")
+        print(f"{n:>10,} {variant:>8} {stage:<16} {old[key]:>10.3f} {new[key]:>10.3f} {ratio:>6.2f}x{flag}")
+
+class _CountedConnection:
+    """sqlite3 connection that tracks how many are open (for bench_pool)"""
+
+    def __init__(self, conn, live, lock):
+        self._conn, self._live, self._lock = conn, live, lock
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            with self._lock:
+                self._live["open"] -= 1
+        self._conn.close()
+
+SUITES = {
+    "caps": bench_country_caps,
+    "app3": bench_app3_engine,
+    "params": bench_param_change,
+    "kpis": bench_kpis,
+    "sql": bench_sql,
+    "pool": bench_pool,
+    "writeback": bench_writeback,
+    "duckdb": bench_duckdb,
+    "polars": bench_polars,
+    "parallel": bench_parallel,
+    "scenarios": bench_scenarios,
+    "solver": bench_solver,
+    "thresholds": bench_thresholds,
+    "regression": bench_regression,
+}
+DEFAULT_ROWS = [100_000, 1_000_000, 5_000_000]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the reinvestment engine")
+    parser.add_argument("--suite", nargs="+", choices=sorted(SUITES),
+                        default=[name for name in SUITES if name != "regression"])
+    parser.add_argument("--rows", type=int, nargs="+",
+                        help=f"default {DEFAULT_ROWS}; regression: {REGRESSION_ROWS}")
+    parser.add_argument("--repeat", type=int, default=1, help="regression: best of this many runs per stage")
+    parser.add_argument("--xlsx-rows", type=int, default=XLSX_ROWS, help="regression: also time xlsx up to this size")
+    parser.add_argument("--results", default=RESULTS_FILE, help="regression: JSON lines file to append to")
+    parser.add_argument("--compare", nargs="?", const=RESULTS_FILE, metavar="RESULTS",
+                        help="Compare the last two commits in a results file (or --base/--head) and exit")
+    parser.add_argument("--base", help="--compare: baseline commit")
+    parser.add_argument("--head", help="--compare: commit to check")
+    args = parser.parse_args()
+    if args.compare:
+        compare_results(args.compare, args.base, args.head)
+        raise SystemExit(0)
+
+    suites = dict(SUITES, regression=partial(bench_regression, repeat=args.repeat, xlsx_rows=args.xlsx_rows,
+                                             results=args.results))
+    for name in args.suite:
+        print(f"\n## {name}")
+        suites[name](args.rows or (REGRESSION_ROWS if name == "regression" else DEFAULT_ROWS))
@@ -0,0 +1,134 @@
+###############################################
+# 🗃️ CONTENT-HASHED LRU CACHES
+# Streamlit reruns the whole script on every widget change; these keep
+# the parsed upload and the engine results so a rerun with the same file
+# and parameters is a dictionary lookup instead of a re-parse/re-run.
+###############################################
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+class LRUCache:
+    """
+    Thread-safe mapping that evicts the least recently used entries past
+    maxsize entries or maxbytes (approx_nbytes of the values; the newest
+    entry is always kept). get_or_compute runs compute() once per key:
+    concurrent callers for the same key wait for it.
+    """
+
+    def __init__(self, maxsize, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        size = approx_nbytes(value) if self.maxbytes is not None else 0
+        with self._lock:
+            self.nbytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while len(self._data) > 1 and (len(self._data) > self.maxsize
+                                           or (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                old, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old)
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self._lock:
+                if key in self._data:
+                    self.hits += 1
+                    self._data.move_to_end(key)
+                    return self._data[key]
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # another thread is computing this key; if it fails, try again here
+            pending.wait()
+        try:
+            value = compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+_MISSING = object()
+
+def approx_nbytes(value, _seen=None):
+    """
+    Shallow memory footprint of a cached value: pandas / NumPy / Polars
+    buffers, summed through containers and plain objects' attributes
+    (each object counted once; object-dtype strings count as pointers).
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage() if isinstance(value, pd.Index) else value.memory_usage(index=True)
+        return int(np.sum(usage))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "estimated_size"):  # polars.DataFrame
+        return int(value.estimated_size())
+    if isinstance(value, dict):
+        return sum(approx_nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(approx_nbytes(v, seen) for v in value)
+    if hasattr(value, "__dict__"):
+        return sum(approx_nbytes(v, seen) for v in vars(value).values())
+    return sys.getsizeof(value)
+
+###############################################
+# KEYS
+###############################################
+def content_hash(data):
+    """Digest of the raw upload bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def params_key(pct_dict, country_caps, min_wallet, cap):
+    """Hashable key for one engine configuration (dict order kept: first match wins)"""
+    return (
+        tuple(pct_dict.items()),
+        tuple((k, rule["min"], rule["max"]) for k, rule in country_caps.items()),
+        min_wallet,
+        cap,
+    )
@@ -0,0 +1,456 @@
+###############################################
+# 🖥️ HEADLESS BATCH RUNNER
+# python cli.py base.xlsx -o promotion_layout.xlsx --pct ARG=12 --caps "URY Local=100:8000"
+###############################################
+
+import argparse
+import json
+import sys
+import tempfile
+
+import engine
+import engine_duckdb
+import engine_polars
+import export
+import kpis
+import loaders
+import parallel
+import profiling
+import scenarios
+import solver
+import sql_source
+import streaming
+import threshold_index
+from profiling import stage
+
+###############################################
+# ARGUMENT PARSING
+###############################################
+def parse_pct(items):
+    """['ARG=12', ...] -> {'ARG': 0.12, ...} (percent in, fraction out, like the sidebar)"""
+    out = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        out[key.strip()] = float(value) / 100
+    return out
+
+def parse_caps(items):
+    """['URY Local=100:8000', ...] -> {'URY Local': {'min': 100.0, 'max': 8000.0}, ...}"""
+    out = {}
+    for item in items:
+        key, _, bounds = item.partition("=")
+        lo, _, hi = bounds.partition(":")
+        out[key.strip()] = {"min": float(lo), "max": float(hi)}
+    return out
+
+def parse_values(items):
+    """['ARG=8,10,12', ...] -> {'ARG': [0.08, 0.10, 0.12], ...} (percent in, fraction out)"""
+    out = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        out[key.strip()] = [float(v) / 100 for v in values.split(",") if v.strip()]
+    return out
+
+def parse_budgets(items):
+    """['ARG=2000000', ...] -> {'ARG': 2000000.0, ...}"""
+    out = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        out[key.strip()] = float(value)
+    return out
+
+def load_config(args):
+    """Defaults <- --config JSON <- explicit flags"""
+    pct_dict = dict(engine.DEFAULT_PCT)
+    country_caps = dict(engine.DEFAULT_COUNTRY_CAPS)
+    min_wallet, cap = engine.DEFAULT_MIN_WALLET, engine.DEFAULT_CAP
+
+    if args.config:
+        with open(args.config) as fh:
+            cfg = json.load(fh)
+        pct_dict.update({k: v / 100 for k, v in cfg.get("pct", {}).items()})
+        country_caps.update(cfg.get("country_caps", {}))
+        min_wallet = cfg.get("min_wallet", min_wallet)
+        cap = cfg.get("cap", cap)
+
+    pct_dict.update(parse_pct(args.pct))
+    country_caps.update(parse_caps(args.caps))
+    if args.min_wallet is not None:
+        min_wallet = args.min_wallet
+    if args.cap is not None:
+        cap = args.cap
+    return pct_dict, country_caps, min_wallet, cap
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Build a reinvestment promotion layout without Streamlit")
+    parser.add_argument("input", help="Source base (.csv, .xlsx, .parquet, .feather, .arrow), "
+                                      "or a database: sqlite:///base.db, odbc:DRIVER={...};SERVER=...")
+    parser.add_argument("-o", "--output", help="Layout to write (.xlsx, .csv, .csv.gz, .parquet or .zip)")
+    parser.add_argument("--columns", nargs="*", metavar="COL",
+                        help="Only export these layout columns, e.g. Player_Id reinvestment Reason_Not_Eligible")
+    parser.add_argument("--config", help='JSON file: {"pct": {"ARG": 10}, "country_caps": {...}, "min_wallet": 100, "cap": 20000}')
+    parser.add_argument("--pct", nargs="*", default=[], metavar="PAIS=PCT", help="Percentage per country, e.g. ARG=10")
+    parser.add_argument("--caps", nargs="*", default=[], metavar="PAIS=MIN:MAX", help="Country cap, e.g. BRA=200:10000")
+    parser.add_argument("--min-wallet", type=float, help="Minimum reinvestment")
+    parser.add_argument("--cap", type=float, help="Cap per wallet")
+    parser.add_argument("--keep-cols", nargs="*", default=[], metavar="COL",
+                        help="Extra columns to read and keep in the layout (e.g. a player id)")
+    parser.add_argument("--csv-engine", choices=["c", "python", "pyarrow"], help="pandas CSV parser to use")
+    parser.add_argument("--engine", choices=["pandas", "duckdb", "polars"], default="pandas",
+                        help="duckdb: one SQL query, polars: a lazy plan; .csv/.parquet inputs are scanned in place")
+    parser.add_argument("--memory-limit", metavar="SIZE",
+                        help="duckdb engine: memory cap (e.g. 4GB); past it DuckDB spills to the temp dir")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pandas engine: run the rules in this many processes (0 = one per CPU); "
+                             f"bases under {parallel.MIN_PARALLEL_ROWS:,} rows run serially")
+    parser.add_argument("--partition", choices=parallel.PARTITIONS, default="rows",
+                        help="--workers: split the base by row ranges or by whole Pais groups")
+    parser.add_argument("--kpis", action="store_true", help="Print the overall / by country / by Gestion KPI tables")
+    parser.add_argument("--split-by", choices=export.SPLIT_KEYS,
+                        help="One xlsx sheet (or one file in a .zip output) per Pais/Gestion")
+    parser.add_argument("--max-rows", type=int, default=export.XLSX_MAX_ROWS - 1,
+                        help="Cut sheets/files at this many rows (default: the xlsx row limit)")
+    parser.add_argument("--zip-format", choices=list(export.EXPORT_FORMATS), default="xlsx",
+                        help="Format of the files inside a .zip output")
+    parser.add_argument("--table", default=sql_source.DEFAULT_TABLE, help="Table/view to read from a database input")
+    parser.add_argument("--eligible-only", action="store_true",
+                        help="Database input: only fetch rows with NG = 0 and Comps <= 2000 (filtered server-side)")
+    parser.add_argument("--fetch-rows", type=int, default=sql_source.DEFAULT_FETCH_ROWS,
+                        help="Database input: rows per fetch batch")
+    parser.add_argument("--write-table", help="Also bulk-insert the layout into this database table")
+    parser.add_argument("--write-to", metavar="URL", help="Database for --write-table (default: the input database)")
+    parser.add_argument("--batch-rows", type=int, default=sql_source.DEFAULT_BATCH_ROWS, help="Rows per INSERT batch")
+    parser.add_argument("--create-table", action="store_true", help="Create --write-table first")
+    parser.add_argument("--replace", action="store_true", help="Delete the rows already in --write-table (same transaction)")
+    parser.add_argument("--chunksize", type=int, help="Stream a CSV base in chunks of this many rows (CSV output only)")
+    parser.add_argument("--sweep-pct", nargs="*", default=[], metavar="PAIS=P1,P2,...",
+                        help="What-if sweep: percentages to try per country, e.g. ARG=8,10,12")
+    parser.add_argument("--sweep-min-wallet", type=float, nargs="+", metavar="V", help="What-if sweep: minimums to try")
+    parser.add_argument("--sweep-cap", type=float, nargs="+", metavar="V", help="What-if sweep: caps to try")
+    parser.add_argument("--comps-limits", type=float, nargs="+", metavar="V",
+                        help="KPI totals if rule 1 blocked Comps above each of these limits (sorted index, no reruns)")
+    parser.add_argument("--budget", nargs="*", default=[], metavar="PAIS=AMOUNT",
+                        help="Solve each country's pct for a target total reinvestment, e.g. ARG=2000000")
+    parser.add_argument("--budget-total", type=float, metavar="AMOUNT",
+                        help="Scale every country's pct by one factor to hit this overall reinvestment")
+    parser.add_argument("--max-pct", type=float, default=100, help="Upper bound for solved percentages (at most 100)")
+    parser.add_argument("--profile", nargs="?", const="-", metavar="PATH",
+                        help="Per-stage wall/CPU time and memory as JSON lines (to PATH, default stderr)")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="--profile: also trace peak allocations per stage (tracemalloc; slower)")
+    return parser
+
+###############################################
+# RUN
+###############################################
+def print_kpis(kpi):
+    for title, key in [("Overall Summary", "summary"), ("By Country", "by_pais"), ("By Gestion", "by_gestion")]:
+        print(f"\n## {title}")
+        print(kpi[key].to_string(index=False))
+
+def run_streaming(args, pct_dict, country_caps, min_wallet, cap):
+    is_sql = sql_source.is_sql_url(args.input)
+    if not ((is_sql or args.input.lower().endswith(".csv")) and args.output.lower().endswith(".csv")):
+        print("error: --chunksize needs a .csv or database input and a .csv output", file=sys.stderr)
+        return 2
+    extra_cols = [engine.clean(c) for c in args.keep_cols]
+    try:
+        with stage("stream"):
+            kpis_out = _stream(args, is_sql, extra_cols, pct_dict, country_caps, min_wallet, cap)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    elapsed = profiling.current().top_level()["stream"]
+
+    totals = kpis_out["totals"]
+    print(f"{kpis_out['rows']:,} rows, {totals['Eligible_Count']:,} eligible -> {args.output}", file=sys.stderr)
+    print(f"  {'stream':<15} {elapsed:8.3f}s", file=sys.stderr)
+    print(f"  Total_Reinvestment {totals['Total_Reinvestment']:,.2f}", file=sys.stderr)
+    if args.kpis:
+        print_kpis(kpis_out)
+    return 0
+
+def _stream(args, is_sql, extra_cols, pct_dict, country_caps, min_wallet, cap):
+    if is_sql:
+        conn = sql_source.connect(args.input)
+        try:
+            chunks = sql_source.iter_sql_chunks(conn, args.table, args.eligible_only, extra_cols, args.chunksize)
+            return streaming.stream_frames(chunks, args.output, pct_dict, min_wallet, cap, country_caps)
+        finally:
+            conn.close()
+    return streaming.stream_reinvestment(
+        args.input, args.output, pct_dict, min_wallet, cap, country_caps, chunksize=args.chunksize,
+        extra_cols=extra_cols,
+    )
+
+def write_back(args, df_result):
+    """--write-table: bulk insert into the target database, rows/sec to stderr"""
+    url = args.write_to or args.input
+    if not sql_source.is_sql_url(url):
+        print("error: --write-table needs --write-to sqlite:///... or odbc:... (or a database input)", file=sys.stderr)
+        return 2
+    columns = args.columns or [engine.clean(c) for c in args.keep_cols] + sql_source.WRITEBACK_COLS
+    conn = sql_source.connect(url)
+    try:
+        with stage("write_back"):
+            stats = sql_source.write_layout(conn, df_result, args.write_table, columns, args.batch_rows,
+                                            create=args.create_table, replace=args.replace)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        conn.close()
+    print(f"{stats['rows']:,} rows -> {args.write_table} in {stats['seconds']:.3f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    sweeping = bool(args.sweep_pct or args.sweep_min_wallet or args.sweep_cap)
+    budgeting = bool(args.budget or args.budget_total is not None)
+    if not (args.output or args.write_table or sweeping or budgeting or args.comps_limits):
+        parser.error("give -o/--output and/or --write-table")
+    if args.budget and args.budget_total is not None:
+        parser.error("--budget and --budget-total are exclusive")
+    if budgeting and (sweeping or args.chunksize):
+        parser.error("--budget/--budget-total cannot be combined with a sweep or --chunksize")
+    if args.comps_limits and (sweeping or budgeting or args.chunksize):
+        parser.error("--comps-limits cannot be combined with a sweep, a budget or --chunksize")
+    if args.chunksize and not args.output:
+        parser.error("--chunksize needs -o/--output")
+    if args.split_by and (sweeping or args.comps_limits or args.chunksize or not args.output
+                          or not (args.output.lower().endswith(".zip")
+                                  or export.format_for_path(args.output) == "xlsx")):
+        parser.error("--split-by needs an .xlsx or .zip -o/--output for the layout "
+                     "(not a sweep, --comps-limits or --chunksize)")
+    pct_dict, country_caps, min_wallet, cap = load_config(args)
+
+    with profiling.Profiler(trace_alloc=args.trace_alloc) as prof:
+        status = run(args, pct_dict, country_caps, min_wallet, cap)
+    if args.profile:
+        context = {"input": args.input, "engine": args.engine}
+        if args.profile == "-":
+            prof.write_json_lines(sys.stderr, **context)
+        else:
+            with open(args.profile, "a") as fh:
+                prof.write_json_lines(fh, **context)
+    return status
+
+def run(args, pct_dict, country_caps, min_wallet, cap):
+    if args.sweep_pct or args.sweep_min_wallet or args.sweep_cap:
+        return run_sweep(args, pct_dict, country_caps, min_wallet, cap)
+    if args.budget or args.budget_total is not None:
+        return run_budget(args, pct_dict, country_caps, min_wallet, cap)
+    if args.comps_limits:
+        return run_thresholds(args, pct_dict, country_caps, min_wallet, cap)
+    if args.chunksize:
+        return run_streaming(args, pct_dict, country_caps, min_wallet, cap)
+
+    extra_cols = [engine.clean(c) for c in args.keep_cols]
+    if args.engine == "duckdb" and args.input.lower().endswith((".csv", ".parquet", ".pq")):
+        return run_duckdb(args, pct_dict, country_caps, min_wallet, cap, extra_cols)
+    if args.engine == "polars" and args.input.lower().endswith((".csv", ".parquet", ".pq")):
+        try:
+            with stage("read+engine"):
+                df_result = engine_polars.apply_reinvestment(args.input, pct_dict, min_wallet, cap, country_caps,
+                                                             extra_cols)
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        return finish(args, df_result)
+
+    with stage("read"):
+        if sql_source.is_sql_url(args.input):
+            conn = sql_source.connect(args.input)
+            try:
+                df_raw = sql_source.load_sql(conn, args.table, args.eligible_only, extra_cols, args.fetch_rows)
+            except ValueError as e:
+                print(f"error: {e}", file=sys.stderr)
+                return 2
+            finally:
+                conn.close()
+        else:
+            df_raw = loaders.load_table(args.input, csv_engine=args.csv_engine, extra_cols=extra_cols)
+
+    kpi = None
+    try:
+        with stage("engine", rows=len(df_raw)):
+            if args.engine == "duckdb":
+                df_result = engine_duckdb.apply_reinvestment(df_raw, pct_dict, min_wallet, cap, country_caps)
+            elif args.engine == "polars":
+                df_result = engine_polars.apply_reinvestment(df_raw, pct_dict, min_wallet, cap, country_caps)
+            elif args.workers != 1:
+                # KPIs come merged from the partitions, no second pass over the layout
+                df_result, kpi = parallel.apply_reinvestment_parallel(
+                    df_raw, pct_dict, min_wallet, cap, country_caps, workers=args.workers or None,
+                    partition=args.partition,
+                )
+            else:
+                df_result = engine.apply_reinvestment(df_raw, pct_dict, min_wallet, cap, country_caps)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    return finish(args, df_result, kpi)
+
+def read_base(args):
+    """Whole base (database or file) for the modes that work on a preprocessed base"""
+    extra_cols = [engine.clean(c) for c in args.keep_cols]
+    with stage("read"):
+        if sql_source.is_sql_url(args.input):
+            conn = sql_source.connect(args.input)
+            try:
+                return sql_source.load_sql(conn, args.table, args.eligible_only, extra_cols, args.fetch_rows)
+            finally:
+                conn.close()
+        return loaders.load_table(args.input, csv_engine=args.csv_engine, extra_cols=extra_cols)
+
+def run_sweep(args, pct_dict, country_caps, min_wallet, cap):
+    """KPI table per scenario (-o: .csv/.xlsx/.parquet, otherwise printed); by country with --kpis"""
+    grid = scenarios.scenario_grid(pct_dict, min_wallet, cap, country_caps, parse_values(args.sweep_pct),
+                                   args.sweep_min_wallet, args.sweep_cap)
+    df_raw = read_base(args)
+    try:
+        with stage("preprocess"):
+            pre = engine.preprocess(df_raw)
+        with stage("sweep", scenarios=len(grid)):
+            table, by_pais = scenarios.sweep(pre, grid)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"{len(grid):,} scenarios x {pre.n:,} rows -> {args.output or 'stdout'}", file=sys.stderr)
+    for name, secs in profiling.current().top_level().items():
+        print(f"  {name:<15} {secs:8.3f}s", file=sys.stderr)
+    if args.output:
+        _, _, write = export.EXPORT_FORMATS[export.format_for_path(args.output)]
+        write(table.reset_index(), args.output)
+    else:
+        print(table.reset_index().to_string(index=False))
+    if args.kpis:
+        print("\n## By Country")
+        print(by_pais.to_string(index=False))
+    return 0
+
+def run_budget(args, pct_dict, country_caps, min_wallet, cap):
+    """Solve pct for --budget / --budget-total; with -o/--write-table, run the layout on the solved pct"""
+    df_raw = read_base(args)
+    try:
+        with stage("preprocess"):
+            pre = engine.preprocess(df_raw)
+        with stage("solve"):
+            if args.budget:
+                pct_dict, report = solver.solve_budgets(pre, parse_budgets(args.budget), pct_dict, min_wallet,
+                                                        cap, country_caps, args.max_pct / 100)
+            else:
+                pct_dict, report = solver.solve_total(pre, args.budget_total, pct_dict, min_wallet, cap,
+                                                      country_caps, args.max_pct / 100)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    out = sys.stderr if (args.output or args.write_table) else sys.stdout
+    print(report.to_string(index=False), file=out)
+    print("solved: --pct " + " ".join(f'"{k}={v * 100:.4f}"' for k, v in pct_dict.items()), file=out)
+    if not (args.output or args.write_table):
+        return 0
+    with stage("engine", rows=pre.n):
+        df_result = engine.apply_params(pre, pct_dict, min_wallet, cap, country_caps)
+    return finish(args, df_result)
+
+def run_thresholds(args, pct_dict, country_caps, min_wallet, cap):
+    """KPI totals per --comps-limits value (-o: .csv/.xlsx/.parquet, otherwise printed); by country with --kpis"""
+    df_raw = read_base(args)
+    try:
+        with stage("preprocess"):
+            pre = engine.preprocess(df_raw)
+        with stage("index"):
+            index = threshold_index.ThresholdIndex(pre)
+        with stage("params"):
+            t_kpis = index.for_params(pct_dict, min_wallet, cap, country_caps)
+        with stage("lookup", limits=len(args.comps_limits)):
+            table = t_kpis.curve(args.comps_limits)
+            table.insert(1, "Candidates", [int(index.pool(limit)["Candidates"].sum()) for limit in args.comps_limits])
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"{len(args.comps_limits):,} Comps limits x {pre.n:,} rows -> {args.output or 'stdout'}", file=sys.stderr)
+    for name, secs in profiling.current().top_level().items():
+        print(f"  {name:<15} {secs:8.3f}s", file=sys.stderr)
+    if args.output:
+        _, _, write = export.EXPORT_FORMATS[export.format_for_path(args.output)]
+        write(table, args.output)
+    else:
+        print(table.to_string(index=False))
+    if args.kpis:
+        for limit in args.comps_limits:
+            print(f"\n## By Country (Comps <= {limit:g})")
+            print(t_kpis.kpis(limit)["by_pais"].to_string(index=False))
+            print(f"\n## Rule 1 candidates (Comps <= {limit:g})")
+            print(index.pool(limit).to_string(index=False))
+    return 0
+
+def run_duckdb(args, pct_dict, country_caps, min_wallet, cap, extra_cols):
+    """DuckDB over the input file; plain .csv/.parquet layouts are COPYed without pandas"""
+    con = engine_duckdb.connect(memory_limit=args.memory_limit,
+                                temp_directory=tempfile.gettempdir() if args.memory_limit else None)
+    direct = (args.output and args.output.lower().endswith((".csv", ".parquet"))
+              and not (args.kpis or args.write_table or args.columns or args.split_by))
+    try:
+        if direct:
+            with stage("duckdb") as info:
+                rows = engine_duckdb.write_reinvestment(args.input, args.output, pct_dict, min_wallet, cap,
+                                                        country_caps, extra_cols, con)
+            print(f"{rows:,} rows -> {args.output}", file=sys.stderr)
+            print(f"  {'duckdb':<15} {info['wall_s']:8.3f}s", file=sys.stderr)
+            return 0
+        with stage("read+engine"):
+            df_result = engine_duckdb.apply_reinvestment(args.input, pct_dict, min_wallet, cap, country_caps,
+                                                         extra_cols, con)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        con.close()
+    return finish(args, df_result)
+
+def finish(args, df_result, kpi=None):
+    """KPIs (unless already computed), file export and write-back for a computed layout"""
+    if args.kpis and kpi is None:
+        with stage("kpis"):
+            kpi = kpis.compute_kpis(df_result)
+
+    if args.output:
+        try:
+            with stage("decode_reasons"):
+                layout = export.project_layout(df_result, args.columns)
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+
+        fmt = export.format_for_path(args.output)
+        with stage("write", format=fmt):
+            if args.output.lower().endswith(".zip"):
+                export.write_zip_split(layout, args.output, args.zip_format, args.split_by, args.max_rows)
+            elif fmt == "xlsx" and (args.split_by or len(layout) > args.max_rows):
+                export.write_xlsx_split(layout, args.output, args.split_by, args.max_rows)
+            else:
+                _, _, write = export.EXPORT_FORMATS[fmt]
+                write(layout, args.output)
+
+    print(f"{len(df_result):,} rows, {int(df_result['eligible'].sum()):,} eligible -> {args.output or args.write_table}",
+          file=sys.stderr)
+    for name, secs in profiling.current().top_level().items():
+        print(f"  {name:<15} {secs:8.3f}s", file=sys.stderr)
+    if args.write_table:
+        status = write_back(args, df_result)
+        if status:
+            return status
+    if args.kpis:
+        print_kpis(kpi)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+###############################################
+# 🧠 REINVESTMENT ENGINE (headless)
+# Imported by app.py and cli.py; must not import streamlit/altair.
+###############################################
+
+import pandas as pd
+import numpy as np
+import unicodedata
+import re
+
+from profiling import stage
+
+###############################################
+# DEFAULTS (same as the app sidebar)
+###############################################
+DEFAULT_PCT = {"ARG": 0.10, "BRA": 0.15, "URY Local": 0.08, "URY Resto": 0.08, "Otros": 0.05}
+DEFAULT_COUNTRY_CAPS = {
+    "URY Local": {"min": 100.0, "max": 10000.0},
+    "URY Resto": {"min": 100.0, "max": 10000.0},
+    "ARG": {"min": 200.0, "max": 10000.0},
+    "BRA": {"min": 200.0, "max": 10000.0},
+    "Otros": {"min": 200.0, "max": 10000.0},
+}
+DEFAULT_MIN_WALLET = 100.0
+DEFAULT_CAP = 20000.0
+
+###############################################
+# INPUT SCHEMA
+###############################################
+RENAME_MAP = {
+    "Pot_xVisita": "Pot_Visita",
+    "Prom_TeoNeto_Trip": "TeoricoNeto",
+    "Prom_WinNeto_Trip": "WinTotalNeto",
+    "Prom_Visita_Trip": "Visitas",
+    "Pot_Trip": "Pot_Trip",
+}
+REQUIRED_COLS = ["Gestion", "Pais", "NG", "TeoricoNeto", "WinTotalNeto",
+                 "Visitas", "Pot_Trip", "Pot_Visita", "Promo2", "Comps"]
+NUM_COLS = ["TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip",
+            "Pot_Visita", "Promo2", "Comps"]
+
+###############################################
+# HELPERS
+###############################################
+def clean(col):
+    """Normalize column names"""
+    if not isinstance(col, str):
+        col = str(col)
+    col = col.strip()
+    col = "".join(c for c in unicodedata.normalize("NFKD", col) if not unicodedata.combining(c))
+    col = re.sub(r"[^0-9A-Za-z_ ]", "", col)
+    col = col.replace(" ", "_")
+    col = re.sub(r"_+", "_", col)
+    return col.strip("_")
+
+def normalize_gestion(name):
+    return str(name).strip().lower().replace("_", "").replace(" ", "")
+
+def map_by_key(values, lookup, default=0):
+    """lookup[normalize_gestion(v)] for every row, normalizing each distinct value once"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = np.array([lookup.get(normalize_gestion(u), default) for u in uniques], dtype=float)
+    return mapped[codes]
+
+def build_cap_lookup(country_caps):
+    """Normalize country cap keys once (first matching key wins)"""
+    lookup = {}
+    for key, rule in country_caps.items():
+        lookup.setdefault(normalize_gestion(key), (rule["min"], rule["max"]))
+    return lookup
+
+def apply_country_caps(values, pais, country_caps):
+    """Clip values to the [min, max] cap of each row's Pais (vectorized)"""
+    lookup = build_cap_lookup(country_caps)
+    codes, uniques = pd.factorize(pais, use_na_sentinel=False)
+    lo = np.full(len(uniques), -np.inf)
+    hi = np.full(len(uniques), np.inf)
+    for i, p in enumerate(uniques):
+        rule = lookup.get(normalize_gestion(p))
+        if rule is not None:
+            lo[i], hi[i] = rule
+    return np.clip(np.asarray(values, dtype=float), lo[codes], hi[codes])
+
+###############################################
+# INELIGIBILITY REASONS (one bit per rule)
+###############################################
+COMPS_LIMIT = 2000  # rule 1: Comps above this block the wallet
+
+REASON_COMPS = np.uint8(1)
+REASON_NG = np.uint8(2)
+REASON_PROMO2 = np.uint8(4)
+REASON_NO_APLICA = np.uint8(8)
+
+REASONS = {
+    REASON_COMPS: f"Comps > {COMPS_LIMIT}",
+    REASON_NG: "NG = 1",
+    REASON_PROMO2: "Reinvestment <= Promo2",
+    REASON_NO_APLICA: "Rango_Reinv = NO APLICA",
+}
+
+# Text for every non-zero mask, in rule order (mask 0 -> NaN)
+REASON_LABELS = [
+    ", ".join(text for bit, text in REASONS.items() if m & bit)
+    for m in range(1, 2 ** len(REASONS))
+]
+
+def decode_reasons(mask):
+    """Reason_Mask -> categorical reason text (NaN when eligible)"""
+    codes = np.asarray(mask, dtype=np.int16) - 1
+    return pd.Categorical.from_codes(codes, categories=REASON_LABELS)
+
+def reason_counts(mask):
+    """Rows flagged by each rule"""
+    mask = np.asarray(mask)
+    return pd.Series(
+        {text: int(np.count_nonzero(mask & bit)) for bit, text in REASONS.items()},
+        name="Count",
+    )
+
+def with_reason_text(df):
+    """Swap Reason_Mask for human-readable Reason_Not_Eligible (display/export)"""
+    out = df.drop(columns="Reason_Not_Eligible", errors="ignore")
+    pos = out.columns.get_loc("Reason_Mask")
+    out = out.drop(columns="Reason_Mask")
+    out.insert(pos, "Reason_Not_Eligible", decode_reasons(df["Reason_Mask"]))
+    return out
+
+###############################################
+# 🧠 MAIN REINVESTMENT ENGINE
+# preprocess(): parameter-independent, once per upload
+# apply_params(): sidebar-dependent, cheap and incremental
+###############################################
+RANGO_LABELS = ["NO APLICA", "<50%", "50-100%"]
+
+class Prepared:
+    """
+    Cleaned base plus everything the rules need that does not depend on
+    pct/caps/min/cap: coerced numerics, Pais groups, eligibility base and
+    rules 1-2. Also remembers the last parameter run for incremental updates.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.n = len(frame)
+
+        # --- Pais groups (each distinct value normalized once) ---
+        self.codes, uniques = pd.factorize(frame["Pais"], use_na_sentinel=False)
+        self.keys = [normalize_gestion(u) for u in uniques]
+        order = np.argsort(self.codes, kind="stable")
+        bounds = np.searchsorted(self.codes[order], np.arange(len(self.keys) + 1))
+        self.group_rows = [order[bounds[g]:bounds[g + 1]] for g in range(len(self.keys))]
+
+        self.pot_visita = frame["Pot_Visita"].to_numpy(dtype=float)
+        self.promo2 = frame["Promo2"].to_numpy(dtype=float)
+        self.wxv = frame["WxV"].to_numpy(dtype=float)
+
+        # --- Eligibility base and rules 1-2 ---
+        self.eligible_base = (pd.to_numeric(frame["NG"], errors="coerce") == 0).to_numpy()
+        rule_comps = (frame["Comps"] > COMPS_LIMIT).to_numpy()
+        rule_ng = (frame["NG"] == 1).to_numpy()
+        self.blocked = rule_comps | rule_ng
+        self.base_mask = np.where(rule_comps, REASON_COMPS, 0) | np.where(rule_ng, REASON_NG, 0)
+
+        self.last = None
+
+    def group_params(self, pct_dict, country_caps):
+        return group_params(self.keys, pct_dict, country_caps)
+
+def group_params(keys, pct_dict, country_caps):
+    """pct, cap min and cap max per Pais group (keys: normalized Pais per group)"""
+    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
+    caps = build_cap_lookup(country_caps)
+    pct = np.array([pct_norm.get(k, 0) for k in keys], dtype=float)
+    lo = np.array([caps.get(k, (-np.inf, np.inf))[0] for k in keys], dtype=float)
+    hi = np.array([caps.get(k, (-np.inf, np.inf))[1] for k in keys], dtype=float)
+    return pct, lo, hi
+
+def preprocess(df):
+    """Rename, validate and coerce the base; compute parameter-independent fields"""
+    with stage("rename"):
+        df = df.copy()
+
+        # --- Standardize column names ---
+        df.rename(columns=RENAME_MAP, inplace=True)
+
+    missing = [c for c in REQUIRED_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    with stage("to_numeric"):
+        for c in NUM_COLS:
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+            if df[c].dtype == np.float32:
+                # loaders only downcast losslessly; keep the arithmetic in float64
+                df[c] = df[c].astype(np.float64)
+
+    # --- Derived fields ---
+    with stage("derived"):
+        df["WxV"] = df["Pot_Visita"]
+        df["Potencial"] = df[["TeoricoNeto", "WinTotalNeto"]].max(axis=1)
+    with stage("groups"):
+        return Prepared(df)
+
+def _compute_rows(pre, rows, pct_g, lo_g, hi_g, min_wallet, cap):
+    """Run the parameter-dependent rules on `rows` (slice or index array)"""
+    codes = pre.codes[rows]
+
+    # --- Normalize pct per country / raw reinvestment ---
+    pct = pct_g[codes]
+    raw = pre.pot_visita[rows] * pct
+
+    # --- Apply country caps ---
+    reinv = np.clip(raw, lo_g[codes], hi_g[codes])
+
+    # --- Apply global limits only to eligible (bounds ordered like Series.clip) ---
+    eligible = pre.eligible_base[rows]
+    reinv = np.where(eligible, np.clip(reinv, min(min_wallet, cap), max(min_wallet, cap)), 0.0)
+
+    # --- Rules 1-2: Comps > 2000, NG = 1 (precomputed) ---
+    blocked = pre.blocked[rows]
+    reinv[blocked] = 0
+    eligible = eligible & ~blocked
+
+    # --- Rule 3: Reinvestment <= Promo2 ---
+    rule_promo2 = reinv <= pre.promo2[rows]
+    reinv[rule_promo2] = 0
+    eligible &= ~rule_promo2
+
+    # --- Reinvestment range label ---
+    wxv = pre.wxv[rows]
+    rango = np.select([reinv == 0, reinv <= wxv * 0.5, reinv <= wxv], [0, 1, 2], default=0).astype(np.int8)
+
+    # --- Rule 4: Rango_Reinv = NO APLICA ---
+    rule_no_aplica = rango == 0
+    reinv[rule_no_aplica] = 0
+    eligible &= ~rule_no_aplica
+
+    mask = (pre.base_mask[rows]
+            | np.where(rule_promo2, REASON_PROMO2, 0)
+            | np.where(rule_no_aplica, REASON_NO_APLICA, 0))
+    return {"pct": pct, "eligible": eligible, "Reason_Mask": mask,
+            "reinvestment_raw": raw, "reinvestment": reinv.round(2), "rango": rango}
+
+def apply_params(pre, pct_dict, min_wallet, cap, country_caps):
+    """
+    Parameter-dependent stage. When min_wallet/cap are unchanged since the
+    previous call on `pre`, only the Pais groups whose pct or caps changed
+    are recomputed.
+    """
+    pct_g, lo_g, hi_g = pre.group_params(pct_dict, country_caps)
+    last = pre.last
+
+    with stage("rules"):
+        if last is not None and (last["min_wallet"], last["cap"]) == (min_wallet, cap):
+            changed = np.flatnonzero((pct_g != last["pct_g"]) | (lo_g != last["lo_g"]) | (hi_g != last["hi_g"]))
+            rows = np.concatenate([pre.group_rows[g] for g in changed]) if len(changed) else np.empty(0, dtype=np.intp)
+            if len(rows) < pre.n // 2:
+                cols = {k: v.copy() for k, v in last["cols"].items()}
+                part = _compute_rows(pre, rows, pct_g, lo_g, hi_g, min_wallet, cap)
+                for k, v in part.items():
+                    cols[k][rows] = v
+            else:
+                cols = _compute_rows(pre, slice(None), pct_g, lo_g, hi_g, min_wallet, cap)
+        else:
+            cols = _compute_rows(pre, slice(None), pct_g, lo_g, hi_g, min_wallet, cap)
+
+    pre.last = {"min_wallet": min_wallet, "cap": cap, "pct_g": pct_g, "lo_g": lo_g, "hi_g": hi_g, "cols": cols}
+
+    with stage("assemble"):
+        df = pre.frame.copy(deep=False)
+        df["pct"] = cols["pct"]
+        df["eligible"] = cols["eligible"]
+        df["Reason_Mask"] = cols["Reason_Mask"]
+        df["reinvestment_raw"] = cols["reinvestment_raw"]
+        df["reinvestment"] = cols["reinvestment"]
+        df["Rango_Reinv"] = pd.Categorical.from_codes(cols["rango"], categories=RANGO_LABELS)
+    return df
+
+def apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps):
+    with stage("preprocess"):
+        pre = preprocess(df)
+    with stage("apply_params"):
+        return apply_params(pre, pct_dict, min_wallet, cap, country_caps)
@@ -0,0 +1,161 @@
+###############################################
+# 🧠 REINVESTMENT ENGINE — app3 variant (headless)
+# Pot chosen by Gestion (Pot_Visita for URY, Pot_Trip otherwise).
+###############################################
+import pandas as pd
+import numpy as np
+import unicodedata
+import re
+
+###############################################
+# CLEAN / NORMALIZE COLUMN NAMES
+###############################################
+def clean(col):
+    if not isinstance(col, str):
+        col = str(col)
+    col = col.strip()
+    col = "".join(c for c in unicodedata.normalize("NFKD", col) if not unicodedata.combining(c))
+    col = re.sub(r"[^0-9A-Za-z_ ]", "", col)
+    col = col.replace(" ", "_")
+    col = re.sub(r"_+", "_", col)
+    return col.strip("_").lower()  # lowercased for safety
+
+
+def normalize_gestion(val):
+    if not isinstance(val, str):
+        val = str(val)
+    val = "".join(c for c in unicodedata.normalize("NFKD", val) if not unicodedata.combining(c))
+    val = val.strip().replace(" ", "_").upper()
+    return re.sub(r"[^0-9A-Za-z_]", "", val)
+
+
+def map_unique(series, func):
+    """Apply func once per distinct value and broadcast back to every row."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = np.array([func(u) for u in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=series.index)
+
+
+def cap_key(val):
+    return str(val).strip().replace(" ", "_").upper()
+
+
+def build_cap_lookup(country_caps):
+    """Precompute {PAIS_KEY: (min, max)} once; first matching key wins."""
+    lookup = {}
+    for key, rule in country_caps.items():
+        lookup.setdefault(key.replace(" ", "_").upper(), (rule["min"], rule["max"]))
+    return lookup
+
+
+def apply_country_caps(values, pais, country_caps):
+    """Clip values to the [min, max] cap of each row's Pais."""
+    lookup = build_cap_lookup(country_caps)
+    codes, uniques = pd.factorize(pais, use_na_sentinel=False)
+    lo = np.full(len(uniques), -np.inf)
+    hi = np.full(len(uniques), np.inf)
+    for i, p in enumerate(uniques):
+        rule = lookup.get(cap_key(p))
+        if rule is not None:
+            lo[i], hi[i] = rule
+    return np.clip(np.asarray(values, dtype=float), lo[codes], hi[codes])
+
+###############################################
+# FLEXIBLE COLUMN RENAME (handles Excel quirks)
+###############################################
+def rename_columns(df):
+    cols = {c.lower(): c for c in df.columns}
+    mapping = {
+        "pot_xvisita": "Pot_Visita",
+        "prom_teoneto_trip": "TeoricoNeto",
+        "prom_winneto_trip": "WinTotalNeto",
+        "prom_visita_trip": "Visitas",
+        "pot_trip": "Pot_Trip",
+    }
+
+    for key, val in mapping.items():
+        if key in cols:
+            df.rename(columns={cols[key]: val}, inplace=True)
+    return df
+
+###############################################
+# MAIN REINVESTMENT ENGINE
+###############################################
+URY_GESTIONES = ("URY_LOCAL", "URY_RESTO")
+COMPS_LIMIT = 200  # Comps above this block the wallet
+
+
+def apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps, columnar=True, comps_limit=COMPS_LIMIT):
+    """columnar=False keeps the original row-wise pot/cap path for comparison."""
+    df = df.copy()
+    df = rename_columns(df)
+
+    if "Pot_Visita" in df.columns:
+        df["WxV"] = pd.to_numeric(df["Pot_Visita"], errors="coerce").fillna(0)
+    else:
+        raise ValueError("Column Pot_xVisita / Pot_Visita not found.")
+
+    required = ["Gestion", "Pais", "NG", "TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip", "Pot_Visita", "Promo2", "Comps"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}. Available: {list(df.columns)}")
+
+    num_cols = ["TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip", "Pot_Visita", "WxV", "Promo2", "Comps"]
+    for c in num_cols:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+
+    df["Potencial"] = df[["TeoricoNeto", "WinTotalNeto"]].max(axis=1)
+    if columnar:
+        df["GESTION_KEY"] = map_unique(df["Gestion"], normalize_gestion)
+        df["pot_used"] = np.where(df["GESTION_KEY"].isin(URY_GESTIONES), df["Pot_Visita"], df["Pot_Trip"])
+    else:
+        df["GESTION_KEY"] = df["Gestion"].apply(normalize_gestion)
+
+        def choose_pot(row):
+            if row["GESTION_KEY"] in URY_GESTIONES:
+                return row["Pot_Visita"]
+            return row["Pot_Trip"]
+
+        df["pot_used"] = df.apply(choose_pot, axis=1)
+
+    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
+    df["pct"] = df["GESTION_KEY"].map(pct_norm).fillna(0)
+    df["eligible"] = (pd.to_numeric(df["NG"], errors="coerce") == 0)
+
+    df["reinvestment_raw"] = df["pot_used"] * df["pct"]
+    df["reinvestment"] = 0.0
+
+    elig = df["eligible"]
+    df.loc[elig, "reinvestment"] = df.loc[elig, "reinvestment_raw"]
+    df.loc[elig & (df["reinvestment"] < min_wallet), "reinvestment"] = min_wallet
+    df.loc[elig, "reinvestment"] = df.loc[elig, "reinvestment"].clip(upper=cap)
+
+    # Ineligibility rules
+    df.loc[df["Comps"] > comps_limit, ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[df["reinvestment"] <= df["Promo2"], ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[df["reinvestment"] > df["WxV"], ["eligible", "reinvestment"]] = [False, 0]
+
+    # Apply country caps
+    if columnar:
+        df["reinvestment"] = apply_country_caps(df["reinvestment"], df["Pais"], country_caps)
+    else:
+        def apply_caps(row):
+            pais = str(row.get("Pais", "")).strip()
+            reinv = row.get("reinvestment", 0)
+            for key, rule in country_caps.items():
+                if key.replace(" ", "_").upper() == pais.replace(" ", "_").upper():
+                    reinv = max(reinv, rule["min"])
+                    reinv = min(reinv, rule["max"])
+                    break
+            return reinv
+
+        df["reinvestment"] = df.apply(apply_caps, axis=1)
+
+    df["Rango_Reinv"] = np.select(
+        [df["reinvestment"] == 0, df["reinvestment"] <= df["WxV"] * 0.5, df["reinvestment"] <= df["WxV"]],
+        ["NO APLICA", "<50%", "50-100%"],
+        default="NO APLICA"
+    )
+
+    df["reinvestment"] = df["reinvestment"].round(2)
+    return df
@@ -0,0 +1,225 @@
+###############################################
+# 🦆 DUCKDB ENGINE (optional: pip install duckdb)
+# engine.apply_params' rules as one SQL query, run by DuckDB over a
+# CSV/Parquet file or a DataFrame (upload, SQL extract). Multi-threaded;
+# past memory_limit it spills to temp_directory, and write_reinvestment
+# COPYs the layout to a file without building a pandas frame at all.
+###############################################
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from engine import (COMPS_LIMIT, NUM_COLS, RANGO_LABELS, REASON_COMPS, REASON_LABELS, REASON_NG,
+                    REASON_NO_APLICA, REASON_PROMO2, REQUIRED_COLS, build_cap_lookup, normalize_gestion)
+from loaders import engine_name, resolve_columns
+
+NG_RULE = "_ng_rule"  # rule 2 precomputed by pandas for non-numeric NG in DataFrames
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("The DuckDB engine needs `pip install duckdb`") from e
+    return duckdb
+
+def connect(threads=None, memory_limit=None, temp_directory=None):
+    """In-memory DuckDB; memory_limit (e.g. '4GB') + temp_directory make big runs spill to disk"""
+    con = _duckdb().connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = {_str(memory_limit)}")
+    if temp_directory:
+        con.execute(f"SET temp_directory = {_str(temp_directory)}")
+    return con
+
+###############################################
+# SQL LITERALS
+###############################################
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _str(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _num(x):
+    x = float(x)
+    if np.isinf(x):
+        return "CAST('-inf' AS DOUBLE)" if x < 0 else "CAST('inf' AS DOUBLE)"
+    return repr(x)
+
+###############################################
+# SOURCE
+###############################################
+def source_sql(con, source, extra_cols=()):
+    """
+    FROM clause + raw column names to select. Paths are scanned in place
+    (projected to the engine's columns + extra_cols); DataFrames are
+    registered without copying and keep all their columns, like engine.py.
+    """
+    if isinstance(source, pd.DataFrame):
+        cols = list(source.columns)
+        ng = next((c for c in cols if engine_name(c) == "NG"), None)
+        if ng is not None and not (is_numeric_dtype(source[ng]) or is_bool_dtype(source[ng])):
+            # DuckDB sees object/category NG as text; rule 2 is pandas' NG == 1 on the raw values
+            source = source.assign(**{NG_RULE: (source[ng] == 1).to_numpy(dtype=bool, na_value=False)})
+        con.register("base_df", source)
+        return "base_df", cols
+    lower = source.lower()
+    if lower.endswith((".parquet", ".pq")):
+        from_sql = f"read_parquet({_str(source)})"
+    elif lower.endswith(".csv"):
+        from_sql = f"read_csv({_str(source)}, header = true)"
+    else:
+        raise ValueError(f"The DuckDB engine reads .csv/.parquet files or DataFrames, not {source}")
+    names = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {from_sql}").fetchall()]
+    return from_sql, resolve_columns(names, extra_cols)
+
+###############################################
+# QUERY
+###############################################
+def _pais_case(values, by_pais, default):
+    """CASE over the distinct Pais values, grouped by their mapped value"""
+    groups = {}
+    for value, mapped in by_pais.items():
+        groups.setdefault(mapped, []).append(value)
+    whens = []
+    for mapped, vals in groups.items():
+        if mapped == default:
+            continue
+        terms = []
+        if any(v is None for v in vals):
+            terms.append("Pais IS NULL")
+        named = [v for v in vals if v is not None]
+        if named:
+            terms.append(f"CAST(Pais AS VARCHAR) IN ({', '.join(_str(v) for v in named)})")
+        whens.append(f"WHEN {' OR '.join(terms)} THEN {_num(mapped)}")
+    if not whens:
+        return _num(default)
+    return f"CASE {' '.join(whens)} ELSE {_num(default)} END"
+
+def build_query(con, from_sql, raw_cols, pct_dict, min_wallet, cap, country_caps, as_text=False):
+    """
+    The whole rule pipeline of engine.py in one SELECT. Output columns and
+    values match apply_params (Reason_Mask as UTINYINT, Rango_Reinv as its
+    code) unless as_text, which decodes both for file output.
+    """
+    names = {raw: engine_name(raw) for raw in raw_cols}
+    missing = [c for c in REQUIRED_COLS if c not in names.values()]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    types = dict((r[0], r[1]) for r in con.execute(f"DESCRIBE SELECT * FROM {from_sql}").fetchall())
+    select = []
+    for raw, name in names.items():
+        col = _ident(raw)
+        if name in NUM_COLS:
+            numeric = any(t in types[raw] for t in ("INT", "DOUBLE", "FLOAT", "DECIMAL"))
+            expr = f"COALESCE({col}, 0)" if numeric else f"COALESCE(TRY_CAST({col} AS DOUBLE), 0)"
+            select.append(f"{expr} AS {_ident(name)}")
+        else:
+            select.append(f"{col} AS {_ident(name)}")
+    pais_raw = next(raw for raw, name in names.items() if name == "Pais")
+    # rule 2 like engine.py's NG == 1: numbers and booleans only, text such as "1" never matches
+    ng_type = types[next(raw for raw, name in names.items() if name == "NG")]
+    if NG_RULE in types:
+        select.append(f"{_ident(NG_RULE)} AS _ng_raw")
+        ng_rule = "_ng_raw"
+    elif ng_type == "BOOLEAN" or any(t in ng_type for t in ("INT", "DOUBLE", "FLOAT", "DECIMAL")):
+        ng_rule = "COALESCE(TRY_CAST(NG AS DOUBLE) = 1, false)"
+    else:
+        ng_rule = "false"
+
+    # --- pct / caps per distinct Pais, keyed like engine.Prepared.group_params ---
+    distinct = [r[0] for r in con.execute(
+        f"SELECT DISTINCT CAST({_ident(pais_raw)} AS VARCHAR) FROM {from_sql}").fetchall()]
+    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
+    caps = build_cap_lookup(country_caps)
+    keys = {v: normalize_gestion("nan" if v is None else v) for v in distinct}
+    pct_case = _pais_case(distinct, {v: pct_norm.get(k, 0) for v, k in keys.items()}, 0)
+    lo_case = _pais_case(distinct, {v: caps.get(k, (-np.inf, np.inf))[0] for v, k in keys.items()}, -np.inf)
+    hi_case = _pais_case(distinct, {v: caps.get(k, (-np.inf, np.inf))[1] for v, k in keys.items()}, np.inf)
+
+    lo, hi = _num(min(min_wallet, cap)), _num(max(min_wallet, cap))
+    out_cols = ", ".join(_ident(n) for n in names.values())
+    if as_text:
+        labels = "[" + ", ".join(_str(t) for t in REASON_LABELS) + "]"
+        reason = f"CASE WHEN _mask = 0 THEN NULL ELSE list_extract({labels}, _mask) END AS Reason_Not_Eligible"
+        rango = "[" + ", ".join(_str(t) for t in RANGO_LABELS) + "][_rango + 1] AS Rango_Reinv"
+    else:
+        reason = "CAST(_mask AS UTINYINT) AS Reason_Mask"
+        rango = "_rango AS Rango_Reinv"
+
+    return f"""
+WITH base AS (
+    SELECT {", ".join(select)} FROM {from_sql}
+), rules AS (
+    SELECT *,
+        Pot_Visita AS WxV,
+        GREATEST(TeoricoNeto, WinTotalNeto) AS Potencial,
+        {pct_case} AS pct,
+        COALESCE(TRY_CAST(NG AS DOUBLE) = 0, false) AS _elig_base,
+        Comps > {COMPS_LIMIT} AS _comps,
+        {ng_rule} AS _ng
+    FROM base
+), capped AS (
+    SELECT *,
+        Pot_Visita * pct AS reinvestment_raw,
+        CASE WHEN _elig_base AND NOT (_comps OR _ng)
+             THEN LEAST(GREATEST(LEAST(GREATEST(Pot_Visita * pct, {lo_case}), {hi_case}), {lo}), {hi})
+             ELSE 0.0 END AS _r1
+    FROM rules
+), promo AS (
+    SELECT *, _r1 <= Promo2 AS _promo2, CASE WHEN _r1 <= Promo2 THEN 0.0 ELSE _r1 END AS _r2
+    FROM capped
+), ranged AS (
+    SELECT *,
+        CASE WHEN _r2 = 0 THEN 0 WHEN _r2 <= WxV * 0.5 THEN 1 WHEN _r2 <= WxV THEN 2 ELSE 0 END AS _rango
+    FROM promo
+), final AS (
+    SELECT *,
+        _elig_base AND NOT (_comps OR _ng) AND NOT _promo2 AND _rango <> 0 AS eligible,
+        (CASE WHEN _comps THEN {int(REASON_COMPS)} ELSE 0 END
+         | CASE WHEN _ng THEN {int(REASON_NG)} ELSE 0 END
+         | CASE WHEN _promo2 THEN {int(REASON_PROMO2)} ELSE 0 END
+         | CASE WHEN _rango = 0 THEN {int(REASON_NO_APLICA)} ELSE 0 END) AS _mask,
+        round_even(CASE WHEN _rango = 0 THEN 0.0 ELSE _r2 END * 100, 0) / 100 AS reinvestment
+    FROM ranged
+)
+SELECT {out_cols}, WxV, Potencial, pct, eligible, {reason}, reinvestment_raw, reinvestment, {rango}
+FROM final"""
+
+###############################################
+# ENTRY POINTS
+###############################################
+def apply_reinvestment(source, pct_dict, min_wallet, cap, country_caps, extra_cols=(), con=None):
+    """Same frame as engine.apply_reinvestment (values, columns, row order) from a path or DataFrame"""
+    own = con is None
+    con = con or connect()
+    try:
+        from_sql, raw_cols = source_sql(con, source, extra_cols)
+        sql = build_query(con, from_sql, raw_cols, pct_dict, min_wallet, cap, country_caps)
+        df = con.execute(sql).df()
+    finally:
+        if own:
+            con.close()
+    for c in df.select_dtypes("category"):
+        df[c] = df[c].cat.as_unordered()  # ENUMs come back ordered
+    df["Reason_Mask"] = df["Reason_Mask"].astype(np.uint8)
+    df["Rango_Reinv"] = pd.Categorical.from_codes(df["Rango_Reinv"].to_numpy(np.int8), categories=RANGO_LABELS)
+    return df
+
+def write_reinvestment(source, output, pct_dict, min_wallet, cap, country_caps, extra_cols=(), con=None):
+    """COPY the decoded layout straight to a .csv/.parquet file (out-of-core); returns the row count"""
+    fmt = "PARQUET" if output.lower().endswith((".parquet", ".pq")) else "CSV"
+    own = con is None
+    con = con or connect()
+    try:
+        from_sql, raw_cols = source_sql(con, source, extra_cols)
+        sql = build_query(con, from_sql, raw_cols, pct_dict, min_wallet, cap, country_caps, as_text=True)
+        options = "FORMAT PARQUET, COMPRESSION ZSTD" if fmt == "PARQUET" else "FORMAT CSV, HEADER true"
+        return con.execute(f"COPY ({sql}) TO {_str(output)} ({options})").fetchone()[0]
+    finally:
+        if own:
+            con.close()
@@ -0,0 +1,198 @@
+###############################################
+# 🐻‍❄️ POLARS ENGINE (optional: pip install polars)
+# engine.apply_params' rules and the KPI groupby as LazyFrame plans,
+# executed multi-threaded by Polars. prepare() does the per-upload work
+# once, so a parameter change only re-runs the rule expressions.
+###############################################
+
+import numpy as np
+import pandas as pd
+
+from engine import (COMPS_LIMIT, NUM_COLS, RANGO_LABELS, REASON_COMPS, REASON_NG, REASON_NO_APLICA,
+                    REASON_PROMO2, RENAME_MAP, REQUIRED_COLS, clean, group_params, normalize_gestion,
+                    preprocess)
+from kpis import KEYS, SUM_COLS, rollup
+from loaders import resolve_columns
+
+RESULT_COLS = ["pct", "eligible", "Reason_Mask", "reinvestment_raw", "reinvestment", "Rango_Reinv"]
+
+def _polars():
+    try:
+        import polars
+    except ImportError as e:
+        raise ImportError("The Polars engine needs `pip install polars`") from e
+    return polars
+
+###############################################
+# PREPROCESS (once per upload)
+###############################################
+class PolarsPrepared:
+    """
+    frame: Polars frame with the rule inputs, a Pais group code (_code), the
+    rule 2 flag (_ng) and Pais/Gestion for the KPIs; keys: normalized Pais
+    per code; base: the preprocessed pandas frame the result columns are
+    added to (None when the whole layout lives in `frame`, i.e. scanned
+    files).
+    """
+
+    def __init__(self, frame, keys, base=None):
+        self.frame = frame
+        self.keys = keys
+        self.base = base
+
+def prepare(source, extra_cols=()):
+    """DataFrame -> engine.preprocess + zero-copy Polars columns; .csv/.parquet path -> lazy scan"""
+    pl = _polars()
+    if isinstance(source, pd.DataFrame):
+        pre = preprocess(source)
+        base = pre.frame
+        frame = pl.DataFrame({
+            **{c: base[c].to_numpy(dtype=float) for c in NUM_COLS + ["WxV"]},
+            "NG": pd.to_numeric(base["NG"], errors="coerce").to_numpy(dtype=float),
+            "_code": pre.codes.astype(np.int32),
+            "_ng": (pre.base_mask & REASON_NG) != 0,  # rule 2 exactly as engine.py ran it on the raw NG
+        }).with_columns(pl.from_pandas(base[KEYS].astype(object).where(base[KEYS].notna(), None)))
+        return PolarsPrepared(frame, pre.keys, base)
+    return _prepare_scan(source, extra_cols)
+
+def _prepare_scan(source, extra_cols):
+    pl = _polars()
+    lower = source.lower()
+    if lower.endswith((".parquet", ".pq")):
+        lf = pl.scan_parquet(source)
+    elif lower.endswith(".csv"):
+        lf = pl.scan_csv(source, infer_schema_length=10_000)
+    else:
+        raise ValueError(f"The Polars engine reads .csv/.parquet files or DataFrames, not {source}")
+    cols = resolve_columns(lf.collect_schema().names(), extra_cols)
+    lf = lf.select(cols).rename({c: clean(c) for c in cols}).rename(RENAME_MAP, strict=False)
+    missing = [c for c in REQUIRED_COLS if c not in lf.collect_schema().names()]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    # --- numerics coerced like pd.to_numeric(errors="coerce").fillna(0): numeric dtypes kept ---
+    schema = lf.collect_schema()
+    coerced = []
+    for c in NUM_COLS:
+        if schema[c].is_float():
+            coerced.append(pl.col(c).cast(pl.Float64).fill_nan(0).fill_null(0))
+        elif schema[c].is_integer():
+            coerced.append(pl.col(c).fill_null(0))
+        else:
+            coerced.append(pl.col(c).cast(pl.Float64, strict=False).fill_null(0))
+    # --- rule 2 like engine.py's raw NG == 1: numbers and booleans only, text "1" never matches ---
+    ng = schema["NG"]
+    if ng.is_numeric() or ng == pl.Boolean:
+        rule_ng = (pl.col("NG").cast(pl.Float64) == 1).fill_null(False)
+    else:
+        rule_ng = pl.lit(False)
+    frame = lf.with_columns(coerced).with_columns(
+        _ng=rule_ng,
+        WxV=pl.col("Pot_Visita"),
+        Potencial=pl.max_horizontal("TeoricoNeto", "WinTotalNeto"),
+    ).collect()
+
+    # --- Pais groups, keyed like engine.Prepared (missing Pais -> 'nan') ---
+    pais = frame["Pais"].cast(pl.String)
+    uniques = pais.unique(maintain_order=True).to_list()
+    missing_key = "\0<NA>"
+    codes = pais.fill_null(missing_key).replace_strict(
+        [missing_key if u is None else u for u in uniques], list(range(len(uniques))), return_dtype=pl.Int32)
+    keys = [normalize_gestion("nan" if u is None else u) for u in uniques]
+    return PolarsPrepared(frame.with_columns(_code=codes), keys)
+
+###############################################
+# RULES (per parameter change)
+###############################################
+def rules(pre, pct_dict, min_wallet, cap, country_caps):
+    """LazyFrame of the rule pipeline; same steps and order as engine._compute_rows"""
+    pl = _polars()
+    pct_g, lo_g, hi_g = group_params(pre.keys, pct_dict, country_caps)
+
+    def by_group(values):
+        return pl.lit(pl.Series(values, dtype=pl.Float64)).gather(pl.col("_code"))
+
+    ng = pl.col("NG").cast(pl.Float64, strict=False)
+    return (
+        pre.frame.lazy()
+        .with_columns(
+            pct=by_group(pct_g),
+            _elig_base=(ng == 0).fill_null(False),
+            _comps=pl.col("Comps") > COMPS_LIMIT,
+        )
+        .with_columns(
+            reinvestment_raw=pl.col("Pot_Visita") * pl.col("pct"),
+            _blocked=pl.col("_comps") | pl.col("_ng"),
+        )
+        # --- country caps, then global limits only on eligible (bounds ordered like Series.clip) ---
+        .with_columns(
+            _r1=pl.when(pl.col("_elig_base") & ~pl.col("_blocked"))
+            .then(pl.min_horizontal(pl.max_horizontal(
+                pl.min_horizontal(pl.max_horizontal("reinvestment_raw", by_group(lo_g)), by_group(hi_g)),
+                min(min_wallet, cap)), max(min_wallet, cap)))
+            .otherwise(0.0)
+        )
+        # --- Rule 3: Reinvestment <= Promo2 ---
+        .with_columns(_promo2=pl.col("_r1") <= pl.col("Promo2"))
+        .with_columns(_r2=pl.when(pl.col("_promo2")).then(0.0).otherwise(pl.col("_r1")))
+        # --- Range label / Rule 4 ---
+        .with_columns(
+            Rango_Reinv=pl.when(pl.col("_r2") == 0).then(0)
+            .when(pl.col("_r2") <= pl.col("WxV") * 0.5).then(1)
+            .when(pl.col("_r2") <= pl.col("WxV")).then(2)
+            .otherwise(0).cast(pl.Int8)
+        )
+        .with_columns(
+            eligible=pl.col("_elig_base") & ~pl.col("_blocked") & ~pl.col("_promo2") & (pl.col("Rango_Reinv") != 0),
+            Reason_Mask=(pl.col("_comps").cast(pl.UInt8) * int(REASON_COMPS)
+                         | pl.col("_ng").cast(pl.UInt8) * int(REASON_NG)
+                         | pl.col("_promo2").cast(pl.UInt8) * int(REASON_PROMO2)
+                         | (pl.col("Rango_Reinv") == 0).cast(pl.UInt8) * int(REASON_NO_APLICA)),
+            reinvestment=pl.when(pl.col("Rango_Reinv") == 0).then(0.0).otherwise(pl.col("_r2"))
+            .round(2, mode="half_to_even"),
+        )
+    )
+
+def to_pandas(pre, result):
+    """Collected rules() frame -> the pandas layout engine.apply_params returns"""
+    if pre.base is not None:
+        df = pre.base.copy(deep=False)
+        for c in RESULT_COLS:
+            df[c] = result[c].to_numpy()
+    else:
+        df = result.drop([c for c in result.columns if c.startswith("_")]).to_pandas()
+        df = df[[c for c in df.columns if c not in RESULT_COLS] + RESULT_COLS]
+    df["Reason_Mask"] = df["Reason_Mask"].astype(np.uint8)
+    df["Rango_Reinv"] = pd.Categorical.from_codes(df["Rango_Reinv"].to_numpy(np.int8), categories=RANGO_LABELS)
+    return df
+
+def apply_params(pre, pct_dict, min_wallet, cap, country_caps):
+    return to_pandas(pre, rules(pre, pct_dict, min_wallet, cap, country_caps).collect())
+
+def apply_reinvestment(source, pct_dict, min_wallet, cap, country_caps, extra_cols=()):
+    return apply_params(prepare(source, extra_cols), pct_dict, min_wallet, cap, country_caps)
+
+###############################################
+# KPIs
+###############################################
+def grouped_sums(result):
+    """kpis.grouped_sums on a rules() LazyFrame/DataFrame, aggregated by Polars"""
+    pl = _polars()
+    sums = (
+        result.lazy()
+        .filter(pl.col("eligible"))
+        .group_by(KEYS)
+        .agg(**{name: pl.col(col).sum() for name, col in SUM_COLS.items() if col != "eligible"},
+             Eligible_Count=pl.len())
+        .collect()
+        .to_pandas()
+    )
+    return sums.set_index(KEYS)[list(SUM_COLS)].sort_index()
+
+def compute_kpis(pre, pct_dict, min_wallet, cap, country_caps):
+    """Same tables as kpis.compute_kpis, straight from the rule plan (no pandas layout)"""
+    sums = grouped_sums(rules(pre, pct_dict, min_wallet, cap, country_caps))
+    if pre.base is not None:
+        # same key dtypes (e.g. categorical Pais) as the pandas tables
+        sums = sums.reset_index().astype({k: pre.base[k].dtype for k in KEYS}).set_index(KEYS).sort_index()
+    return rollup(sums)
@@ -0,0 +1,263 @@
+###############################################
+# ⬇️ LAYOUT EXPORT
+# xlsx is written row by row with xlsxwriter's constant_memory mode, so
+# only the current row is buffered; CSV/gzip CSV are written in chunks and
+# Parquet in row groups. Layouts over the Excel row limit (or split by
+# Pais/Gestion) go to several sheets or a zip of files, one part at a
+# time. Exports run in a background pool and are
+# generated only when someone asks for them.
+###############################################
+
+import gzip
+import os
+import re
+import tempfile
+import zipfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from engine import with_reason_text
+
+XLSX_MAX_ROWS = 1_048_576
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+###############################################
+# ROW CHUNKS
+# Writers take an optional `rows` (positions) so a split part is written
+# straight from the full layout, one chunk at a time, without copying it.
+###############################################
+def iter_chunks(df, rows=None, chunk_rows=50_000):
+    """df (or its `rows` positions) in slices of chunk_rows; always at least one slice"""
+    n = len(df) if rows is None else len(rows)
+    for start in range(0, max(n, 1), chunk_rows):
+        if rows is None:
+            yield df.iloc[start:start + chunk_rows]
+        else:
+            yield df.iloc[rows[start:start + chunk_rows]]
+
+def iter_rows(df, rows=None, chunk_rows=50_000):
+    """Rows as tuples of Python scalars (NaN -> None), converted one chunk at a time"""
+    for part in iter_chunks(df, rows, chunk_rows):
+        part = part.astype(object)
+        part = part.where(part.notna(), None)
+        yield from part.itertuples(index=False, name=None)
+
+###############################################
+# STREAMING XLSX WRITER
+###############################################
+def write_sheet(workbook, df, sheet_name="Sheet1", header_format=None, rows=None):
+    n = len(df) if rows is None else len(rows)
+    if n + 1 > XLSX_MAX_ROWS:
+        raise ValueError(
+            f"{n:,} rows do not fit in one xlsx sheet ({XLSX_MAX_ROWS - 1:,} max); "
+            "use a CSV/Parquet export or split the layout"
+        )
+    ws = workbook.add_worksheet(sheet_name)
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    for r, row in enumerate(iter_rows(df, rows), start=1):
+        ws.write_row(r, 0, row)
+    return ws
+
+def write_xlsx(df, target, sheet_name="Sheet1", rows=None):
+    """Write df to an xlsx path or binary buffer in constant memory"""
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    try:
+        write_sheet(workbook, df, sheet_name, workbook.add_format(HEADER_FORMAT), rows)
+    finally:
+        workbook.close()
+    return target
+
+def export_to_tempfile(write, df, suffix):
+    """Run a writer into a fresh temp file and return its path"""
+    fd, path = tempfile.mkstemp(prefix="promotion_layout_", suffix=suffix)
+    os.close(fd)
+    try:
+        write(df, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+###############################################
+# CSV / GZIP CSV / PARQUET
+###############################################
+CSV_CHUNK_ROWS = 100_000
+
+def write_csv(df, target, rows=None, compress=False):
+    opener = gzip.open if compress else open
+    with opener(target, "wt", newline="") as fh:
+        for i, part in enumerate(iter_chunks(df, rows, CSV_CHUNK_ROWS)):
+            part.to_csv(fh, index=False, header=i == 0)
+    return target
+
+def write_csv_gz(df, target, rows=None):
+    return write_csv(df, target, rows, compress=True)
+
+def write_parquet(df, target, rows=None, row_group_rows=250_000):
+    """Parquet in row groups (needs pyarrow); one slice is converted at a time"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export needs `pip install pyarrow`") from e
+
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(target, schema, compression="zstd") as writer:
+        for part in iter_chunks(df, rows, row_group_rows):
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+    return target
+
+# format -> (file suffix, mime, writer)
+EXPORT_FORMATS = {
+    "xlsx": (".xlsx", XLSX_MIME, write_xlsx),
+    "csv": (".csv", "text/csv", write_csv),
+    "csv.gz": (".csv.gz", "application/gzip", write_csv_gz),
+    "parquet": (".parquet", "application/vnd.apache.parquet", write_parquet),
+}
+
+def format_for_path(path):
+    """Export format from an output file name (default xlsx)"""
+    lower = path.lower()
+    for fmt, (suffix, _, _) in EXPORT_FORMATS.items():
+        if lower.endswith(suffix):
+            return fmt
+    return "xlsx"
+
+###############################################
+# SPLIT EXPORTS (by Pais/Gestion and/or row count)
+# Parts hold at most max_rows rows (default: the sheet limit minus the
+# header). 'sheets' mode writes them into one workbook, and 'zip' mode
+# writes one file each in any export format.
+###############################################
+SPLIT_KEYS = ["Pais", "Gestion"]
+
+def sheet_title(label, used):
+    """Valid, unique xlsx sheet name (31 chars, no []:*?/\\)"""
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(label))[:31] or "Sheet"
+    title, k = base, 1
+    while title.lower() in used:
+        k += 1
+        title = f"{base[:31 - len(str(k)) - 1]}_{k}"
+    used.add(title.lower())
+    return title
+
+def split_parts(df, by=None, max_rows=XLSX_MAX_ROWS - 1):
+    """
+    (label, row positions) per `by` group (missing key -> 'SIN_DATO'), each cut
+    into pieces of at most max_rows. No `by`: just the row-count cut.
+    """
+    if by:
+        codes, uniques = pd.factorize(df[by], use_na_sentinel=False, sort=True)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        groups = [("SIN_DATO" if pd.isna(u) else str(u), order[bounds[g]:bounds[g + 1]])
+                  for g, u in enumerate(uniques)]
+    else:
+        groups = [("Layout", np.arange(len(df)))]
+
+    for label, rows in groups:
+        n_pieces = max(1, -(-len(rows) // max_rows))
+        for k in range(n_pieces):
+            piece = rows[k * max_rows:(k + 1) * max_rows]
+            yield (label if n_pieces == 1 else f"{label}_{k + 1}"), piece
+
+def write_xlsx_split(df, target, by=None, max_rows=XLSX_MAX_ROWS - 1):
+    """One workbook, one sheet per part, all written in constant memory"""
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    try:
+        header = workbook.add_format(HEADER_FORMAT)
+        used = set()
+        for label, rows in split_parts(df, by, max_rows):
+            write_sheet(workbook, df, sheet_title(label, used), header, rows)
+    finally:
+        workbook.close()
+    return target
+
+def write_zip_split(df, target, fmt="xlsx", by=None, max_rows=XLSX_MAX_ROWS - 1):
+    """One file per part in a zip; each part goes through a temp file, never all in memory"""
+    suffix, _, write = EXPORT_FORMATS[fmt]
+    used = set()
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for label, rows in split_parts(df, by, max_rows):
+            fd, tmp = tempfile.mkstemp(suffix=suffix)
+            os.close(fd)
+            try:
+                write(df, tmp, rows=rows)
+                zf.write(tmp, f"promotion_layout_{sheet_title(label, used)}{suffix}")
+            finally:
+                os.remove(tmp)
+    return target
+
+def export_split(df_result, mode="sheets", fmt="xlsx", by=None, max_rows=XLSX_MAX_ROWS - 1, columns=None):
+    """Background job: split export as one multi-sheet xlsx ('sheets') or a zip of files ('zip')"""
+    layout = project_layout(df_result, columns)
+    if mode == "sheets":
+        return export_to_tempfile(lambda df, path: write_xlsx_split(df, path, by, max_rows), layout, ".xlsx")
+    return export_to_tempfile(lambda df, path: write_zip_split(df, path, fmt, by, max_rows), layout, ".zip")
+
+###############################################
+# LAYOUT PROJECTION
+###############################################
+def project_layout(df_result, columns=None):
+    """
+    Layout columns to export, reason text decoded. `columns` may name
+    Reason_Not_Eligible; only the selected columns are decoded/copied.
+    """
+    if not columns:
+        return with_reason_text(df_result)
+    cols = ["Reason_Mask" if c == "Reason_Not_Eligible" else c for c in columns]
+    missing = [c for c in cols if c not in df_result.columns]
+    if missing:
+        raise ValueError(f"Export columns not in the layout: {missing}")
+    out = df_result[cols]
+    return with_reason_text(out) if "Reason_Mask" in cols else out
+
+def export_layout(df_result, fmt="xlsx", columns=None):
+    """Background job: project, decode and write the layout to a temp file"""
+    suffix, _, write = EXPORT_FORMATS[fmt]
+    return export_to_tempfile(write, project_layout(df_result, columns), suffix)
+
+###############################################
+# BACKGROUND EXPORT JOBS
+###############################################
+class ExportJobs:
+    """
+    Background export pool keyed by (data, params, format). Finished files
+    stay on disk until their job is evicted (oldest first past max_jobs).
+    """
+
+    def __init__(self, max_workers=2, max_jobs=8):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_jobs = max_jobs
+
+    def submit(self, key, fn, *args):
+        """Start fn(*args) -> path unless the same key is already running or done"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (job.done() and job.exception() is not None):
+                return job
+            job = self._pool.submit(fn, *args)
+            self._jobs[key] = job
+            self._evict()
+            return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _evict(self):
+        while len(self._jobs) > self.max_jobs:
+            _, job = self._jobs.popitem(last=False)
+            job.add_done_callback(_remove_output)
+
+def _remove_output(job):
+    if job.exception() is None and os.path.exists(job.result()):
+        os.remove(job.result())
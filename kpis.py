@@ -0,0 +1,75 @@
+###############################################
+# 📊 KPI AGGREGATION ENGINE
+# One groupby over (Pais, Gestion) on the eligible rows; the overall,
+# by-country and by-Gestión tables are rollups of that small table.
+# Partial tables from chunks/partitions can be added before rolling up.
+###############################################
+
+import pandas as pd
+
+from profiling import stage
+
+SUM_COLS = {
+    "Eligible_Count": "eligible",
+    "Total_Reinvestment": "reinvestment",
+    "Total_Potencial_Visita": "Pot_Visita",
+    "Total_Potencial_Trip": "Pot_Trip",
+    "Total_Teorico_Neto": "TeoricoNeto",
+    "Total_Win_Neto": "WinTotalNeto",
+    "Total_Visitas": "Visitas",
+}
+SUMMARY_COLS = ["Eligible_Count", "Total_Reinvestment", "Total_Potencial_Visita", "Total_Potencial_Trip"]
+SHARE_COLS = {
+    "%_Reinvestment": "Total_Reinvestment",
+    "%_Potencial_Visita": "Total_Potencial_Visita",
+    "%_Potencial_Trip": "Total_Potencial_Trip",
+}
+KEYS = ["Pais", "Gestion"]
+
+def grouped_sums(df_result):
+    """Per (Pais, Gestion) sums over eligible rows — the only pass over the data"""
+    eligible = df_result.loc[df_result["eligible"], KEYS + list(dict.fromkeys(SUM_COLS.values()))]
+    return eligible.groupby(KEYS, dropna=False, observed=True).agg(
+        **{name: (col, "sum") for name, col in SUM_COLS.items()}
+    )
+
+def merge_sums(acc, part):
+    """
+    Add two grouped_sums tables (chunks, partitions). Stacked and regrouped
+    without sorting: index alignment would sort the keys, and NaN Pais /
+    Gestion next to strings are unorderable.
+    """
+    if acc is None:
+        return part
+    return pd.concat([acc, part]).groupby(level=KEYS, dropna=False, sort=False).sum()
+
+def _by(sums, key, totals):
+    out = sums.groupby(level=key, observed=True).sum()[SUMMARY_COLS].reset_index()
+    out["Eligible_Count"] = out["Eligible_Count"].astype("int64")
+    for share, col in SHARE_COLS.items():
+        out[share] = (out[col] / totals[col] * 100).round(2)
+    return out
+
+def rollup(sums):
+    """
+    grouped_sums -> {"totals": dict, "summary": 1-row frame,
+    "by_pais": frame, "by_gestion": frame}, same layout as the app's tables.
+    """
+    if sums is None:
+        sums = pd.DataFrame(columns=list(SUM_COLS), index=pd.MultiIndex.from_arrays([[], []], names=KEYS), dtype=float)
+    totals = {name: float(sums[name].sum()) for name in SUM_COLS}
+    totals["Eligible_Count"] = int(totals["Eligible_Count"])
+    n = totals["Eligible_Count"]
+    totals["Avg_Visitas"] = totals["Total_Visitas"] / n if n else float("nan")
+    return {
+        "totals": totals,
+        "summary": pd.DataFrame({col: [totals[col]] for col in SUMMARY_COLS}),
+        "by_pais": _by(sums, "Pais", totals),
+        "by_gestion": _by(sums, "Gestion", totals),
+    }
+
+def compute_kpis(df_result):
+    with stage("groupby"):
+        sums = grouped_sums(df_result)
+    with stage("rollup"):
+        return rollup(sums)
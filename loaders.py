@@ -0,0 +1,149 @@
+###############################################
+# 📥 INPUT LOADERS
+# CSV/XLSX plus the Arrow family (Parquet, Feather, Arrow IPC).
+# pyarrow is optional and only imported for the formats that need it.
+###############################################
+
+import numpy as np
+import pandas as pd
+
+from engine import NUM_COLS, RENAME_MAP, REQUIRED_COLS, clean
+from profiling import stage
+
+COLUMNAR_EXTENSIONS = (".parquet", ".pq", ".feather", ".arrow", ".ipc")
+UPLOAD_TYPES = ["csv", "xlsx", "parquet", "pq", "feather", "arrow", "ipc"]
+
+CATEGORICAL_COLS = ["Pais", "Gestion"]
+COMPACT_NUMERIC_COLS = NUM_COLS + ["NG"]
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet/Feather/Arrow files and the pyarrow CSV engine need `pip install pyarrow`") from e
+    return pyarrow
+
+###############################################
+# COLUMN RESOLUTION
+###############################################
+def resolve_columns(raw_names, extra_cols=()):
+    """
+    Raw header names whose cleaned/renamed form is one of REQUIRED_COLS
+    (or one of extra_cols), so only those are read from disk.
+    """
+    wanted = wanted_columns(extra_cols)
+    return [raw for raw in raw_names if is_wanted(raw, wanted)]
+
+def wanted_columns(extra_cols=()):
+    return set(REQUIRED_COLS) | set(extra_cols)
+
+def is_wanted(raw, wanted):
+    return engine_name(raw) in wanted or clean(raw) in wanted
+
+def engine_name(raw):
+    """Column name as the engine sees it (cleaned, then renamed)"""
+    key = clean(raw)
+    return RENAME_MAP.get(key, key)
+
+###############################################
+# DTYPES
+###############################################
+def compact_dtypes(df):
+    """
+    Pais/Gestion -> category; int64 -> int32 when in range; float64 -> float32
+    only when every value round-trips exactly, so engine results are unchanged.
+    """
+    for c in df.columns:
+        if engine_name(c) in CATEGORICAL_COLS:
+            df[c] = df[c].astype("category")
+        elif engine_name(c) in COMPACT_NUMERIC_COLS:
+            s = df[c]
+            if s.dtype == np.int64 and len(s) and s.min() >= np.iinfo(np.int32).min and s.max() <= np.iinfo(np.int32).max:
+                df[c] = s.astype(np.int32)
+            elif s.dtype == np.float64:
+                f32 = s.astype(np.float32)
+                if np.array_equal(f32.to_numpy(np.float64), s.to_numpy(), equal_nan=True):
+                    df[c] = f32
+    return df
+
+###############################################
+# CSV / XLSX
+###############################################
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+def csv_read_options(source, extra_cols=()):
+    """usecols/dtype for read_csv, resolved from the header line only"""
+    header = list(pd.read_csv(source, nrows=0).columns)
+    _rewind(source)
+    usecols = resolve_columns(header, extra_cols)
+    dtype = {raw: "category" for raw in usecols if engine_name(raw) in CATEGORICAL_COLS}
+    return {"usecols": usecols, "dtype": dtype}
+
+def read_csv_projected(source, csv_engine=None, extra_cols=()):
+    if csv_engine == "pyarrow":
+        _pyarrow()
+    with stage("read_csv"):
+        df = pd.read_csv(source, engine=csv_engine, **csv_read_options(source, extra_cols))
+    return clean_columns(df)
+
+def read_excel_projected(source, extra_cols=()):
+    wanted = wanted_columns(extra_cols)
+    with stage("read_excel"):
+        df = pd.read_excel(source, usecols=lambda raw: is_wanted(raw, wanted))
+    return clean_columns(df)
+
+###############################################
+# COLUMNAR FORMATS
+###############################################
+def _arrow_source(source):
+    """Paths are memory-mapped; uploads are wrapped without copying their bytes"""
+    pa = _pyarrow()
+    if isinstance(source, str):
+        return pa.memory_map(source, "r")
+    data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+    return pa.BufferReader(data)
+
+def read_columnar(source, name, extra_cols=()):
+    """Read a Parquet/Feather/Arrow IPC file, projecting to the engine's columns"""
+    pa = _pyarrow()
+    src = _arrow_source(source)
+    if name.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(src)
+        table = pf.read(columns=resolve_columns(pf.schema_arrow.names, extra_cols))
+    else:
+        try:
+            reader = pa.ipc.open_file(src)
+        except pa.ArrowInvalid:
+            src.seek(0)
+            reader = pa.ipc.open_stream(src)
+        table = reader.read_all()
+        table = table.select(resolve_columns(table.column_names, extra_cols))
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def clean_columns(df):
+    with stage("clean"):
+        df = df.rename(columns=clean)
+    with stage("compact_dtypes"):
+        return compact_dtypes(df)
+
+###############################################
+# ENTRY POINT
+###############################################
+def load_table(source, name=None, csv_engine=None, extra_cols=()):
+    """
+    Read a path or file-like upload and clean its column names.
+    csv_engine="pyarrow" switches CSV parsing to the multi-threaded Arrow reader.
+    """
+    name = name or str(source)
+    lower = name.lower()
+    if lower.endswith(COLUMNAR_EXTENSIONS):
+        with stage("read_columnar"):
+            df = read_columnar(source, name, extra_cols)
+        return clean_columns(df)
+    if lower.endswith(".csv"):
+        return read_csv_projected(source, csv_engine, extra_cols)
+    return read_excel_projected(source, extra_cols)
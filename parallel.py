@@ -0,0 +1,231 @@
+###############################################
+# 🧵 MULTI-CORE PARTITIONED RUNS
+# Every rule is row-local, so the base is cut into partitions (row ranges
+# or Pais groups) and engine.apply_reinvestment runs on each one in a
+# process pool. Columns travel through shared memory instead of pickles:
+# workers read their rows from the input blocks, write the result columns
+# straight into output blocks and return only their partial KPI sums.
+###############################################
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from engine import NUM_COLS, RANGO_LABELS, RENAME_MAP, REQUIRED_COLS, apply_reinvestment
+from kpis import KEYS, compute_kpis, grouped_sums, merge_sums, rollup
+from profiling import stage
+
+PARTITIONS = ["rows", "pais"]
+TASKS_PER_WORKER = 4
+# measured per million rows on one core (benchmark.py --suite parallel):
+# serial engine + KPIs ~0.52 s; this process's share of a pool run (coerce,
+# shared-memory inputs, layout copies) ~0.21 s whatever the worker count;
+# the workers' engine + KPI sums ~0.69 s CPU; pool start-up ~1 s per run.
+# Even with ideal scaling that only breaks even near 8M rows on 4 cores
+# (~5M on 8, never on 2), so smaller bases stay serial
+MIN_PARALLEL_ROWS = 8_000_000
+
+def make_executor(workers=None):
+    """Process pool for parallel runs ('spawn': safe next to Streamlit's threads); reuse it across runs"""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=get_context("spawn"))
+
+###############################################
+# SHARED MEMORY BLOCKS
+###############################################
+class SharedArrays:
+    """
+    Named numpy arrays in shared memory blocks. spec() is the small picklable
+    description workers attach with; the owner unlinks the blocks on close().
+    """
+
+    def __init__(self):
+        self.blocks = {}
+        self.arrays = {}
+
+    def add(self, name, shape, dtype, values=None):
+        dtype = np.dtype(dtype)
+        shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if values is not None:
+            arr[...] = values
+        self.blocks[name] = shm
+        self.arrays[name] = arr
+        return arr
+
+    def spec(self):
+        return {name: (self.blocks[name].name, arr.shape, arr.dtype.str) for name, arr in self.arrays.items()}
+
+    def close(self):
+        self.arrays.clear()
+        for shm in self.blocks.values():
+            shm.close()
+            shm.unlink()
+        self.blocks.clear()
+
+def attach(spec):
+    """Worker side: (arrays, blocks) for a SharedArrays.spec(); close the blocks when done"""
+    arrays, blocks = {}, []
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return arrays, blocks
+
+###############################################
+# WORKER
+###############################################
+def _column(values, categories):
+    """
+    Rebuild one input column from its shared array. Text and categorical
+    columns come back as categoricals over their codes: no per-row Python
+    objects, and the engine's factorize of Pais only walks the categories.
+    """
+    if categories is None:
+        return values
+    return pd.Categorical.from_codes(values, categories)
+
+def _run_partition(in_spec, categories, out_spec, span, order_spec, params):
+    """Run the engine on one partition; results go into the output blocks, KPI sums are returned"""
+    inputs, in_blocks = attach(in_spec)
+    outputs, out_blocks = attach(out_spec)
+    order, order_blocks = attach(order_spec)
+    try:
+        rows = slice(*span) if not order else order["order"][span[0]:span[1]]
+        part = pd.DataFrame({name: _column(arr[rows], categories.get(name)) for name, arr in inputs.items()})
+        result = apply_reinvestment(part, *params)
+        for name, arr in outputs.items():
+            col = result[name]
+            arr[rows] = col.cat.codes.to_numpy() if name == "Rango_Reinv" else col.to_numpy()
+        return grouped_sums(result)
+    finally:
+        del inputs, outputs, order
+        for shm in in_blocks + out_blocks + order_blocks:
+            shm.close()
+
+###############################################
+# PARTITIONING
+###############################################
+def row_spans(n, n_tasks):
+    bounds = np.linspace(0, n, n_tasks + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def pais_spans(codes, n_tasks):
+    """
+    (order, spans): row positions regrouped by Pais so each span holds whole
+    groups or a slice of one. Groups larger than an even share of the rows
+    are cut into row ranges of that share (otherwise the task count would be
+    capped by the handful of countries and one country could hold most of
+    the rows); pieces go largest first onto the least loaded task (LPT).
+    """
+    grouped = np.argsort(codes, kind="stable")
+    ends = np.cumsum(np.bincount(codes))
+    share = max(1, -(-len(codes) // n_tasks))
+    pieces = [(a, min(a + share, int(end))) for start, end in zip(np.r_[0, ends[:-1]], ends)
+              for a in range(int(start), int(end), share)]
+    tasks, load = [[] for _ in range(n_tasks)], np.zeros(n_tasks, dtype=np.int64)
+    for a, b in sorted(pieces, key=lambda p: p[0] - p[1]):
+        t = int(np.argmin(load))
+        tasks[t].append(grouped[a:b])
+        load[t] += b - a
+    order = np.concatenate([piece for task in tasks for piece in task] or [grouped])
+    ends = np.cumsum(load)
+    return order, [(int(e - s), int(e)) for s, e in zip(load, ends) if s]
+
+###############################################
+# ENTRY POINT
+###############################################
+def apply_reinvestment_parallel(df, pct_dict, min_wallet, cap, country_caps,
+                                workers=None, partition="rows", executor=None, min_rows=MIN_PARALLEL_ROWS):
+    """
+    engine.apply_reinvestment across a process pool. Returns (layout, kpis):
+    the layout is identical to the serial run; kpis is kpis.rollup of the
+    merged partial sums (equal to compute_kpis up to float summation order).
+    Only the engine's columns are shared; the others never leave this process.
+    Bases under min_rows, or a single worker, run serially in this process.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"partition must be one of {PARTITIONS}")
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(df) < min_rows:
+        result = apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps)
+        return result, compute_kpis(result)
+    names = {raw: RENAME_MAP.get(raw, raw) for raw in df.columns}
+    missing = [c for c in REQUIRED_COLS if c not in names.values()]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    # text numerics are coerced here, so their final dtype is known up front
+    with stage("coerce"):
+        df = df.copy(deep=False)
+        for raw, name in names.items():
+            if name in NUM_COLS and not pd.api.types.is_numeric_dtype(df[raw].dtype):
+                df[raw] = pd.to_numeric(df[raw], errors="coerce")
+        params = (pct_dict, min_wallet, cap, country_caps)
+        probe = apply_reinvestment(df.iloc[:1], *params)  # output columns and dtypes
+    out_cols = [c for c in probe.columns if c not in names.values() or c in NUM_COLS]
+    n = len(df)
+
+    inputs, outputs, order_arrays = SharedArrays(), SharedArrays(), SharedArrays()
+    own = executor is None
+    executor = executor or make_executor(workers)
+    try:
+        with stage("share"):
+            # --- inputs: numerics as-is, categoricals/text as codes (+ their small value lists) ---
+            categories = {}
+            for raw, name in names.items():
+                if name not in REQUIRED_COLS:
+                    continue
+                s = df[raw]
+                if isinstance(s.dtype, pd.CategoricalDtype):
+                    categories[raw] = s.cat.categories
+                    inputs.add(raw, (n,), s.cat.codes.dtype, s.cat.codes.to_numpy())
+                elif pd.api.types.is_numeric_dtype(s.dtype):
+                    inputs.add(raw, (n,), s.dtype, s.to_numpy())
+                else:
+                    codes, uniques = pd.factorize(s)  # missing -> -1, like categorical codes
+                    categories[raw] = uniques
+                    inputs.add(raw, (n,), codes.dtype, codes)
+
+            # --- outputs: every column the engine creates or coerces ---
+            for c in out_cols:
+                outputs.add(c, (n,), np.int8 if c == "Rango_Reinv" else probe[c].dtype)
+
+            # --- partitions: row ranges, or Pais groups (large ones cut into row ranges) ---
+            n_tasks = max(1, min(n, workers * TASKS_PER_WORKER))
+            if partition == "pais":
+                pais = df[next(raw for raw, name in names.items() if name == "Pais")]
+                codes = pd.factorize(pais, use_na_sentinel=False)[0]
+                order, spans = pais_spans(codes, n_tasks)
+                order_arrays.add("order", order.shape, order.dtype, order)
+            else:
+                spans = row_spans(n, n_tasks)
+
+        with stage("pool", tasks=len(spans)):
+            in_spec, out_spec, order_spec = inputs.spec(), outputs.spec(), order_arrays.spec()
+            futures = [executor.submit(_run_partition, in_spec, categories, out_spec, span, order_spec, params)
+                       for span in spans]
+            sums = None
+            for fut in futures:
+                sums = merge_sums(sums, fut.result())
+            # text keys reached the workers as categoricals: back to the serial run's key dtypes
+            key_dtypes = {name: df[raw].dtype for raw, name in names.items() if name in KEYS}
+            sums = sums.reset_index().astype(key_dtypes).set_index(KEYS)
+
+        # --- assemble in the serial column order (copied out before the blocks are unlinked) ---
+        with stage("assemble"):
+            layout = df.rename(columns=RENAME_MAP)
+            for c in out_cols:
+                arr = outputs.arrays[c].copy()
+                layout[c] = pd.Categorical.from_codes(arr, categories=RANGO_LABELS) if c == "Rango_Reinv" else arr
+            layout = layout[list(probe.columns)]
+    finally:
+        inputs.close()
+        outputs.close()
+        order_arrays.close()
+        if own:
+            executor.shutdown()
+    return layout, rollup(sums)
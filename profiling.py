@@ -0,0 +1,159 @@
+###############################################
+# ⏱️ STAGE PROFILING
+# Wall time, CPU time, RSS and (optionally) traced allocations per
+# pipeline stage. Code marks its stages with `with stage("name"):`, which
+# costs nothing unless a Profiler is active in the current context; nested
+# stages are recorded as "parent/child".
+###############################################
+
+import contextvars
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = contextvars.ContextVar("profiler", default=None)
+
+MB = 1024 * 1024
+
+###############################################
+# MEMORY PROBES
+###############################################
+def rss_bytes():
+    """Current resident set size (Linux /proc), else None"""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_bytes():
+    """Process peak RSS so far (ru_maxrss: KiB on Linux, bytes on macOS), else None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _mb(n):
+    return None if n is None else round(n / MB, 1)
+
+###############################################
+# PROFILER
+###############################################
+class Profiler:
+    """
+    Collects one record per stage, in start order. trace_alloc turns on
+    tracemalloc for the peak Python/numpy allocations of each stage (slower
+    runs; off by default). Use `with profiler:` to make it the active one.
+    """
+
+    def __init__(self, trace_alloc=False):
+        self.trace_alloc = trace_alloc
+        self.records = []
+        self._stack = []
+        self._token = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._token = _active.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.reset(self._token)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name, **info):
+        tracing = self.trace_alloc and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["alloc_peak"] = max(self._stack[-1]["alloc_peak"], peak)
+            tracemalloc.reset_peak()
+        path = "/".join([s["record"]["stage"] for s in self._stack[-1:]] + [name])
+        record = {"stage": path, "depth": len(self._stack), **info}
+        self.records.append(record)
+        frame = {"record": record, "alloc_start": current if tracing else 0, "alloc_peak": 0}
+        self._stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 6)
+            record["cpu_s"] = round(time.process_time() - cpu, 6)
+            record["rss_mb"] = _mb(rss_bytes())
+            record["peak_rss_mb"] = _mb(peak_rss_bytes())
+            self._stack.pop()
+            if tracing:
+                peak = max(frame["alloc_peak"], tracemalloc.get_traced_memory()[1])
+                record["alloc_peak_mb"] = _mb(max(0, peak - frame["alloc_start"]))
+                if self._stack:
+                    self._stack[-1]["alloc_peak"] = max(self._stack[-1]["alloc_peak"], peak)
+                tracemalloc.reset_peak()
+
+    def summary(self):
+        """
+        One record per stage path in first-seen order: times summed over
+        repeats (e.g. streamed chunks), memory as the maximum, plus `calls`.
+        """
+        out = {}
+        for r in self.records:
+            if "wall_s" not in r:
+                continue  # still running
+            agg = out.get(r["stage"])
+            if agg is None:
+                out[r["stage"]] = dict(r, calls=1)
+                continue
+            agg["calls"] += 1
+            for key in ("wall_s", "cpu_s"):
+                agg[key] = round(agg[key] + r[key], 6)
+            for key in ("rss_mb", "peak_rss_mb", "alloc_peak_mb"):
+                if r.get(key) is not None:
+                    agg[key] = max(agg[key] or 0, r[key])
+        return list(out.values())
+
+    def top_level(self):
+        """{stage: wall seconds} for the outermost stages"""
+        return {r["stage"]: r["wall_s"] for r in self.records if r["depth"] == 0 and "wall_s" in r}
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.summary())
+
+    def write_json_lines(self, fh, **context):
+        """One JSON object per stage (summary()); `context` (e.g. input, engine) is added to every line"""
+        for record in self.summary():
+            fh.write(json.dumps({**context, **record}) + "\n")
+        fh.flush()
+
+def current():
+    return _active.get()
+
+def stage(name, **info):
+    """Profile a block under the active Profiler; a no-op context otherwise"""
+    profiler = _active.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name, **info)
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
@@ -0,0 +1,45 @@
+###############################################
+# 📄 PAGINATED RESULT VIEW
+# Filtering happens on the full result server-side; only the requested
+# page is decoded (reason text) and handed to the browser.
+###############################################
+
+import numpy as np
+import pandas as pd
+
+from engine import REASONS, with_reason_text
+
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+
+def distinct_values(series):
+    """Sorted non-null distinct values, for filter widgets"""
+    return sorted(pd.unique(series.dropna()).tolist(), key=str)
+
+def filter_mask(df, eligible_only=False, pais=(), gestion=(), reasons=()):
+    """
+    Boolean row mask for the grid filters.
+    reasons: rule texts from engine.REASONS; a row matches if it failed any of them.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if eligible_only:
+        mask &= df["eligible"].to_numpy(dtype=bool)
+    if pais:
+        mask &= df["Pais"].isin(pais).to_numpy()
+    if gestion:
+        mask &= df["Gestion"].isin(gestion).to_numpy()
+    if reasons:
+        bits = 0
+        for bit, text in REASONS.items():
+            if text in reasons:
+                bits |= int(bit)
+        mask &= (df["Reason_Mask"].to_numpy() & bits) != 0
+    return mask
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+def get_page(df, mask, page, page_size=DEFAULT_PAGE_SIZE):
+    """Rows of page `page` (1-based) among the rows selected by mask, reasons decoded"""
+    rows = np.flatnonzero(mask)[(page - 1) * page_size: page * page_size]
+    return with_reason_text(df.iloc[rows])
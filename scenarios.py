@@ -0,0 +1,126 @@
+###############################################
+# 🔮 WHAT-IF SCENARIOS (parameter sweeps)
+# KPIs for hundreds of pct / min wallet / cap combinations in one pass over
+# a preprocessed base. Inside a Pais group every parameter is a scalar per
+# scenario, so each block of rows is evaluated as a rows x scenarios NumPy
+# broadcast; the country caps and the global limits collapse into a single
+# clip per (group, scenario). Values match engine.apply_params row for row.
+###############################################
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from engine import group_params
+from kpis import SUM_COLS
+
+BLOCK_CELLS = 1_000_000  # rows x scenarios evaluated at once (~8 MB per temporary)
+SUM_VALUE_COLS = {name: col for name, col in SUM_COLS.items() if col not in ("eligible", "reinvestment")}
+
+###############################################
+# SCENARIO GRIDS
+###############################################
+def scenario_grid(pct_dict, min_wallet, cap, country_caps, pct_ranges=None, min_wallets=None, caps=None):
+    """
+    Cartesian product of the ranges given (pct_ranges: {country: [fractions]},
+    min_wallets, caps); anything without a range keeps its base value.
+    Returns a list of scenario dicts (pct_dict, min_wallet, cap, country_caps).
+    """
+    pct_ranges = pct_ranges or {}
+    countries = list(pct_ranges)
+    scenarios = []
+    for combo in product(*(pct_ranges[c] for c in countries), min_wallets or [min_wallet], caps or [cap]):
+        pct = dict(pct_dict, **dict(zip(countries, combo[:len(countries)])))
+        scenarios.append({"pct_dict": pct, "min_wallet": combo[-2], "cap": combo[-1], "country_caps": country_caps})
+    return scenarios
+
+def scenario_params(scenarios):
+    """One row per scenario with its parameters (pct_<country>, min_wallet, cap)"""
+    rows = []
+    for sc in scenarios:
+        row = {f"pct_{k}": v for k, v in sc["pct_dict"].items()}
+        row.update(min_wallet=sc["min_wallet"], cap=sc["cap"])
+        rows.append(row)
+    return pd.DataFrame(rows).rename_axis("scenario")
+
+###############################################
+# SWEEP
+###############################################
+def _bounds(pre, scenarios):
+    """(pct, lo, hi) as groups x scenarios; lo/hi fold the country caps into the global limits"""
+    pct, lo, hi = [], [], []
+    for sc in scenarios:
+        pct_g, lo_g, hi_g = group_params(pre.keys, sc["pct_dict"], sc["country_caps"])
+        g_lo, g_hi = min(sc["min_wallet"], sc["cap"]), max(sc["min_wallet"], sc["cap"])
+        # clip(clip(x, lo_g, hi_g), g_lo, g_hi) == clip(x, clip(lo_g, g_lo, g_hi), clip(hi_g, g_lo, g_hi))
+        pct.append(pct_g)
+        lo.append(np.clip(lo_g, g_lo, g_hi))
+        hi.append(np.clip(hi_g, g_lo, g_hi))
+    return np.array(pct).T, np.array(lo).T, np.array(hi).T
+
+def _sweep_rows(pot, promo2, wxv, values, pct, lo, hi):
+    """Eligible count, reinvestment and value sums per scenario for one block of one Pais group"""
+    r = pot[:, None] * pct[None, :]
+    np.maximum(r, lo[None, :], out=r)
+    np.minimum(r, hi[None, :], out=r)
+    # rule 3 (> Promo2); rule 4: a range applies when r != 0 and r <= WxV * 0.5 or r <= WxV
+    top = np.maximum(wxv, wxv * 0.5)
+    elig = (r > promo2[:, None]) & (r != 0) & (r <= top[:, None])
+    reinv = np.where(elig, r.round(2), 0.0).sum(axis=0)
+    return elig.sum(axis=0), reinv, elig.T.astype(float) @ values
+
+def sweep(pre, scenarios, block_cells=BLOCK_CELLS):
+    """
+    KPIs of every scenario on an engine.Prepared base. Returns (table,
+    by_pais): table has one row per scenario (parameters, kpis.SUM_COLS
+    totals, Avg_Visitas); by_pais is the same sums per scenario and Pais
+    (rows without a Pais count in the totals only, like kpis.rollup).
+    """
+    frame = pre.frame
+    n_s = len(scenarios)
+    pct, lo, hi = _bounds(pre, scenarios)
+    # only rows that pass the parameter-independent rules can become eligible
+    candidates = pre.eligible_base & ~pre.blocked
+    value_cols = list(SUM_VALUE_COLS.values())
+    all_values = frame[value_cols].to_numpy(dtype=float)
+
+    n_g = len(pre.keys)
+    counts = np.zeros((n_g, n_s), dtype=np.int64)
+    reinv = np.zeros((n_g, n_s))
+    sums = np.zeros((n_g, n_s, len(value_cols)))
+    block = max(1, block_cells // max(n_s, 1))
+    for g, rows in enumerate(pre.group_rows):
+        rows = rows[candidates[rows]]
+        for start in range(0, len(rows), block):
+            idx = rows[start:start + block]
+            c, r, v = _sweep_rows(pre.pot_visita[idx], pre.promo2[idx], pre.wxv[idx], all_values[idx],
+                                  pct[g], lo[g], hi[g])
+            counts[g] += c
+            reinv[g] += r
+            sums[g] += v
+
+    # --- by Pais (first raw value of each group as the label) ---
+    labels = [frame["Pais"].iloc[rows[0]] for rows in pre.group_rows]
+    by_pais = pd.DataFrame({
+        "scenario": np.tile(np.arange(n_s), n_g),
+        "Pais": np.repeat(np.array(labels, dtype=object), n_s),
+        "Eligible_Count": counts.ravel(),
+        "Total_Reinvestment": reinv.ravel(),
+        **{name: sums[:, :, k].ravel() for k, name in enumerate(SUM_VALUE_COLS)},
+    })
+    by_pais = by_pais[(by_pais["Eligible_Count"] > 0) & by_pais["Pais"].notna()].sort_values(["scenario", "Pais"], key=_sort_key)
+    by_pais = by_pais[["scenario", "Pais"] + list(SUM_COLS)].reset_index(drop=True)
+
+    # --- totals per scenario ---
+    table = scenario_params(scenarios)
+    table["Eligible_Count"] = counts.sum(axis=0)
+    table["Total_Reinvestment"] = reinv.sum(axis=0)
+    for k, name in enumerate(SUM_VALUE_COLS):
+        table[name] = sums[:, :, k].sum(axis=0)
+    n = table["Eligible_Count"].to_numpy()
+    table["Avg_Visitas"] = np.where(n > 0, table["Total_Visitas"] / np.maximum(n, 1), np.nan)
+    return table, by_pais
+
+def _sort_key(col):
+    return col.astype(str) if col.name == "Pais" else col
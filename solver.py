@@ -0,0 +1,178 @@
+###############################################
+# 🎯 BUDGET SOLVER (pct for a target reinvestment)
+# For fixed caps / min wallet / cap, one row's reinvestment as a function
+# of pct p is piecewise: the lower bound, then Pot_Visita * p, then the upper
+# bound; it counts once it beats Promo2 and while it stays within WxV
+# (p <= 1). So a country's total is A(p) + p * B(p) with A and B step
+# functions: sorting the breakpoints once and taking cumulative sums makes
+# every evaluation a binary search, and a budget is solved exactly on the
+# linear piece it falls in. Totals ignore the 2-decimal rounding of each
+# row; the solved pct is re-checked with the exact rules (scenarios.sweep).
+###############################################
+
+import numpy as np
+import pandas as pd
+
+from engine import build_cap_lookup, normalize_gestion
+from scenarios import sweep
+
+###############################################
+# BUDGET CURVE
+###############################################
+class BudgetCurve:
+    """
+    Total reinvestment as a function of one pct-like variable x, from
+    breakpoints (pos) with constant (dA) and slope (dB) changes and the
+    value at x = 0 (a0). total(x) is O(log n); solve(budget) too.
+    """
+
+    def __init__(self, pos, d_a, d_b, a0, x_max):
+        order = np.argsort(pos, kind="stable")
+        self.pos = pos[order]
+        self.a = np.concatenate([[a0], a0 + np.cumsum(d_a[order])])
+        self.b = np.concatenate([[0.0], np.cumsum(d_b[order])])
+        self.x_max = x_max
+
+    def total(self, x):
+        k = np.searchsorted(self.pos, x, side="right")
+        return self.a[k] + x * self.b[k]
+
+    def solve(self, budget):
+        """Largest x in [0, x_max] whose total does not exceed budget (0 when even x = 0 does)"""
+        # segments start at 0 and at every breakpoint inside (0, x_max)
+        inner = self.pos[(self.pos > 0) & (self.pos < self.x_max)]
+        starts = np.concatenate([[0.0], inner])
+        ends = np.concatenate([inner, [self.x_max]])
+        k = np.searchsorted(self.pos, starts, side="right")
+        a, b = self.a[k], self.b[k]
+        at_start = a + starts * b
+        j = np.searchsorted(at_start, budget, side="right") - 1  # totals never decrease on [0, x_max]
+        if j < 0:
+            return 0.0
+        if b[j] > 0 and budget - a[j] < ends[j] * b[j]:
+            return float(max((budget - a[j]) / b[j], starts[j]))
+        # the budget lies past this segment (in the jump at its end): stop just before it
+        last = j == len(starts) - 1
+        return float(ends[j] if last else np.nextafter(ends[j], -np.inf))
+
+def _row_events(pot, promo2, lo, hi):
+    """
+    (pos, dA, dB, a0) of the rows' piecewise reinvestment in p, for bounds
+    lo <= hi (caps folded into the global limits, as in scenarios._bounds).
+    Rows with Pot_Visita <= 0 are never eligible when lo >= 0 and are skipped.
+    """
+    keep = pot > 0
+    pot, promo2 = pot[keep], promo2[keep]
+    with np.errstate(divide="ignore"):
+        a = lo / pot                       # below: the lower bound applies
+        b = hi / pot                       # above: the upper bound applies
+        t = np.maximum(promo2 / pot, 0.0)  # linear part beats Promo2 past here
+    c_lo = np.where((lo > promo2) & (lo <= pot) & (lo > 0), lo, 0.0)
+    c_hi = np.where((hi > promo2) & (hi <= pot) & (hi > 0), hi, 0.0)
+    # past p = 1 the linear part exceeds WxV; solving stops at 1, so its end is just b
+    lin_start = np.maximum(a, t)
+    lin = (lin_start < b) & (lin_start <= 1.0)
+    zeros = np.zeros(int(lin.sum()))
+    pos = np.concatenate([a, lin_start[lin], b[lin], b])
+    d_a = np.concatenate([-c_lo, zeros, zeros, c_hi])
+    d_b = np.concatenate([np.zeros(len(a)), pot[lin], -pot[lin], np.zeros(len(b))])
+    return pos, d_a, d_b, float(c_lo.sum())
+
+def _group_events(pre, g, min_wallet, cap, country_caps):
+    """Events of one Pais group, over the rows that pass the parameter-independent rules"""
+    g_lo, g_hi = min(min_wallet, cap), max(min_wallet, cap)
+    c_lo, c_hi = build_cap_lookup(country_caps).get(pre.keys[g], (-np.inf, np.inf))
+    hi = float(np.clip(c_hi, g_lo, g_hi))
+    lo = min(float(np.clip(c_lo, g_lo, g_hi)), hi)  # inverted caps clip everything to hi
+    if lo < 0:
+        raise ValueError("The budget solver needs non-negative minimums and caps")
+    rows = pre.group_rows[g]
+    rows = rows[pre.eligible_base[rows] & ~pre.blocked[rows]]
+    return _row_events(pre.pot_visita[rows], pre.promo2[rows], lo, hi)
+
+###############################################
+# SOLVERS
+###############################################
+def _key_groups(pre):
+    out = {}
+    for g, key in enumerate(pre.keys):
+        out.setdefault(key, []).append(g)
+    return out
+
+def country_curve(pre, country, min_wallet, cap, country_caps, max_pct=1.0):
+    """BudgetCurve of one country's total reinvestment against its pct"""
+    groups = _key_groups(pre).get(normalize_gestion(country))
+    if not groups:
+        raise ValueError(f"No rows for Pais '{country}'")
+    events = [_group_events(pre, g, min_wallet, cap, country_caps) for g in groups]
+    return BudgetCurve(*(np.concatenate([e[i] for e in events]) for i in range(3)),
+                       sum(e[3] for e in events), min(max_pct, 1.0))
+
+def scale_curve(pre, pct_dict, min_wallet, cap, country_caps, max_pct=1.0):
+    """BudgetCurve of the overall total against a factor s applied to every country's pct"""
+    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
+    pos, d_a, d_b, a0 = [], [], [], 0.0
+    for g, key in enumerate(pre.keys):
+        p, da, db, base = _group_events(pre, g, min_wallet, cap, country_caps)
+        pct = pct_norm.get(key, 0)
+        if pct > 0:
+            pos.append(p / pct)
+            d_a.append(da)
+            d_b.append(db * pct)
+            a0 += base
+        else:
+            # pct stays 0 whatever the factor: the group contributes its value at p = 0
+            a0 += base + da[p <= 0].sum()
+    top = max(pct_norm.values(), default=0)
+    s_max = min(max_pct, 1.0) / top if top > 0 else 0.0
+    if not pos:
+        pos, d_a, d_b = [np.empty(0)], [np.empty(0)], [np.empty(0)]
+    return BudgetCurve(np.concatenate(pos), np.concatenate(d_a), np.concatenate(d_b), a0, s_max)
+
+def _report(pre, pct_dict, min_wallet, cap, country_caps, budgets, predicted):
+    """Exact check of the solved pct: totals per country key via the scenario sweep"""
+    scenario = {"pct_dict": pct_dict, "min_wallet": min_wallet, "cap": cap, "country_caps": country_caps}
+    table, by_pais = sweep(pre, [scenario])
+    by_key = by_pais.assign(key=by_pais["Pais"].map(normalize_gestion)).groupby("key")[
+        ["Eligible_Count", "Total_Reinvestment"]].sum()
+    pct_norm = {normalize_gestion(k): v for k, v in pct_dict.items()}
+    rows = []
+    for country, budget in budgets.items():
+        key = normalize_gestion(country)
+        if key == "total":
+            count, total = table.loc[0, "Eligible_Count"], table.loc[0, "Total_Reinvestment"]
+        else:
+            count = by_key["Eligible_Count"].get(key, 0)
+            total = by_key["Total_Reinvestment"].get(key, 0.0)
+        rows.append({"Pais": country, "Budget": budget, "pct": pct_norm.get(key),
+                     "Predicted_Reinvestment": predicted[country], "Total_Reinvestment": total,
+                     "Gap": total - budget, "Eligible_Count": int(count)})
+    return pd.DataFrame(rows)
+
+def solve_budgets(pre, budgets, pct_dict, min_wallet, cap, country_caps, max_pct=1.0):
+    """
+    pct per country so its total reinvestment lands on budgets[country]
+    (the largest pct not exceeding it, up to max_pct). Other countries keep
+    their pct. Returns (new pct_dict, report frame with the exact totals).
+    """
+    new_pct = dict(pct_dict)
+    predicted = {}
+    for country, budget in budgets.items():
+        curve = country_curve(pre, country, min_wallet, cap, country_caps, max_pct)
+        pct = curve.solve(budget)
+        # the pct_dict entry that owns this country (first match, like group_params)
+        name = next((k for k in new_pct if normalize_gestion(k) == normalize_gestion(country)), country)
+        new_pct[name] = pct
+        predicted[country] = float(curve.total(pct))
+    return new_pct, _report(pre, new_pct, min_wallet, cap, country_caps, budgets, predicted)
+
+def solve_total(pre, budget, pct_dict, min_wallet, cap, country_caps, max_pct=1.0):
+    """
+    One factor on every country's pct (keeping their ratios) so the overall
+    total reinvestment lands on budget. Returns (new pct_dict, report).
+    """
+    curve = scale_curve(pre, pct_dict, min_wallet, cap, country_caps, max_pct)
+    s = curve.solve(budget)
+    new_pct = {k: v * s for k, v in pct_dict.items()}
+    return new_pct, _report(pre, new_pct, min_wallet, cap, country_caps, {"Total": budget},
+                            {"Total": float(curve.total(s))})
@@ -0,0 +1,345 @@
+###############################################
+# 🗄️ SQL SOURCE (SQL Server via pyodbc, or any DB-API driver)
+# Only the engine's columns are selected, eligibility prefilters run in
+# the WHERE clause and rows are fetched in batches. sqlite3 works as a
+# local stand-in (same qmark parameters and [bracket] quoting).
+# ConnectionPool keeps connections open across loads and sessions;
+# write_layout bulk-inserts a computed layout back in one transaction.
+###############################################
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+import pandas as pd
+
+from engine import COMPS_LIMIT, REQUIRED_COLS, clean
+from export import iter_rows, project_layout
+from loaders import compact_dtypes, engine_name, resolve_columns
+
+DEFAULT_TABLE = "reinvestment_base"
+DEFAULT_FETCH_ROWS = 50_000
+DEFAULT_POOL_SIZE = 4
+DEFAULT_BATCH_ROWS = 10_000
+WRITEBACK_COLS = ["Pais", "Gestion", "eligible", "reinvestment", "Rango_Reinv", "Reason_Not_Eligible"]
+ODBC_DRIVER = "ODBC Driver 17 for SQL Server"
+
+def _pyodbc():
+    try:
+        import pyodbc
+    except ImportError as e:
+        raise ImportError("SQL Server sources need `pip install pyodbc` and an ODBC driver") from e
+    return pyodbc
+
+###############################################
+# CONNECTIONS
+###############################################
+def odbc_connection_string(server, database, username, password, driver=ODBC_DRIVER):
+    return f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+
+def is_sql_url(source):
+    return isinstance(source, str) and source.lower().startswith(("sqlite:", "odbc:"))
+
+def connect(url):
+    """
+    'sqlite:///path.db' (or 'sqlite://' for in-memory) -> sqlite3;
+    'odbc:DRIVER={...};SERVER=...' -> pyodbc.
+    """
+    scheme, _, rest = url.partition(":")
+    if scheme.lower() == "sqlite":
+        path = rest[3:] if rest.startswith("///") else ":memory:"
+        return sqlite3.connect(path or ":memory:", check_same_thread=False)
+    if scheme.lower() == "odbc":
+        return _pyodbc().connect(rest)
+    raise ValueError(f"Unsupported SQL source: {scheme}")
+
+def check_sqlite_url(url, allowed_dir):
+    """
+    For user-typed servers (the app), which must not open arbitrary paths
+    with the server's permissions: a sqlite:/// URL is only accepted for a
+    file under allowed_dir (None: never) and comes back with that absolute
+    path. Other URLs pass unchanged.
+    """
+    scheme, _, rest = url.partition(":")
+    if scheme.lower() != "sqlite":
+        return url
+    if not allowed_dir:
+        raise ValueError("SQLite sources are not enabled")
+    root = os.path.realpath(allowed_dir)
+    name = rest[3:] if rest.startswith("///") else ""
+    path = os.path.realpath(os.path.join(root, name))
+    if not name or os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"SQLite files must be under {allowed_dir}")
+    return f"sqlite:///{path}"
+
+###############################################
+# CONNECTION POOL
+###############################################
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections from connect_fn, at most max_size
+    open at once (acquire waits up to acquire_timeout for one to be released).
+    Connections idle longer than idle_timeout are closed; ones idle longer
+    than ping_after are checked with health_query before being handed out.
+    """
+
+    def __init__(self, connect_fn, max_size=DEFAULT_POOL_SIZE, idle_timeout=300.0, ping_after=30.0,
+                 acquire_timeout=30.0, health_query="SELECT 1"):
+        self._connect = connect_fn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.acquire_timeout = acquire_timeout
+        self.health_query = health_query
+        self._idle = []  # (conn, released_at), most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+        self.created = 0
+        self.discarded = 0
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            conn = released_at = None
+            new = False
+            with self._cond:
+                stale = self._take_stale()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                elif self._open < self.max_size:
+                    self._open += 1
+                    self.created += 1
+                    new = True
+                elif not stale and not self._cond.wait(deadline - time.monotonic()):
+                    raise TimeoutError(f"No SQL connection free after {self.acquire_timeout:.0f}s "
+                                       f"(pool max_size={self.max_size})")
+            for old, _ in stale:
+                _close_quietly(old)
+
+            if new:
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._forget()
+                    raise
+            if conn is None:
+                continue  # woken up, or made room by evicting: try again
+            if time.monotonic() - released_at < self.ping_after or self._healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken=False):
+        """Hand a connection back; broken ones (or ones that can't roll back) are closed"""
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, broken=not self._healthy(conn))
+            raise
+        self.release(conn)
+
+    def close_all(self):
+        """Close idle connections; ones in use go back to the pool when released"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return {"open": self._open, "idle": len(self._idle), "in_use": self._open - len(self._idle),
+                    "max_size": self.max_size, "created": self.created, "discarded": self.discarded}
+
+    def _healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(self.health_query)
+                cur.fetchall()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _take_stale(self):
+        """Remove connections idle past idle_timeout from the pool (caller holds the lock)"""
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = [item for item in self._idle if item[1] < cutoff]
+        if stale:
+            self._idle = [item for item in self._idle if item[1] >= cutoff]
+            self._open -= len(stale)
+            self.discarded += len(stale)
+            self._cond.notify(len(stale))
+        return stale
+
+    def _discard(self, conn):
+        _close_quietly(conn)
+        self._forget(discarded=1)
+
+    def _forget(self, discarded=0):
+        with self._cond:
+            self._open -= 1
+            self.discarded += discarded
+            self._cond.notify()
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+###############################################
+# QUERY BUILDING
+###############################################
+def quote_ident(name):
+    return "[" + str(name).replace("]", "]]") + "]"
+
+def quote_table(table):
+    """schema.table -> [schema].[table]"""
+    return ".".join(quote_ident(part) for part in table.split("."))
+
+def table_columns(conn, table):
+    """Column names of `table`, from an empty result set"""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT * FROM {quote_table(table)} WHERE 1 = 0")
+        return [d[0] for d in cur.description]
+    finally:
+        cur.close()
+
+def build_query(columns, table, eligible_only=False):
+    """
+    (sql, params): SELECT of `columns` only. eligible_only pushes the
+    parameter-independent rules down (NG = 0, Comps <= COMPS_LIMIT), so rows
+    that can never be eligible stay on the server.
+    """
+    raw = {engine_name(c): c for c in columns}
+    where, params = [], []
+    if eligible_only:
+        comps = quote_ident(raw["Comps"])
+        where.append(f"{quote_ident(raw['NG'])} = ?")
+        where.append(f"({comps} IS NULL OR {comps} <= ?)")
+        params += [0, COMPS_LIMIT]
+    sql = f"SELECT {', '.join(quote_ident(c) for c in columns)} FROM {quote_table(table)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql, params
+
+###############################################
+# FETCH
+###############################################
+def iter_sql_chunks(conn, table=DEFAULT_TABLE, eligible_only=False, extra_cols=(), fetch_rows=DEFAULT_FETCH_ROWS):
+    """Frames of at most fetch_rows rows (column names cleaned), straight off the cursor"""
+    columns = resolve_columns(table_columns(conn, table), extra_cols)
+    missing = sorted(set(REQUIRED_COLS) - {engine_name(c) for c in columns})
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    sql, params = build_query(columns, table, eligible_only)
+    names = [clean(c) for c in columns]
+    cur = conn.cursor()
+    try:
+        cur.arraysize = fetch_rows
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(fetch_rows)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records([tuple(r) for r in rows], columns=names)
+    finally:
+        cur.close()
+
+def load_sql(conn, table=DEFAULT_TABLE, eligible_only=False, extra_cols=(), fetch_rows=DEFAULT_FETCH_ROWS):
+    """Projected (and optionally prefiltered) table as one frame, like loaders.load_table"""
+    chunks = list(iter_sql_chunks(conn, table, eligible_only, extra_cols, fetch_rows))
+    if not chunks:
+        names = [clean(c) for c in resolve_columns(table_columns(conn, table), extra_cols)]
+        return pd.DataFrame(columns=names)
+    return compact_dtypes(pd.concat(chunks, ignore_index=True))
+
+###############################################
+# WRITE-BACK
+###############################################
+def _drop_quietly(conn, target):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DROP TABLE {target}")
+        conn.commit()
+    except Exception:
+        pass  # already gone with the rollback
+    finally:
+        cur.close()
+
+def sql_type(dtype):
+    """Column type for create=True (names both SQL Server and SQLite accept)"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BIT"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "FLOAT"
+    return "NVARCHAR(255)"
+
+def write_layout(conn, df_result, table, columns=None, batch_rows=DEFAULT_BATCH_ROWS, create=False, replace=False):
+    """
+    Insert the layout into `table` with batched parameterized INSERTs, all in
+    one transaction (rolled back on any error). columns defaults to
+    WRITEBACK_COLS; put the player id first via keep-cols. create adds the
+    table, replace deletes its rows first.
+    Returns {"rows", "seconds", "rows_per_sec"}.
+    """
+    t0 = time.perf_counter()
+    layout = project_layout(df_result, columns or WRITEBACK_COLS)
+    target = quote_table(table)
+    names = ", ".join(quote_ident(c) for c in layout.columns)
+    sql = f"INSERT INTO {target} ({names}) VALUES ({', '.join('?' * len(layout.columns))})"
+
+    cur = conn.cursor()
+    if hasattr(cur, "fast_executemany"):
+        cur.fast_executemany = True  # pyodbc: one round trip per batch
+    created = False
+    try:
+        if create:
+            cols = ", ".join(f"{quote_ident(c)} {sql_type(layout[c].dtype)}" for c in layout.columns)
+            cur.execute(f"CREATE TABLE {target} ({cols})")
+            created = True
+        if replace:
+            cur.execute(f"DELETE FROM {target}")
+        rows = iter_rows(layout, chunk_rows=batch_rows)
+        while True:
+            batch = list(islice(rows, batch_rows))
+            if not batch:
+                break
+            cur.executemany(sql, batch)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        if created:
+            # some drivers (sqlite3) commit DDL on their own, so the rollback may leave the table behind
+            _drop_quietly(conn, target)
+        raise
+    finally:
+        cur.close()
+
+    seconds = time.perf_counter() - t0
+    return {"rows": len(layout), "seconds": seconds, "rows_per_sec": len(layout) / seconds if seconds else float("inf")}
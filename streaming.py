@@ -0,0 +1,58 @@
+###############################################
+# 🌊 CHUNKED STREAMING RUNS (large CSV bases)
+# Every reinvestment rule is row-local, so the base can be processed
+# chunk by chunk: only one chunk plus the running KPI aggregates are
+# ever held in memory. Any iterator of frames works (CSV chunks, SQL
+# fetch batches).
+###############################################
+
+from itertools import count
+
+import pandas as pd
+
+from engine import apply_reinvestment, clean, with_reason_text
+from kpis import grouped_sums, merge_sums, rollup
+from loaders import csv_read_options
+from profiling import stage
+
+DEFAULT_CHUNKSIZE = 200_000
+
+###############################################
+# STREAMING RUN
+###############################################
+def stream_frames(chunks, output, pct_dict, min_wallet, cap, country_caps):
+    """
+    Run the engine on each frame of `chunks` (clean column names) and append
+    the layout to `output` (CSV path or text buffer).
+    Returns the KPI aggregates accumulated over all chunks.
+    """
+    rows = 0
+    sums = None
+    chunks = iter(chunks)
+
+    for i in count():
+        with stage("read"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with stage("engine"):
+            result = apply_reinvestment(chunk, pct_dict, min_wallet, cap, country_caps)
+        with stage("write"):
+            with_reason_text(result).to_csv(output, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+        rows += len(result)
+        with stage("kpis"):
+            sums = merge_sums(sums, grouped_sums(result))
+        del chunk, result
+
+    return dict(rollup(sums), rows=rows)
+
+def stream_reinvestment(source, output, pct_dict, min_wallet, cap, country_caps,
+                        chunksize=DEFAULT_CHUNKSIZE, extra_cols=()):
+    """
+    Read `source` (CSV path or file-like) in chunks and stream it through
+    stream_frames. Only the engine's columns plus extra_cols are parsed.
+    """
+    usecols = csv_read_options(source, extra_cols)["usecols"]
+    chunks = (chunk.rename(columns=clean) for chunk in pd.read_csv(source, chunksize=chunksize, usecols=usecols))
+    return stream_frames(chunks, output, pct_dict, min_wallet, cap, country_caps)
@@ -0,0 +1,25 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_source  # noqa: E402
+from benchmark import COUNTRY_CAPS, PCT_DICT, make_casino_frame  # noqa: E402
+
+PARAMS = (PCT_DICT, 100.0, 20000.0, COUNTRY_CAPS)
+
+@pytest.fixture(scope="session")
+def casino():
+    """Small seeded base in the upload layout (NaN Pais/NG included)"""
+    return make_casino_frame(5_000, seed=11)
+
+@pytest.fixture
+def sqlite_db(tmp_path, casino):
+    """sqlite:/// URL of a file database holding `casino` in the default table"""
+    path = tmp_path / "base.db"
+    with sqlite3.connect(path) as conn:
+        casino.to_sql(sql_source.DEFAULT_TABLE, conn, index=False)
+    return f"sqlite:///{path}"
@@ -0,0 +1,27 @@
+"""engine.apply_params on a Prepared base (incremental reruns) against full engine runs"""
+import pandas as pd
+import pytest
+
+import engine
+from conftest import PARAMS
+
+PCT, MIN_WALLET, CAP, CAPS = PARAMS
+
+CHANGES = [
+    ("one country's pct", dict(PCT, ARG=0.12), MIN_WALLET, CAP, CAPS),
+    ("one country's caps", PCT, MIN_WALLET, CAP, dict(CAPS, **{"URY Local": {"min": 50.0, "max": 4000.0}})),
+    ("every pct", {k: v * 1.5 for k, v in PCT.items()}, MIN_WALLET, CAP, CAPS),
+    ("min wallet", PCT, 150.0, CAP, CAPS),
+    ("cap", PCT, MIN_WALLET, 5000.0, CAPS),
+]
+
+@pytest.mark.parametrize("change", CHANGES, ids=[c[0] for c in CHANGES])
+def test_rerun_matches_full_engine(casino, change):
+    params = change[1:]
+    pre = engine.preprocess(casino)
+    engine.apply_params(pre, *PARAMS)
+    new = engine.apply_params(pre, *params)
+    pd.testing.assert_frame_equal(engine.apply_reinvestment(casino, *params), new, check_exact=True)
+    # and back again: the previous run must not have been changed in place
+    back = engine.apply_params(pre, *PARAMS)
+    pd.testing.assert_frame_equal(engine.apply_reinvestment(casino, *PARAMS), back, check_exact=True)
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import LRUCache, approx_nbytes
+
+def test_evicts_past_maxbytes_and_keeps_the_newest():
+    cache = LRUCache(maxsize=10, maxbytes=250_000)
+    for key in "abc":
+        cache.put(key, np.zeros(10_000))  # 80 kB each
+    assert len(cache) == 3 and cache.nbytes == 240_000
+    cache.put("d", pd.DataFrame({"x": np.zeros(10_000)}))
+    assert "a" not in cache and "d" in cache
+    cache.put("big", np.zeros(100_000))
+    assert len(cache) == 1 and "big" in cache
+
+def test_approx_nbytes_walks_objects_once():
+    class Holder:
+        def __init__(self, arr):
+            self.arr, self.same, self.parts = arr, arr, (arr[:10], {"n": 1})
+
+    arr = np.zeros(1_000)
+    assert approx_nbytes(Holder(arr)) == arr.nbytes + 80 + approx_nbytes(1)
+
+def test_concurrent_misses_compute_once():
+    cache, calls = LRUCache(maxsize=4), []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_compute("k", compute), range(8)))
+    assert results == ["value"] * 8 and len(calls) == 1
+    assert cache.misses == 1 and cache.hits == 7
+
+def test_waiters_retry_after_a_failed_compute():
+    cache, started = LRUCache(maxsize=4), threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(cache.get_or_compute, "k", failing)
+        started.wait()
+        second = pool.submit(cache.get_or_compute, "k", lambda: "ok")
+        with pytest.raises(ValueError):
+            first.result()
+        assert second.result() == "ok"
+    assert cache.get("k") == "ok"
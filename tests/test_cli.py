@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+import cli
+
+@pytest.mark.parametrize("source", ["csv", "sqlite"])
+def test_budget_layout_keeps_extra_columns(tmp_path, casino, sqlite_db, source):
+    if source == "csv":
+        base = str(tmp_path / "base.csv")
+        casino.to_csv(base, index=False)
+    else:
+        base = sqlite_db
+    out = str(tmp_path / "layout.csv")
+    assert cli.main([base, "--budget-total", "500000", "--keep-cols", "Player_Id", "-o", out]) == 0
+    layout = pd.read_csv(out)
+    assert layout["Player_Id"].tolist() == casino["Player_Id"].tolist()
+
+@pytest.mark.parametrize("output", ["layout.csv", "layout.csv.gz", "layout.parquet", None])
+def test_split_by_needs_an_xlsx_or_zip_output(tmp_path, casino, capsys, output):
+    base = str(tmp_path / "base.csv")
+    casino.to_csv(base, index=False)
+    argv = [base, "--split-by", "Pais"] + (["-o", str(tmp_path / output)] if output else ["--write-table", "t"])
+    with pytest.raises(SystemExit) as exc:
+        cli.main(argv)
+    assert exc.value.code == 2 and "--split-by needs" in capsys.readouterr().err
+
+def test_split_by_zip_writes_one_file_per_pais(tmp_path, casino):
+    import zipfile
+
+    base, out = str(tmp_path / "base.csv"), str(tmp_path / "layout.zip")
+    casino.to_csv(base, index=False)
+    assert cli.main([base, "--split-by", "Pais", "--zip-format", "csv", "-o", out]) == 0
+    with zipfile.ZipFile(out) as zf:
+        assert len(zf.namelist()) == casino["Pais"].nunique(dropna=False)
@@ -0,0 +1,62 @@
+"""engine_duckdb against the pandas engine: files scanned in place, DataFrames, COPY output"""
+import pandas as pd
+import pytest
+
+import engine
+from conftest import PARAMS
+from test_engine_regression import CAPS, LIMITS, PCT, edge_frame
+
+pytest.importorskip("duckdb")
+import engine_duckdb  # noqa: E402
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv"])
+def test_file_scan_matches_pandas(tmp_path, casino, suffix):
+    path = str(tmp_path / f"base{suffix}")
+    if suffix == ".csv":
+        casino.to_csv(path, index=False)
+        ref = engine.apply_reinvestment(pd.read_csv(path), *PARAMS)
+    else:
+        casino.to_parquet(path)
+        ref = engine.apply_reinvestment(pd.read_parquet(path), *PARAMS)
+    new = engine_duckdb.apply_reinvestment(path, *PARAMS)
+    # files are projected to the engine's columns (like loaders); DataFrames keep theirs
+    pd.testing.assert_frame_equal(ref.drop(columns="Player_Id"), new, check_dtype=False, check_exact=True)
+
+@pytest.mark.parametrize("min_wallet,cap", LIMITS)
+def test_edge_cases_match_pandas(min_wallet, cap):
+    df = edge_frame()
+    ref = engine.apply_reinvestment(df, PCT, min_wallet, cap, CAPS)
+    new = engine_duckdb.apply_reinvestment(df, PCT, min_wallet, cap, CAPS)
+    # NG mixes numbers and "x" here: DuckDB passes the object column through as text
+    assert new["NG"].astype(str).tolist() == ref["NG"].astype(str).tolist()
+    pd.testing.assert_frame_equal(ref.drop(columns="NG"), new.drop(columns="NG"), check_dtype=False, check_exact=True)
+
+def test_copy_writes_the_decoded_layout(tmp_path, casino):
+    src, out = str(tmp_path / "base.parquet"), str(tmp_path / "layout.parquet")
+    casino.to_parquet(src)
+    assert engine_duckdb.write_reinvestment(src, out, *PARAMS) == len(casino)
+    ref = engine.with_reason_text(engine.apply_reinvestment(pd.read_parquet(src), *PARAMS))
+    new = pd.read_parquet(out)
+    assert new["reinvestment"].tolist() == ref["reinvestment"].tolist()
+    for col in ("Rango_Reinv", "Reason_Not_Eligible"):
+        assert new[col].fillna("").astype(str).tolist() == ref[col].astype(object).fillna("").astype(str).tolist(), col
+
+def test_text_ng_follows_pandas(tmp_path, casino):
+    # rule 2 is engine.py's raw NG == 1: text "1" never matches, numbers and True do
+    df = casino.copy()
+    df["NG"] = df["NG"].astype(str)
+    mixed = casino.copy()
+    mixed["NG"] = pd.Series([0, 1, "1", 1.0, True, "x", None], dtype=object).iloc[
+        [i % 7 for i in range(len(mixed))]].to_numpy()
+    assert (engine.apply_reinvestment(mixed, *PARAMS)["Reason_Mask"] & engine.REASON_NG).any()
+    for frame in (df, df.astype({"NG": "category"}), mixed):
+        ref = engine.apply_reinvestment(frame, *PARAMS)
+        new = engine_duckdb.apply_reinvestment(frame, *PARAMS)
+        pd.testing.assert_frame_equal(ref.drop(columns="NG"), new.drop(columns="NG"),
+                                      check_dtype=False, check_exact=True, check_categorical=False)
+    path = str(tmp_path / "base.csv")
+    mixed.to_csv(path, index=False)
+    ref = engine.apply_reinvestment(pd.read_csv(path), *PARAMS)
+    new = engine_duckdb.apply_reinvestment(path, *PARAMS)
+    pd.testing.assert_frame_equal(ref.drop(columns=["Player_Id", "NG"]), new.drop(columns="NG"),
+                                  check_dtype=False, check_exact=True)
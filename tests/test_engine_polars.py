@@ -0,0 +1,53 @@
+"""engine_polars against the pandas engine: layouts, KPIs and scanned files"""
+import pandas as pd
+import pytest
+
+import engine
+import kpis
+from conftest import PARAMS
+from test_engine_regression import CAPS, LIMITS, PCT, edge_frame
+
+pytest.importorskip("polars")
+import engine_polars  # noqa: E402
+
+def test_layout_and_kpis_match_pandas(casino):
+    pre, pre_pl = engine.preprocess(casino), engine_polars.prepare(casino)
+    for params in (PARAMS, (PARAMS[0], 150.0, 5000.0, PARAMS[3])):
+        ref = engine.apply_params(pre, *params)
+        pd.testing.assert_frame_equal(ref, engine_polars.apply_params(pre_pl, *params), check_exact=True)
+        kpi_ref, kpi_new = kpis.compute_kpis(ref), engine_polars.compute_kpis(pre_pl, *params)
+        for key in ("summary", "by_pais", "by_gestion"):
+            pd.testing.assert_frame_equal(kpi_ref[key], kpi_new[key], check_dtype=False, rtol=1e-9)
+
+@pytest.mark.parametrize("min_wallet,cap", LIMITS)
+def test_edge_cases_match_pandas(min_wallet, cap):
+    df = edge_frame()
+    ref = engine.apply_reinvestment(df, PCT, min_wallet, cap, CAPS)
+    new = engine_polars.apply_reinvestment(df, PCT, min_wallet, cap, CAPS)
+    pd.testing.assert_frame_equal(ref, new, check_exact=True)
+
+def test_parquet_scan_matches_pandas(tmp_path, casino):
+    path = str(tmp_path / "base.parquet")
+    casino.to_parquet(path)
+    ref = engine.apply_reinvestment(pd.read_parquet(path), *PARAMS)
+    new = engine_polars.apply_reinvestment(path, *PARAMS)
+    # scans are projected to the engine's columns, like loaders
+    pd.testing.assert_frame_equal(ref.drop(columns="Player_Id"), new, check_dtype=False, check_exact=True)
+
+def test_text_ng_follows_pandas(tmp_path, casino):
+    # rule 2 is engine.py's raw NG == 1: text "1" never matches, numbers and True do
+    text = casino.copy()
+    text["NG"] = text["NG"].astype(str)
+    mixed = casino.copy()
+    mixed["NG"] = pd.Series([0, 1, "1", 1.0, True, "x", None], dtype=object).iloc[
+        [i % 7 for i in range(len(mixed))]].to_numpy()
+    assert (engine.apply_reinvestment(mixed, *PARAMS)["Reason_Mask"] & engine.REASON_NG).any()
+    for frame in (text, mixed, mixed.astype({"NG": "category"})):
+        pd.testing.assert_frame_equal(engine.apply_reinvestment(frame, *PARAMS),
+                                      engine_polars.apply_reinvestment(frame, *PARAMS), check_exact=True)
+    path = str(tmp_path / "base.csv")
+    mixed.to_csv(path, index=False)
+    ref = engine.apply_reinvestment(pd.read_csv(path), *PARAMS)
+    new = engine_polars.apply_reinvestment(path, *PARAMS)
+    pd.testing.assert_frame_equal(ref.drop(columns=["Player_Id", "NG"]), new.drop(columns="NG"),
+                                  check_dtype=False, check_exact=True)
@@ -0,0 +1,122 @@
+"""
+Both engines pinned to their original row-wise code on hand-built edge
+cases: engine.apply_reinvestment (app.py) against the baseline function
+below, engine3's columnar mode against its row-wise mode.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import engine3
+
+PCT = {"ARG": 0.10, "BRA": 0.15, "URY Local": 0.08, "URY Resto": 0.08, "Otros": 0.05}
+CAPS = {"URY Local": {"min": 100.0, "max": 8000.0}, "ARG": {"min": 200.0, "max": 10000.0},
+        "BRA": {"min": 200.0, "max": 500.0}}
+
+def reference_apply_reinvestment(df, pct_dict, min_wallet, cap, country_caps):
+    """app.py's apply_reinvestment before the refactor (row-wise caps, reason strings)"""
+    df = df.copy()
+    df.rename(columns=engine.RENAME_MAP, inplace=True)
+    for c in ["TeoricoNeto", "WinTotalNeto", "Visitas", "Pot_Trip", "Pot_Visita", "Promo2", "Comps"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+    df["WxV"] = df["Pot_Visita"]
+    df["Potencial"] = df[["TeoricoNeto", "WinTotalNeto"]].max(axis=1)
+    pct_norm = {engine.normalize_gestion(k): v for k, v in pct_dict.items()}
+    df["pct"] = df["Pais"].apply(lambda x: pct_norm.get(engine.normalize_gestion(x), 0))
+    df["eligible"] = (pd.to_numeric(df["NG"], errors="coerce") == 0)
+    df["Reason_Not_Eligible"] = ""
+    df["reinvestment_raw"] = df["Pot_Visita"] * df["pct"]
+
+    def apply_country_caps(row):
+        pais = str(row.get("Pais", "")).strip()
+        reinv = row.get("reinvestment_raw", 0)
+        for key, rule in country_caps.items():
+            if engine.normalize_gestion(key) == engine.normalize_gestion(pais):
+                reinv = max(reinv, rule["min"])
+                reinv = min(reinv, rule["max"])
+                break
+        return reinv
+
+    df["reinvestment"] = df.apply(apply_country_caps, axis=1)
+    df.loc[df["eligible"], "reinvestment"] = df.loc[df["eligible"], "reinvestment"].clip(lower=min_wallet, upper=cap)
+    df.loc[~df["eligible"], "reinvestment"] = 0
+
+    mask = df["Comps"] > 2000
+    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[mask, "Reason_Not_Eligible"] += "Comps > 2000, "
+    mask = df["NG"] == 1
+    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[mask, "Reason_Not_Eligible"] += "NG = 1, "
+    mask = df["reinvestment"] <= df["Promo2"]
+    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[mask, "Reason_Not_Eligible"] += "Reinvestment <= Promo2, "
+    df["Rango_Reinv"] = np.select(
+        [df["reinvestment"] == 0, df["reinvestment"] <= df["WxV"] * 0.5, df["reinvestment"] <= df["WxV"]],
+        ["NO APLICA", "<50%", "50-100%"], default="NO APLICA",
+    )
+    mask = df["Rango_Reinv"] == "NO APLICA"
+    df.loc[mask, ["eligible", "reinvestment"]] = [False, 0]
+    df.loc[mask, "Reason_Not_Eligible"] += "Rango_Reinv = NO APLICA, "
+    df["Reason_Not_Eligible"] = df["Reason_Not_Eligible"].str.strip(", ").replace("", np.nan)
+    df["reinvestment"] = df["reinvestment"].round(2)
+    return df
+
+def edge_frame():
+    """One row per edge case (the comment names it)"""
+    rows = [
+        # Gestion,   Pais,        NG,     Pot_xVisita, Promo2, Comps
+        ("ARG",       "ARG",       0,      5000.0,      100.0,  10.0),    # plain eligible
+        ("ARG",       None,        0,      5000.0,      100.0,  10.0),    # NaN Pais
+        ("BRA",       "BRA",       np.nan, 5000.0,      100.0,  10.0),    # NaN NG
+        ("BRA",       "BRA",       1,      5000.0,      100.0,  10.0),    # NG = 1
+        ("BRA",       "BRA",       "x",    5000.0,      100.0,  10.0),    # NG not numeric
+        ("ARG",       "ARG",       0,      5000.0,      100.0,  2000.0),  # Comps at the app.py limit
+        ("ARG",       "ARG",       0,      5000.0,      100.0,  2000.01), # just above it
+        ("ARG",       "ARG",       0,      5000.0,      100.0,  200.0),   # Comps at the app3 limit
+        ("ARG",       "ARG",       0,      5000.0,      100.0,  200.01),  # just above it
+        ("ARG",       "ARG",       0,      5000.0,      500.0,  10.0),    # reinvestment == Promo2 (tie)
+        ("ARG",       "ARG",       0,      5000.0,      499.99, 10.0),    # just under the tie
+        ("URY Local", "URY Local", 0,      150.0,       0.0,    10.0),    # lower cap > 50% of WxV
+        ("URY Local", "URY_LOCAL", 0,      3000.0,      0.0,    10.0),    # Pais spelled differently
+        ("URY Resto", "URY Resto", 0,      0.0,         0.0,    10.0),    # zero pot
+        ("Otros",     "Otros",     0,      -500.0,      -100.0, 10.0),    # negative pot / Promo2
+        ("Otros",     "Nowhere",   0,      5000.0,      0.0,    np.nan),  # unknown country, NaN Comps
+        ("BRA",       "BRA",       0,      90000.0,     0.0,    2500.0),  # capped, then Comps > 2000
+        ("ARG",       "ARG",       1,      5000.0,      9000.0, 2500.0),  # every rule at once
+    ]
+    df = pd.DataFrame(rows, columns=["Gestion", "Pais", "NG", "Pot_xVisita", "Promo2", "Comps"])
+    n = len(df)
+    df["Prom_TeoNeto_Trip"] = np.linspace(100, 900, n).round(2)
+    df["Prom_WinNeto_Trip"] = np.linspace(900, -100, n).round(2)
+    df["Prom_Visita_Trip"] = np.arange(1, n + 1)
+    df["Pot_Trip"] = df["Pot_xVisita"] * 3
+    return df
+
+LIMITS = [(100.0, 20000.0), (300.0, 20000.0), (5000.0, 1000.0), (100.0, 100.0)]  # incl. min_wallet > cap
+
+@pytest.mark.parametrize("min_wallet,cap", LIMITS)
+def test_engine_matches_original_app_engine(min_wallet, cap):
+    df = edge_frame()
+    want = reference_apply_reinvestment(df, PCT, min_wallet, cap, CAPS)
+    got = engine.with_reason_text(engine.apply_reinvestment(df, PCT, min_wallet, cap, CAPS))
+    assert list(got.columns) == list(want.columns)
+    for col in want.columns:
+        if col in ("Reason_Not_Eligible", "Rango_Reinv"):
+            # text columns: categorical now, object strings (NaN when eligible) before
+            pd.testing.assert_series_equal(got[col].astype(object), want[col].astype(object), obj=col)
+        else:
+            pd.testing.assert_series_equal(got[col], want[col], check_dtype=False, check_exact=True, obj=col)
+
+@pytest.mark.parametrize("min_wallet,cap", LIMITS)
+def test_engine3_columnar_matches_rowwise(min_wallet, cap):
+    df = edge_frame()
+    want = engine3.apply_reinvestment(df, PCT, min_wallet, cap, CAPS, columnar=False)
+    got = engine3.apply_reinvestment(df, PCT, min_wallet, cap, CAPS, columnar=True)
+    pd.testing.assert_frame_equal(got, want, check_exact=True)
+
+def test_edge_cases_hit_each_rule():
+    got = engine.apply_reinvestment(edge_frame(), PCT, 100.0, 20000.0, CAPS)
+    counts = engine.reason_counts(got["Reason_Mask"])
+    assert (counts > 0).all(), counts
+    assert set(got["Rango_Reinv"].astype(str)) == set(engine.RANGO_LABELS)
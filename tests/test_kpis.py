@@ -0,0 +1,54 @@
+"""
+kpis.compute_kpis against the app's original multi-pass KPI section, and
+merge_sums of chunk / partition tables against one pass, with NaN Pais and
+Gestion keys in the base.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import kpis
+from benchmark import kpis_multipass
+from conftest import PARAMS
+
+@pytest.fixture(scope="module")
+def result(casino):
+    df = casino.copy()
+    df.loc[df.index[::7], "Pais"] = np.nan
+    df.loc[df.index[::11], "Gestion"] = np.nan
+    return engine.apply_reinvestment(df, *PARAMS)
+
+def test_compute_kpis_matches_multipass(result):
+    ref = kpis_multipass(result)
+    new = kpis.compute_kpis(result)
+    pd.testing.assert_frame_equal(ref["Pais"], new["by_pais"], check_dtype=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(ref["Gestion"], new["by_gestion"], check_dtype=False, rtol=1e-9)
+    eligible = result[result["eligible"]]
+    assert new["totals"]["Eligible_Count"] == len(eligible)
+    assert np.isclose(new["totals"]["Total_Reinvestment"], eligible["reinvestment"].sum(), rtol=1e-12)
+
+def partitions(result, by):
+    if by == "chunks":
+        return [result.iloc[i:i + 700] for i in range(0, len(result), 700)]
+    # one partition per Pais (NaN Pais included), like parallel's partition="pais"
+    return [g for _, g in result.groupby(result["Pais"].astype(object).fillna("~"), sort=False)]
+
+@pytest.mark.parametrize("by", ["chunks", "pais"])
+def test_merged_partitions_match_one_pass(result, by):
+    sums = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for part in partitions(result, by):
+            sums = kpis.merge_sums(sums, kpis.grouped_sums(part))
+    merged = kpis.rollup(sums)
+    full = kpis.compute_kpis(result)
+    assert sums.index.get_level_values("Pais").isna().any()
+    assert sums.index.get_level_values("Gestion").isna().any()
+    pd.testing.assert_frame_equal(
+        sums.sort_index(), kpis.grouped_sums(result).sort_index(), check_dtype=False, rtol=1e-9)
+    for key in ("summary", "by_pais", "by_gestion"):
+        pd.testing.assert_frame_equal(merged[key], full[key], check_dtype=False, rtol=1e-9)
+    assert merged["totals"]["Eligible_Count"] == full["totals"]["Eligible_Count"]
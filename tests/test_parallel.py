@@ -0,0 +1,53 @@
+"""parallel.apply_reinvestment_parallel against the serial engine (pool forced with min_rows=0)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import kpis
+import parallel
+from conftest import PARAMS
+
+@pytest.fixture(scope="module")
+def executor():
+    pool = parallel.make_executor(2)
+    yield pool
+    pool.shutdown()
+
+@pytest.mark.parametrize("partition", parallel.PARTITIONS)
+def test_pool_matches_serial(casino, executor, partition):
+    ref = engine.apply_reinvestment(casino, *PARAMS)
+    new, kpi = parallel.apply_reinvestment_parallel(casino, *PARAMS, workers=2, partition=partition,
+                                                    executor=executor, min_rows=0)
+    pd.testing.assert_frame_equal(ref, new, check_exact=True)
+    kpi_ref = kpis.compute_kpis(ref)
+    for key in ("summary", "by_pais", "by_gestion"):
+        pd.testing.assert_frame_equal(kpi_ref[key], kpi[key], rtol=1e-9)
+
+def test_text_and_missing_values_match_serial(casino, executor):
+    # text columns reach the workers as categoricals (missing values as code -1)
+    df = casino.copy()
+    df.loc[df.index[::7], "Pais"] = np.nan
+    df.loc[df.index[::11], "Gestion"] = np.nan
+    df["NG"] = pd.Series([0, 1, "1", None, "x"], dtype=object).iloc[[i % 5 for i in range(len(df))]].to_numpy()
+    ref = engine.apply_reinvestment(df, *PARAMS)
+    new, kpi = parallel.apply_reinvestment_parallel(df, *PARAMS, workers=2, executor=executor, min_rows=0)
+    pd.testing.assert_frame_equal(ref, new, check_exact=True)
+    kpi_ref = kpis.compute_kpis(ref)
+    for key in ("summary", "by_pais", "by_gestion"):
+        pd.testing.assert_frame_equal(kpi_ref[key], kpi[key], rtol=1e-9)
+
+def test_small_bases_run_serially(casino):
+    # no executor is created: a pool here would take about a second to start
+    new, kpi = parallel.apply_reinvestment_parallel(casino, *PARAMS, workers=4)
+    pd.testing.assert_frame_equal(engine.apply_reinvestment(casino, *PARAMS), new, check_exact=True)
+    assert kpi["totals"]["Eligible_Count"] == int(new["eligible"].sum())
+
+def test_pais_spans_cut_large_countries():
+    codes = np.random.default_rng(0).permutation(np.repeat([0, 1, 2, 3], [700, 200, 70, 30]))
+    order, spans = parallel.pais_spans(codes, 8)
+    assert np.array_equal(np.sort(order), np.arange(len(codes)))
+    assert len(spans) == 8
+    assert max(b - a for a, b in spans) <= 2 * 125  # LPT: at most one extra piece per task
+    # every span but the ones mixing the small countries holds a single Pais
+    assert sum(len(np.unique(codes[order[a:b]])) > 1 for a, b in spans) <= 2
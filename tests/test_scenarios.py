@@ -0,0 +1,34 @@
+"""scenarios.sweep against apply_params + compute_kpis for every scenario of a small grid"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import kpis
+import scenarios
+from conftest import PARAMS
+
+PCT, MIN_WALLET, CAP, CAPS = PARAMS
+
+@pytest.fixture(scope="module")
+def grid():
+    return scenarios.scenario_grid(
+        PCT, MIN_WALLET, CAP, CAPS,
+        pct_ranges={"ARG": [0.0, 0.10, 0.30], "URY Local": [0.05, 0.08]},
+        min_wallets=[0.0, 100.0, 3000.0], caps=[1000.0, 20000.0],  # 3000 > 1000: inverted bounds
+    )
+
+def test_sweep_matches_engine_runs(casino, grid):
+    pre = engine.preprocess(casino)
+    # small blocks, so each group is swept in several pieces
+    table, by_pais = scenarios.sweep(pre, grid, block_cells=5_000)
+    assert len(table) == len(grid)
+    for i, sc in enumerate(grid):
+        res = engine.apply_params(pre, sc["pct_dict"], sc["min_wallet"], sc["cap"], sc["country_caps"])
+        ref = kpis.compute_kpis(res)
+        assert table.loc[i, "Eligible_Count"] == ref["totals"]["Eligible_Count"], i
+        for name in kpis.SUM_COLS:
+            assert np.isclose(table.loc[i, name], ref["totals"][name], rtol=1e-9), (i, name)
+        got = by_pais[by_pais["scenario"] == i].drop(columns="scenario").reset_index(drop=True)
+        want = kpis.grouped_sums(res).groupby(level="Pais", observed=True).sum().reset_index()
+        pd.testing.assert_frame_equal(got, want[got.columns], check_dtype=False, rtol=1e-9)
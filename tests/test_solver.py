@@ -0,0 +1,55 @@
+"""solver: solved pct checked against full engine runs"""
+import numpy as np
+import pytest
+
+import engine
+import kpis
+import solver
+from conftest import PARAMS
+
+PCT, MIN_WALLET, CAP, CAPS = PARAMS
+
+@pytest.fixture(scope="module")
+def pre(casino):
+    return engine.preprocess(casino)
+
+def engine_by_pais(pre, pct_dict, min_wallet=MIN_WALLET, cap=CAP, caps=CAPS):
+    res = engine.apply_params(pre, pct_dict, min_wallet, cap, caps)
+    return kpis.compute_kpis(res)["by_pais"].set_index("Pais")["Total_Reinvestment"]
+
+@pytest.mark.parametrize("share", [0.5, 1.5])
+def test_country_budgets_match_the_engine(pre, share):
+    today = engine_by_pais(pre, PCT)
+    budgets = {pais: total * share for pais, total in today.items()}
+    new_pct, report = solver.solve_budgets(pre, budgets, PCT, MIN_WALLET, CAP, CAPS)
+    totals = engine_by_pais(pre, new_pct)
+    for r in report.itertuples():
+        assert np.isclose(r.Total_Reinvestment, totals[r.Pais], rtol=1e-9), r.Pais
+        assert np.isclose(r.Predicted_Reinvestment, r.Total_Reinvestment, rtol=1e-6), r.Pais
+        if r.pct > 0:  # otherwise the minimum wallets alone are over budget
+            assert r.Total_Reinvestment <= r.Budget + 0.005 * r.Eligible_Count, r.Pais  # 2-decimal rounding
+        # just past the solved pct the budget is exceeded (or the pct is already at its ceiling)
+        bumped = engine_by_pais(pre, dict(new_pct, **{r.Pais: r.pct + 1e-4}))
+        assert r.pct >= 1.0 - 1e-4 or bumped[r.Pais] > r.Budget - 1e-6 or bumped[r.Pais] == r.Total_Reinvestment
+
+def engine_total(pre, pct_dict):
+    """Overall total, rows without a Pais included (by_pais leaves them out)"""
+    return kpis.compute_kpis(engine.apply_params(pre, pct_dict, MIN_WALLET, CAP, CAPS))["totals"]["Total_Reinvestment"]
+
+def test_total_budget_keeps_the_ratios(pre):
+    budget = engine_total(pre, PCT) * 1.2
+    new_pct, report = solver.solve_total(pre, budget, PCT, MIN_WALLET, CAP, CAPS)
+    factor = new_pct["ARG"] / PCT["ARG"]
+    assert all(np.isclose(new_pct[k], v * factor) for k, v in PCT.items())
+    assert np.isclose(report.loc[0, "Total_Reinvestment"], engine_total(pre, new_pct), rtol=1e-9)
+    assert report.loc[0, "Total_Reinvestment"] <= budget + 0.005 * report.loc[0, "Eligible_Count"]
+
+def test_budget_below_the_minimum_floor(pre):
+    new_pct, report = solver.solve_budgets(pre, {"ARG": 1.0}, PCT, MIN_WALLET, CAP, CAPS)
+    assert new_pct["ARG"] == 0.0 and report.loc[0, "Gap"] > 0
+
+def test_inverted_caps_match_the_engine(pre):
+    caps = dict(CAPS, ARG={"min": 5000.0, "max": 300.0})
+    today = engine_by_pais(pre, PCT, caps=caps)
+    new_pct, report = solver.solve_budgets(pre, {"ARG": today["ARG"]}, PCT, MIN_WALLET, CAP, caps)
+    assert np.isclose(report.loc[0, "Total_Reinvestment"], engine_by_pais(pre, new_pct, caps=caps)["ARG"])
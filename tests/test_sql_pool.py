@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import sql_source
+
+class Counted:
+    """Wraps connect() to track how many connections are open at once"""
+
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.open = self.peak = 0
+
+    def __call__(self):
+        with self.lock:
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        return _Conn(sql_source.connect(self.url), self)
+
+class _Conn:
+    def __init__(self, conn, counter):
+        self._conn, self._counter, self._closed = conn, counter, False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            with self._counter.lock:
+                self._counter.open -= 1
+        self._conn.close()
+
+def test_concurrent_loads_never_exceed_max_size(sqlite_db, casino):
+    counter = Counted(sqlite_db)
+    pool = sql_source.ConnectionPool(counter, max_size=2)
+
+    def load(_):
+        with pool.connection() as conn:
+            time.sleep(0.005)
+            return len(sql_source.load_sql(conn, fetch_rows=1_000))
+
+    with ThreadPoolExecutor(6) as ex:
+        sizes = list(ex.map(load, range(18)))
+    assert sizes == [len(casino)] * 18
+    assert counter.peak <= 2
+    assert pool.created <= 2
+    pool.close_all()
+    assert counter.open == 0
+
+def test_acquire_times_out_when_exhausted(sqlite_db):
+    pool = sql_source.ConnectionPool(lambda: sql_source.connect(sqlite_db), max_size=1, acquire_timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(held)
+    pool.release(pool.acquire())  # free again once released
+
+def test_dead_idle_connection_is_replaced(sqlite_db, casino):
+    pool = sql_source.ConnectionPool(lambda: sql_source.connect(sqlite_db), ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # dies while idle
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert len(sql_source.load_sql(fresh)) == len(casino)
+    assert pool.discarded == 1
+    assert pool.stats()["open"] == 1
+
+def test_idle_connections_are_evicted(sqlite_db):
+    pool = sql_source.ConnectionPool(lambda: sql_source.connect(sqlite_db), max_size=3)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    assert pool.stats()["idle"] == 3
+    pool.idle_timeout = 0
+    time.sleep(0.01)
+    pool.release(pool.acquire())
+    assert pool.stats()["open"] == 1
+    assert pool.discarded == 3
+
+def test_connection_broken_by_error_is_discarded(sqlite_db):
+    pool = sql_source.ConnectionPool(lambda: sql_source.connect(sqlite_db))
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.close()
+            raise RuntimeError("query failed")
+    assert pool.stats()["open"] == 0
+    assert pool.discarded == 1
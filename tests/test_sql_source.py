@@ -0,0 +1,112 @@
+"""
+sql_source against a local SQLite copy of the base: the projected load
+gives the same engine output as SELECT *, the eligible-only prefilter keeps
+every eligible row, and --keep-cols / fetch batches work.
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import engine
+import kpis
+import sql_source
+from conftest import PARAMS
+
+@pytest.fixture
+def conn(casino):
+    df = casino.copy()
+    df["Notes"] = "x" * 40  # a wide column nobody needs
+    conn = sqlite3.connect(":memory:")
+    df.to_sql(sql_source.DEFAULT_TABLE, conn, index=False)
+    yield conn
+    conn.close()
+
+def test_projected_load_matches_select_star(conn):
+    ref = pd.read_sql(f"SELECT * FROM {sql_source.DEFAULT_TABLE}", conn)
+    new = sql_source.load_sql(conn)
+    assert "Notes" not in new.columns and "Player_Id" not in new.columns
+    pd.testing.assert_frame_equal(
+        engine.apply_reinvestment(ref, *PARAMS).drop(columns=["Notes", "Player_Id"]),
+        engine.apply_reinvestment(new, *PARAMS),
+        check_dtype=False, check_categorical=False,
+    )
+
+def test_prefilter_keeps_every_eligible_row(conn):
+    full = engine.apply_reinvestment(sql_source.load_sql(conn), *PARAMS)
+    kept = engine.apply_reinvestment(sql_source.load_sql(conn, eligible_only=True), *PARAMS)
+    assert len(kept) < len(full)
+    assert kept["eligible"].sum() == full["eligible"].sum()
+    ref, new = kpis.compute_kpis(full), kpis.compute_kpis(kept)
+    for key in ("summary", "by_pais", "by_gestion"):
+        pd.testing.assert_frame_equal(ref[key], new[key])
+
+def test_extra_cols_and_fetch_batches(conn, casino):
+    chunks = list(sql_source.iter_sql_chunks(conn, extra_cols=["Player_Id"], fetch_rows=1_000))
+    assert [len(c) for c in chunks] == [1_000] * (len(casino) // 1_000)
+    df = sql_source.load_sql(conn, extra_cols=["Player_Id"], fetch_rows=1_000)
+    assert df["Player_Id"].tolist() == casino["Player_Id"].tolist()
+
+def test_missing_columns_raise(conn):
+    conn.execute(f"CREATE TABLE thin AS SELECT Pais, NG FROM {sql_source.DEFAULT_TABLE}")
+    with pytest.raises(ValueError, match="Missing required columns"):
+        sql_source.load_sql(conn, "thin")
+
+def test_write_layout_round_trip(sqlite_db, casino):
+    result = engine.apply_reinvestment(casino, *PARAMS)
+    conn = sql_source.connect(sqlite_db)
+    try:
+        cols = ["Player_Id"] + sql_source.WRITEBACK_COLS
+        stats = sql_source.write_layout(conn, result, "promo_layout", cols, batch_rows=700, create=True)
+        back = pd.read_sql("SELECT * FROM promo_layout", conn)
+        text = engine.with_reason_text(result)
+        assert stats["rows"] == len(casino) and list(back.columns) == cols
+        assert back["Player_Id"].tolist() == casino["Player_Id"].tolist()
+        assert back["reinvestment"].tolist() == result["reinvestment"].tolist()
+        for col in ("Rango_Reinv", "Reason_Not_Eligible"):
+            assert back[col].fillna("").tolist() == text[col].astype(object).fillna("").tolist(), col
+
+        sql_source.write_layout(conn, result.iloc[:10], "promo_layout", cols, replace=True)
+        assert conn.execute("SELECT COUNT(*) FROM promo_layout").fetchone()[0] == 10
+    finally:
+        conn.close()
+
+def test_failed_write_leaves_the_table_untouched(sqlite_db, casino):
+    result = engine.apply_reinvestment(casino, *PARAMS)
+    cols = ["Player_Id"] + sql_source.WRITEBACK_COLS
+    conn = sql_source.connect(sqlite_db)
+    try:
+        sql_source.write_layout(conn, result.iloc[:10], "promo_layout", cols, create=True)
+        conn.execute("CREATE UNIQUE INDEX one_row_per_player ON promo_layout (Player_Id)")
+        conn.commit()
+        # DELETE and the first batches go through, then the repeated player fails the index
+        dup = pd.concat([result.iloc[10:20], result.iloc[10:11]])
+        with pytest.raises(sqlite3.IntegrityError):
+            sql_source.write_layout(conn, dup, "promo_layout", cols, batch_rows=3, replace=True)
+        ids = [r[0] for r in conn.execute("SELECT Player_Id FROM promo_layout")]
+        assert ids == casino["Player_Id"].iloc[:10].tolist()
+    finally:
+        conn.close()
+
+def test_app_sqlite_urls_stay_under_the_allowed_dir(tmp_path):
+    root = str(tmp_path)
+    assert sql_source.check_sqlite_url("odbc:DSN=x", None) == "odbc:DSN=x"
+    assert sql_source.check_sqlite_url("sqlite:///base.db", root) == f"sqlite:///{tmp_path / 'base.db'}"
+    assert sql_source.check_sqlite_url(f"sqlite:///{tmp_path / 'sub' / 'b.db'}", root).endswith("sub/b.db")
+    with pytest.raises(ValueError, match="not enabled"):
+        sql_source.check_sqlite_url("sqlite:///base.db", None)
+    for url in ("sqlite:///../outside.db", "sqlite:////etc/passwd", "sqlite://", "sqlite:///"):
+        with pytest.raises(ValueError, match="must be under"):
+            sql_source.check_sqlite_url(url, root)
+
+def test_failed_create_leaves_no_table(sqlite_db, casino):
+    result = engine.apply_reinvestment(casino.iloc[:10], *PARAMS)
+    result["Notes"] = ["ok"] * 9 + [{"not": "bindable"}]  # sqlite3 can't bind the last row
+    conn = sql_source.connect(sqlite_db)
+    try:
+        with pytest.raises(sqlite3.Error):
+            sql_source.write_layout(conn, result, "promo_layout", ["Notes"] + sql_source.WRITEBACK_COLS,
+                                    batch_rows=3, create=True)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'promo_layout'").fetchone() is None
+    finally:
+        conn.close()
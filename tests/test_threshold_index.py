@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import engine3
+import kpis
+from conftest import PARAMS
+from threshold_index import App3ThresholdIndex, ThresholdIndex, with_comps_limit
+
+LIMITS = [0, 200, 777.5, engine.COMPS_LIMIT, np.inf]
+
+@pytest.fixture(scope="module")
+def pre(casino):
+    return engine.preprocess(casino)
+
+@pytest.mark.parametrize("limit", LIMITS)
+def test_kpis_match_engine_at_limit(pre, limit):
+    got = ThresholdIndex(pre).for_params(*PARAMS).kpis(limit)
+    want = kpis.compute_kpis(engine.apply_params(with_comps_limit(pre, limit), *PARAMS))
+    assert got["totals"]["Eligible_Count"] == want["totals"]["Eligible_Count"]
+    for name in kpis.SUM_COLS:
+        assert got["totals"][name] == pytest.approx(want["totals"][name], rel=1e-9)
+    for key in ("by_pais", "by_gestion"):
+        pd.testing.assert_frame_equal(got[key], want[key], check_exact=False, rtol=1e-9)
+
+def test_curve_matches_kpis(pre):
+    t_kpis = ThresholdIndex(pre).for_params(*PARAMS)
+    curve = t_kpis.curve(LIMITS)
+    for i, limit in enumerate(LIMITS):
+        totals = t_kpis.kpis(limit)["totals"]
+        assert curve.loc[i, "Eligible_Count"] == totals["Eligible_Count"]
+        assert curve.loc[i, "Total_Reinvestment"] == pytest.approx(totals["Total_Reinvestment"], rel=1e-9)
+
+@pytest.mark.parametrize("limit", LIMITS)
+def test_pool_counts_rule_1_candidates(pre, limit):
+    frame = pre.frame
+    keep = (pd.to_numeric(frame["NG"], errors="coerce") == 0) & (frame["Comps"] <= limit) & frame["Pais"].notna()
+    want = frame[keep].groupby("Pais").agg(Candidates=("Comps", "size"), Pot_Visita=("Pot_Visita", "sum"),
+                                           Pot_Trip=("Pot_Trip", "sum")).reset_index()
+    got = ThresholdIndex(pre).pool(limit)
+    got = got[got["Pais"].notna() & (got["Candidates"] > 0)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, want, check_exact=False, rtol=1e-9, check_dtype=False)
+
+@pytest.mark.parametrize("limit", [0, engine3.COMPS_LIMIT, 2000, np.inf])
+def test_app3_index_matches_engine3(casino, limit):
+    got = App3ThresholdIndex(casino).for_params(*PARAMS).kpis(limit)
+    res = engine3.apply_reinvestment(casino, *PARAMS, comps_limit=limit)
+    assert got["Eligible_Count"] == int(res["eligible"].sum())
+    assert got["Total_Reinvestment"] == pytest.approx(res["reinvestment"].sum(), rel=1e-9)
+    want = res.groupby("Pais")["reinvestment"].sum()
+    for row in got["by_pais"][got["by_pais"]["Pais"].notna()].itertuples():
+        assert row.Total_Reinvestment == pytest.approx(want[row.Pais], rel=1e-9)
@@ -0,0 +1,186 @@
+###############################################
+# 🚧 COMPS THRESHOLD INDEX
+# Rule 1 (Comps > limit) is the only rule whose threshold people explore
+# (2000 in app.py, 200 in app3.py). Per upload, the rows it can block are
+# sorted by Comps inside each (Pais, Gestion) cell, with cumulative sums of
+# Pot_Visita / Pot_Trip; per parameter set, the same order gets cumulative
+# sums of every KPI over the rows that pass the other rules. Any limit is
+# then a binary search per cell instead of a rerun. App3ThresholdIndex does
+# the same for app3.py's engine3 (per Pais, its reinvestment/eligible KPIs).
+###############################################
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+import engine3
+from engine import REASON_COMPS, REASON_NG, apply_params
+from kpis import KEYS, SUM_COLS, rollup
+
+POOL_COLS = {"Candidates": None, "Pot_Visita": "Pot_Visita", "Pot_Trip": "Pot_Trip"}
+
+def with_comps_limit(pre, limit):
+    """Shallow copy of an engine.Prepared whose rule 1 blocks Comps > limit (np.inf: never)"""
+    out = copy.copy(pre)
+    rule_ng = (pre.base_mask & REASON_NG) != 0
+    rule_comps = (pre.frame["Comps"] > limit).to_numpy()
+    out.blocked = rule_comps | rule_ng
+    out.base_mask = np.where(rule_comps, REASON_COMPS, 0) | np.where(rule_ng, REASON_NG, 0)
+    out.last = None
+    return out
+
+###############################################
+# INDEX
+###############################################
+class _SortedCells:
+    """Rows sorted by (cell, Comps) with cumulative sums of some value columns"""
+
+    def __init__(self, comps, bounds, labels, values):
+        self.comps = comps
+        self.bounds = bounds
+        self.labels = labels
+        self.cum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    def sums(self, limits):
+        """(cells x limits x columns) sums over the rows with Comps <= limit"""
+        limits = np.atleast_1d(np.asarray(limits, dtype=float))
+        out = np.empty((len(self.labels), len(limits), self.cum.shape[1]))
+        for c in range(len(self.labels)):
+            start, end = self.bounds[c], self.bounds[c + 1]
+            k = start + np.searchsorted(self.comps[start:end], limits, side="right")
+            out[c] = self.cum[k] - self.cum[start]
+        return out
+
+class ThresholdIndex:
+    """
+    Per-upload index of an engine.Prepared: the rows rule 1 can block (NG = 0)
+    sorted by Comps per (Pais, Gestion), plus cumulative candidate counts and
+    Pot_Visita / Pot_Trip. for_params() adds the KPIs of one parameter set.
+    """
+
+    def __init__(self, pre):
+        self.pre = pre
+        frame = pre.frame
+        rows = np.flatnonzero(pre.eligible_base & ((pre.base_mask & REASON_NG) == 0))
+
+        # --- (Pais, Gestion) cells from the Pais groups and one Gestion factorize ---
+        gestion_codes, gestion = pd.factorize(frame["Gestion"], use_na_sentinel=False)
+        cells, used = pd.factorize(pre.codes[rows].astype(np.int64) * len(gestion) + gestion_codes[rows], sort=True)
+        pais = [frame["Pais"].iloc[g[0]] for g in pre.group_rows]
+        self.labels = pd.MultiIndex.from_arrays(
+            [[pais[c // len(gestion)] for c in used], [gestion[c % len(gestion)] for c in used]], names=KEYS)
+
+        # --- sort by Comps, then (stable) by cell ---
+        comps = frame["Comps"].to_numpy(dtype=float)[rows]
+        order = np.argsort(comps, kind="stable")
+        order = order[np.argsort(cells[order], kind="stable")]
+        self.rows = rows[order]
+        self.comps = comps[order]
+        self.bounds = np.searchsorted(cells[order], np.arange(len(used) + 1))
+        values = np.column_stack([np.ones(len(self.rows))] + [
+            frame[col].to_numpy(dtype=float)[self.rows] for col in POOL_COLS.values() if col])
+        self._pool = _SortedCells(self.comps, self.bounds, self.labels, values)
+
+    def pool(self, limit):
+        """Rows left by rule 1 at this limit (before the parameter rules), by Pais"""
+        sums = self._pool.sums([limit])[:, 0, :]
+        out = pd.DataFrame(sums, index=self.labels, columns=list(POOL_COLS))
+        out = out.groupby(level="Pais", observed=True).sum().reset_index()
+        out["Candidates"] = out["Candidates"].astype("int64")
+        return out
+
+    def for_params(self, pct_dict, min_wallet, cap, country_caps):
+        """ThresholdKpis: KPIs at any Comps limit for this parameter set (one engine pass)"""
+        res = apply_params(with_comps_limit(self.pre, np.inf), pct_dict, min_wallet, cap, country_caps)
+        elig = res["eligible"].to_numpy()[self.rows]
+        values = np.column_stack([
+            np.where(elig, res[col].to_numpy(dtype=float)[self.rows], 0.0) for col in SUM_COLS.values()])
+        return ThresholdKpis(_SortedCells(self.comps, self.bounds, self.labels, values))
+
+class ThresholdKpis:
+    """kpis.rollup-shaped KPIs of one parameter set for any Comps limit, by binary search"""
+
+    def __init__(self, cells):
+        self._cells = cells
+
+    def sums(self, limit):
+        """kpis.grouped_sums as the engine would give with rule 1 at `limit`"""
+        out = pd.DataFrame(self._cells.sums([limit])[:, 0, :], index=self._cells.labels, columns=list(SUM_COLS))
+        return out[out["Eligible_Count"] > 0]
+
+    def kpis(self, limit):
+        return rollup(self.sums(limit))
+
+    def curve(self, limits):
+        """Overall totals (kpis.SUM_COLS + Avg_Visitas) per limit"""
+        sums = self._cells.sums(limits).sum(axis=0)
+        out = pd.DataFrame(sums, columns=list(SUM_COLS))
+        out.insert(0, "Comps_Limit", np.atleast_1d(np.asarray(limits, dtype=float)))
+        out["Eligible_Count"] = out["Eligible_Count"].astype("int64")
+        n = out["Eligible_Count"].to_numpy()
+        out["Avg_Visitas"] = np.where(n > 0, out["Total_Visitas"] / np.maximum(n, 1), np.nan)
+        return out
+
+###############################################
+# APP3 (engine3) INDEX
+###############################################
+APP3_COLS = {"Eligible_Count": "eligible", "Total_Reinvestment": "reinvestment"}
+
+class App3ThresholdIndex:
+    """
+    Per-upload index for engine3 (rule `Comps > 200`): rows sorted by Comps
+    per Pais. engine3 treats rows independently and a blocked row ends up
+    like any other blocked row, so for_params() needs only two runs: rule 1
+    off and every row blocked.
+    """
+
+    def __init__(self, df):
+        if "Comps" not in df.columns:
+            raise ValueError("Missing required columns: ['Comps']")
+        self.df = df
+        comps = pd.to_numeric(df["Comps"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        codes, uniques = pd.factorize(df["Pais"], use_na_sentinel=False)
+        order = np.argsort(comps, kind="stable")
+        order = order[np.argsort(codes[order], kind="stable")]
+        self.rows = order
+        self.comps = comps[order]
+        self.bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.labels = pd.Index(uniques, dtype=object, name="Pais")
+
+    def for_params(self, pct_dict, min_wallet, cap, country_caps):
+        """App3ThresholdKpis for this parameter set (two engine3 runs)"""
+        args = (self.df, pct_dict, min_wallet, cap, country_caps)
+        open_ = engine3.apply_reinvestment(*args, comps_limit=np.inf)
+        shut = engine3.apply_reinvestment(*args, comps_limit=-np.inf)
+        cols = list(APP3_COLS.values())
+        base = shut[cols].to_numpy(dtype=float)[self.rows]
+        diff = open_[cols].to_numpy(dtype=float)[self.rows] - base
+        blocked = _SortedCells(self.comps, self.bounds, self.labels, base).sums([np.inf])[:, 0, :]
+        return App3ThresholdKpis(_SortedCells(self.comps, self.bounds, self.labels, diff), blocked)
+
+class App3ThresholdKpis:
+    """engine3's eligible count and total reinvestment for any Comps limit, by binary search"""
+
+    def __init__(self, cells, blocked):
+        self._cells = cells
+        self._blocked = blocked
+
+    def by_pais(self, limit):
+        sums = self._blocked + self._cells.sums([limit])[:, 0, :]
+        out = pd.DataFrame(sums, index=self._cells.labels, columns=list(APP3_COLS)).reset_index()
+        out["Eligible_Count"] = out["Eligible_Count"].round().astype("int64")
+        return out
+
+    def kpis(self, limit):
+        """{"Eligible_Count", "Total_Reinvestment", "by_pais"} as engine3 would give at `limit`"""
+        by_pais = self.by_pais(limit)
+        return {"Eligible_Count": int(by_pais["Eligible_Count"].sum()),
+                "Total_Reinvestment": float(by_pais["Total_Reinvestment"].sum()), "by_pais": by_pais}
+
+    def curve(self, limits):
+        sums = (self._blocked[:, None, :] + self._cells.sums(limits)).sum(axis=0)
+        out = pd.DataFrame(sums, columns=list(APP3_COLS))
+        out.insert(0, "Comps_Limit", np.atleast_1d(np.asarray(limits, dtype=float)))
+        out["Eligible_Count"] = out["Eligible_Count"].round().astype("int64")
+        return out